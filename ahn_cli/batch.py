@@ -0,0 +1,100 @@
+import json
+import os
+from dataclasses import dataclass, fields
+
+
+@dataclass
+class Job:
+    """
+    A job of a batch run: an area, its filters and its output. The options
+    have the meaning of the command line options of the same name.
+
+    Attributes:
+        output (str): The output file or directory.
+        city (str | None): The city to download.
+        bbox (list[float] | None): The bounding box [minx, miny, maxx, maxy].
+        include_classes (list[int] | None): The classes to include.
+        exclude_classes (list[int] | None): The classes to exclude.
+        no_clip_city (bool): Whether the points are not clipped to the city.
+        clip_file (str | None): A clip boundary file.
+        epsg (int | None): The EPSG code of the clip file.
+        decimate (int | None): The decimation step.
+        voxel_size (float | None): The voxel size of voxel decimation.
+        poisson_radius (float | None): The radius of Poisson-disk decimation.
+        tile_size (float | None): The size of the output tiles.
+        per_subunit (bool): Whether the output has one file per subunit.
+        columns (list[str] | None): The dimensions of columnar output.
+        split_features (bool): Whether the output has one file per feature
+            of the clip file.
+        feature_name (str | None): The clip file column that names the
+            files of the features.
+        output_crs (str | None): The CRS the points are reprojected to.
+    """
+
+    output: str
+    city: str | None = None
+    bbox: list[float] | None = None
+    include_classes: list[int] | None = None
+    exclude_classes: list[int] | None = None
+    no_clip_city: bool = False
+    clip_file: str | None = None
+    epsg: int | None = None
+    decimate: int | None = None
+    voxel_size: float | None = None
+    poisson_radius: float | None = None
+    tile_size: float | None = None
+    per_subunit: bool = False
+    columns: list[str] | None = None
+    split_features: bool = False
+    feature_name: str | None = None
+    output_crs: str | None = None
+
+
+def read_jobs(path: str) -> list[Job]:
+    """
+    Reads the jobs of a batch run from a JSON file, either a list of jobs or
+    an object with a "jobs" list, e.g.
+
+        {"jobs": [
+            {"city": "delft", "output": "delft.laz", "include_classes": [6]},
+            {"bbox": [84000, 446000, 85000, 447000], "no_clip_city": true,
+             "output": "area.parquet", "columns": ["x", "y", "z"]}
+        ]}
+
+    Relative outputs and clip files are relative to the job file.
+
+    Args:
+        path (str): The path of the job file.
+
+    Returns:
+        list[Job]: The jobs.
+
+    Raises:
+        ValueError: If the job file is not valid.
+    """
+    try:
+        with open(path) as f:
+            content = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"Job file cannot be read: {e}") from e
+    entries = content.get("jobs") if isinstance(content, dict) else content
+    if not isinstance(entries, list) or len(entries) == 0:
+        raise ValueError("Job file must contain a list of jobs.")
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    options = {f.name for f in fields(Job)}
+    jobs = []
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ValueError(f"Job {i} must be an object.")
+        unknown = sorted(set(entry) - options)
+        if unknown:
+            raise ValueError(f"Job {i} has unknown options {unknown}.")
+        if "output" not in entry:
+            raise ValueError(f"Job {i} has no output.")
+        job = Job(**entry)
+        job.output = os.path.join(base_dir, job.output)
+        if job.clip_file is not None:
+            job.clip_file = os.path.join(base_dir, job.clip_file)
+        jobs.append(job)
+    return jobs
@@ -0,0 +1,486 @@
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Iterator
+
+import click
+import geopandas as gpd
+import laspy
+import numpy as np
+from shapely import Polygon
+
+from ahn_cli import config
+from ahn_cli.fetcher.request import Fetcher
+from ahn_cli.manipulator.clipper import (
+    FeatureClipper,
+    PolygonClipper,
+    file_clip_features,
+)
+from ahn_cli.manipulator.ptc_handler import PntCHandler
+from ahn_cli.metrics import peak_rss_mb
+from ahn_cli.process import process
+
+# The synthetic tiles are laid out eastwards from the lower left corner of
+# AHN subunit 37EN1_15 (EPSG:28992).
+TILE_ORIGIN = (84000.0, 446000.0)
+TILE_SIZE = 1000.0
+DEFAULT_CLASS_MIX = {1: 0.3, 2: 0.4, 6: 0.2, 9: 0.05, 26: 0.05}
+STAGES = ["generate", "fetch", "rasterize", "filter", "process"]
+
+
+def parse_class_mix(class_mix: str) -> dict[int, float]:
+    """
+    Parses a class mix such as "1:0.3,2:0.7" into the share of every class.
+
+    Args:
+        class_mix (str): Comma-separated pairs of a class and its share.
+
+    Returns:
+        dict[int, float]: The shares of the classes, normalized to sum to 1.
+
+    Raises:
+        ValueError: If the class mix is not valid.
+    """
+    shares: dict[int, float] = {}
+    for pair in class_mix.split(","):
+        cls, _, share = pair.partition(":")
+        shares[int(cls)] = float(share) if share else 1.0
+    total = sum(shares.values())
+    if total <= 0 or any(share < 0 for share in shares.values()):
+        raise ValueError("Class shares must be positive.")
+    return {cls: share / total for cls, share in shares.items()}
+
+
+def synthetic_tile(
+    path: str,
+    origin: tuple[float, float],
+    n_points: int,
+    class_mix: dict[int, float],
+    seed: int = 0,
+) -> None:
+    """
+    Writes a LAZ tile of `TILE_SIZE` x `TILE_SIZE` metres with random points.
+
+    Args:
+        path (str): The path of the tile.
+        origin (tuple[float, float]): The lower left corner of the tile.
+        n_points (int): The number of points.
+        class_mix (dict[int, float]): The share of every class.
+        seed (int, optional): The seed of the random points. Defaults to 0.
+    """
+    synthetic_points(origin, n_points, class_mix, seed=seed).write(path)
+
+
+def synthetic_points(
+    origin: tuple[float, float],
+    n_points: int,
+    class_mix: dict[int, float] | None = None,
+    size: float = TILE_SIZE,
+    seed: int = 0,
+) -> laspy.LasData:
+    """
+    Returns random points in a square of `size` x `size` metres, in point
+    format 6 with scales of 1 mm like the AHN tiles.
+
+    Args:
+        origin (tuple[float, float]): The lower left corner of the square.
+        n_points (int): The number of points.
+        class_mix (dict[int, float] | None, optional): The share of every
+            class. Defaults to None, which uses `DEFAULT_CLASS_MIX`.
+        size (float, optional): The size of the square in metres. Defaults
+            to `TILE_SIZE`.
+        seed (int, optional): The seed of the random points. Defaults to 0.
+
+    Returns:
+        laspy.LasData: The points.
+    """
+    class_mix = class_mix or DEFAULT_CLASS_MIX
+    rng = np.random.default_rng(seed)
+    header = laspy.LasHeader(point_format=6, version="1.4")
+    header.scales = np.array([0.001, 0.001, 0.001])
+    header.offsets = np.array([origin[0], origin[1], 0.0])
+    las = laspy.LasData(header)
+    las.x = origin[0] + rng.uniform(0, size, n_points)
+    las.y = origin[1] + rng.uniform(0, size, n_points)
+    las.z = rng.uniform(-5, 50, n_points)
+    las.classification = rng.choice(
+        list(class_mix), n_points, p=list(class_mix.values())
+    )
+    las.intensity = rng.integers(0, 1000, n_points)
+    las.return_number = np.ones(n_points, dtype=np.uint8)
+    las.number_of_returns = np.ones(n_points, dtype=np.uint8)
+    las.gps_time = np.sort(rng.uniform(0, 1e6, n_points))
+    return las
+
+
+@contextlib.contextmanager
+def serve_directory(directory: str) -> Iterator[str]:
+    """
+    Serves the files of a directory over HTTP on a free local port.
+
+    Args:
+        directory (str): The directory to serve.
+
+    Yields:
+        str: The base URL of the files.
+    """
+
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), partial(QuietHandler, directory=directory)
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def clip_polygon(n_tiles: int) -> Polygon:
+    """
+    Returns a diamond over the synthetic tiles, so that clipping has cells
+    inside, outside and on the boundary.
+    """
+    minx, miny = TILE_ORIGIN
+    maxx, maxy = minx + n_tiles * TILE_SIZE, miny + TILE_SIZE
+    cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
+    return Polygon([(minx, cy), (cx, miny), (maxx, cy), (cx, maxy)])
+
+
+def run_benchmark(
+    n_tiles: int = 4,
+    points_per_tile: int = 1_000_000,
+    class_mix: dict[int, float] | None = None,
+    workers: int | None = None,
+    chunk_size: int | None = None,
+    repeat: int = 3,
+) -> dict[str, Any]:
+    """
+    Benchmarks the stages of the pipeline on synthetic tiles served from a
+    local HTTP server, without network access.
+
+    The stages are the generation of the tiles, their download by the
+    Fetcher, the rasterization of a clip polygon by PolygonClipper and the
+    classification of the points against it, the filters of PntCHandler
+    and the whole `process()` run. Every run of a stage is
+    executed in a fresh process, so that its peak resident set size is
+    measured in isolation. The fastest run of every stage is reported.
+
+    Args:
+        n_tiles (int, optional): The number of tiles. Defaults to 4.
+        points_per_tile (int, optional): The number of points of a tile.
+            Defaults to 1_000_000.
+        class_mix (dict[int, float] | None, optional): The share of every
+            class. Defaults to `DEFAULT_CLASS_MIX`.
+        workers (int | None, optional): The number of worker processes of
+            the process stage. Defaults to None.
+        chunk_size (int | None, optional): The chunk size of the filter and
+            process stages. Defaults to None.
+        repeat (int, optional): The number of runs of every stage.
+            Defaults to 3.
+
+    Returns:
+        dict[str, Any]: The results, which can be serialized to JSON.
+    """
+    if n_tiles < 1 or points_per_tile < 1 or repeat < 1:
+        raise ValueError("Tiles, points and repeat must be greater than 0.")
+    class_mix = class_mix if class_mix is not None else DEFAULT_CLASS_MIX
+    settings = {
+        "tiles": n_tiles,
+        "points_per_tile": points_per_tile,
+        "class_mix": {str(cls): share for cls, share in class_mix.items()},
+        "workers": workers,
+        "chunk_size": chunk_size,
+        "repeat": repeat,
+    }
+    tmp_dir = tempfile.mkdtemp(prefix="ahn_cli_benchmark_")
+    tile_dir = os.path.join(tmp_dir, "tiles")
+    os.makedirs(tile_dir)
+    names = [f"tile{i}.LAZ" for i in range(n_tiles)]
+    polygon = clip_polygon(n_tiles)
+    clip_file = os.path.join(tmp_dir, "clip.geojson")
+    gpd.GeoDataFrame(geometry=[polygon], crs="EPSG:28992").to_file(clip_file)
+    n_points = n_tiles * points_per_tile
+
+    stages: dict[str, dict[str, Any]] = {}
+    try:
+        with serve_directory(tile_dir) as base_url:
+            # The tiles are generated once for the other stages.
+            stage_args: dict[str, tuple] = {
+                "generate": (tile_dir, names, points_per_tile, class_mix),
+                "fetch": (base_url, names),
+                "rasterize": (tile_dir, names, polygon),
+                "filter": (tile_dir, names, clip_file, chunk_size),
+                "process": (
+                    base_url,
+                    names,
+                    clip_file,
+                    os.path.join(tmp_dir, "output.laz"),
+                    workers,
+                    chunk_size,
+                ),
+            }
+            for stage in STAGES:
+                runs = [
+                    _run_isolated(_STAGE_FUNCTIONS[stage], stage_args[stage])
+                    for _ in range(repeat)
+                ]
+                tile_bytes = sum(
+                    os.path.getsize(os.path.join(tile_dir, name))
+                    for name in names
+                )
+                stages[stage] = _stage_result(
+                    runs, n_points, tile_bytes if stage != "rasterize" else 0
+                )
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "machine": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "laspy": laspy.__version__,
+            "numpy": np.__version__,
+        },
+        "settings": settings,
+        "stages": stages,
+    }
+
+
+def _run_isolated(
+    function: Callable[..., float | None], args: tuple
+) -> tuple[float, float]:
+    """
+    Runs a stage in a fresh process and returns its duration in seconds and
+    the peak resident set size of the process in megabytes.
+    """
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        return executor.submit(_timed, function, args).result()
+
+
+def _timed(
+    function: Callable[..., float | None], args: tuple
+) -> tuple[float, float]:
+    """
+    Runs a stage and returns its duration, or the duration the stage returns
+    if it prepares its input first, and the peak resident set size.
+    """
+    start = time.perf_counter()
+    seconds = function(*args)
+    if seconds is None:
+        seconds = time.perf_counter() - start
+    return seconds, peak_rss_mb()
+
+
+def _stage_result(
+    runs: list[tuple[float, float]], n_points: int, n_bytes: int
+) -> dict[str, Any]:
+    seconds = min(run[0] for run in runs)
+    return {
+        "seconds": seconds,
+        "runs": [run[0] for run in runs],
+        "points": n_points,
+        "bytes": n_bytes,
+        "points_per_s": n_points / seconds,
+        "mb_per_s": n_bytes / 1024 / 1024 / seconds,
+        "peak_rss_mb": max(run[1] for run in runs),
+    }
+
+
+def _generate(
+    tile_dir: str,
+    names: list[str],
+    points_per_tile: int,
+    class_mix: dict[int, float],
+) -> None:
+    for i, name in enumerate(names):
+        synthetic_tile(
+            os.path.join(tile_dir, name),
+            (TILE_ORIGIN[0] + i * TILE_SIZE, TILE_ORIGIN[1]),
+            points_per_tile,
+            class_mix,
+            seed=i,
+        )
+
+
+def _fetch(base_url: str, names: list[str]) -> None:
+    fetcher = Fetcher(base_url, "", urls=_tile_urls(base_url, names))
+    for _, file in fetcher.iter_fetch():
+        os.remove(file)
+
+
+def _rasterize(tile_dir: str, names: list[str], polygon: Polygon) -> float:
+    """
+    Builds a PolygonClipper, which rasterizes the polygon into cell classes,
+    and classifies the points of the tiles with it. The tiles are read
+    before the measured part.
+    """
+    tiles = [laspy.read(os.path.join(tile_dir, name)) for name in names]
+    start = time.perf_counter()
+    clipper = PolygonClipper(polygon)
+    for las in tiles:
+        clipper.contains(las.x, las.y)
+    return time.perf_counter() - start
+
+
+def _filter(
+    tile_dir: str, names: list[str], clip_file: str, chunk_size: int | None
+) -> None:
+    cfg = config.Config()
+    clipper = FeatureClipper(file_clip_features(clip_file, "EPSG:28992"))
+    for name in names:
+        with laspy.open(os.path.join(tile_dir, name)) as reader:
+            for points in reader.chunk_iterator(
+                chunk_size or reader.header.point_count
+            ):
+                las = laspy.LasData(reader.header, points=points)
+                p_handler = PntCHandler(
+                    las, str(cfg.city_polygon_file), "", 28992, lazy=True
+                )
+                p_handler.include([2, 6]).clip_by_arbitrary_polygon(
+                    clip_file, clipper
+                ).decimate(2).points()
+
+
+def _process(
+    base_url: str,
+    names: list[str],
+    clip_file: str,
+    output_path: str,
+    workers: int | None,
+    chunk_size: int | None,
+) -> None:
+    cfg = config.Config()
+    process(
+        base_url,
+        str(cfg.city_polygon_file),
+        output_path,
+        "",
+        include_classes=[2, 6],
+        no_clip_city=True,
+        clip_file=clip_file,
+        epsg=28992,
+        decimate=2,
+        chunk_size=chunk_size,
+        workers=workers,
+        urls=_tile_urls(base_url, names),
+    )
+    os.remove(output_path)
+
+
+def _tile_urls(base_url: str, names: list[str]) -> list[str]:
+    """
+    Returns the URLs of the tiles served by `serve_directory`, which stands
+    in for the GeoTiles server.
+    """
+    return [base_url + name for name in names]
+
+
+_STAGE_FUNCTIONS: dict[str, Callable[..., float | None]] = {
+    "generate": _generate,
+    "fetch": _fetch,
+    "rasterize": _rasterize,
+    "filter": _filter,
+    "process": _process,
+}
+
+
+@click.command()
+@click.option(
+    "-t", "--tiles", type=int, default=4, help="The number of tiles."
+)
+@click.option(
+    "-n",
+    "--points",
+    type=int,
+    default=1_000_000,
+    help="The number of points of a tile.",
+)
+@click.option(
+    "-cm",
+    "--class-mix",
+    "class_mix",
+    type=str,
+    help="The share of every class as comma-separated class:share pairs, e.g. 1:0.3,2:0.4,6:0.3.",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=int,
+    help="The number of worker processes of the process stage.",
+)
+@click.option(
+    "-ck",
+    "--chunk-size",
+    "chunk_size",
+    type=int,
+    help="Stream the tiles in chunks of the given number of points.",
+)
+@click.option(
+    "-r",
+    "--repeat",
+    type=int,
+    default=3,
+    help="The number of runs of every stage, of which the fastest is reported.",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=str,
+    help="Write the results as JSON to the given file.",
+)
+def main(
+    tiles: int,
+    points: int,
+    class_mix: str | None,
+    workers: int | None,
+    chunk_size: int | None,
+    repeat: int,
+    output: str | None,
+) -> None:
+    results = run_benchmark(
+        tiles,
+        points,
+        parse_class_mix(class_mix) if class_mix else None,
+        workers,
+        chunk_size,
+        repeat,
+    )
+    click.echo(
+        f"{'stage':<10} {'seconds':>9} {'Mpoints/s':>10} {'MB/s':>9} "
+        f"{'peak MB':>9}"
+    )
+    for stage, result in results["stages"].items():
+        click.echo(
+            f"{stage:<10} {result['seconds']:>9.3f} "
+            f"{result['points_per_s'] / 1e6:>10.2f} "
+            f"{result['mb_per_s']:>9.1f} {result['peak_rss_mb']:>9.0f}"
+        )
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,3 +11,11 @@ class Config:
     city_polygon_file = files("ahn_cli.fetcher.data").joinpath(
         "municipality_simple.geojson"
     )
+    # Number of tiles that may be downloading or waiting to be processed at
+    # the same time, which caps the disk usage of a run.
+    max_tiles_in_flight = 8
+    # Number of parallel downloads, which is also the size of the HTTP
+    # connection pool.
+    download_workers = 8
+    # Size in megabytes of the chunks a download is written in.
+    download_chunk_size = 8
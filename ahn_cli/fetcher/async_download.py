@@ -0,0 +1,143 @@
+import asyncio
+
+import aiohttp
+
+from ahn_cli.fetcher.download import (
+    Download,
+    DownloadError,
+    RetryableError,
+    finish_download,
+    read_response,
+    request_headers,
+    retry_delay,
+)
+
+
+class BandwidthLimiter:
+    """
+    A token bucket that limits the total throughput of all downloads that
+    share it.
+
+    Args:
+        rate (float): The maximum throughput in bytes per second.
+        burst (float | None, optional): The number of bytes that may be
+            transferred at once after an idle period. Defaults to None, which
+            allows one second worth of data.
+
+    Methods:
+        acquire: Waits until a number of bytes may be transferred.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None) -> None:
+        if rate <= 0:
+            raise ValueError("Bandwidth limit must be greater than 0.")
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self._tokens = self.burst
+        self._updated: float | None = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, nbytes: int) -> None:
+        """
+        Waits until `nbytes` may be transferred without exceeding the rate.
+
+        Args:
+            nbytes (int): The number of bytes to transfer.
+        """
+        # The lock queues the waiting downloads in order, so that a download
+        # waiting for a large chunk is not starved by smaller ones.
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            if self._updated is not None:
+                self._tokens = min(
+                    self.burst,
+                    self._tokens + (now - self._updated) * self.rate,
+                )
+            self._updated = now
+            self._tokens -= nbytes
+            if self._tokens < 0:
+                await asyncio.sleep(-self._tokens / self.rate)
+
+
+async def download_async(
+    session: aiohttp.ClientSession,
+    url: str,
+    path: str,
+    headers: dict[str, str] | None = None,
+    retries: int = 5,
+    backoff: float = 1.0,
+    chunk_size: int = 1024 * 1024,
+    limiter: BandwidthLimiter | None = None,
+) -> Download:
+    """
+    Downloads a URL into a file without blocking the event loop, resuming
+    the file if it already holds the first part of the body.
+
+    This is the asynchronous counterpart of `download`, and shares its
+    retries, Range resumption and size verification, so that only the
+    transport differs. The body is written in a worker thread, chunk by
+    chunk, so that slow disks do not stall the other downloads.
+
+    Args:
+        session (aiohttp.ClientSession): The session to send the requests
+            with. Its timeout applies to every request.
+        url (str): The URL to download.
+        path (str): The destination file. An existing file is treated as a
+            partial download and resumed.
+        headers (dict[str, str] | None, optional): Extra request headers, e.g.
+            If-None-Match for a conditional request.
+        retries (int, optional): The number of retries after a failed
+            attempt. Defaults to 5.
+        backoff (float, optional): The base delay in seconds between retries.
+            Defaults to 1.0.
+        chunk_size (int, optional): The size of the chunks written to the
+            file. Defaults to 1 MiB.
+        limiter (BandwidthLimiter | None, optional): The bandwidth limit
+            shared with other downloads. Defaults to None, which means no
+            limit.
+
+    Returns:
+        Download: The outcome of the download.
+
+    Raises:
+        DownloadError: If the server rejects the request or the download
+            still fails after all retries.
+    """
+    etag: str | None = None
+    last_error: Exception | None = None
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            await asyncio.sleep(
+                retry_delay(url, attempt, retries, backoff, last_error)
+            )
+
+        offset, req_headers = request_headers(path, headers, etag)
+        try:
+            async with session.get(url, headers=req_headers) as res:
+                transfer = read_response(
+                    url, path, res.status, res.headers, offset, etag
+                )
+                if isinstance(transfer, Download):
+                    return transfer
+                etag = transfer.etag
+                f = await asyncio.to_thread(open, path, transfer.mode)
+                try:
+                    async for chunk in res.content.iter_chunked(chunk_size):
+                        if limiter is not None:
+                            await limiter.acquire(len(chunk))
+                        await asyncio.to_thread(f.write, chunk)
+                finally:
+                    await asyncio.to_thread(f.close)
+                return finish_download(url, path, transfer, res.headers)
+        except (
+            RetryableError,
+            aiohttp.ClientConnectionError,
+            aiohttp.ClientPayloadError,
+            asyncio.TimeoutError,
+        ) as e:
+            last_error = e
+
+    raise DownloadError(
+        f"Failed to download {url} after {retries + 1} attempts: "
+        f"{last_error}"
+    )
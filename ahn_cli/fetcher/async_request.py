@@ -0,0 +1,280 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import AsyncGenerator, Callable, Iterator
+
+import aiohttp
+from tqdm import tqdm
+
+from ahn_cli.fetcher.async_download import BandwidthLimiter, download_async
+from ahn_cli.fetcher.cache import TileCache
+from ahn_cli.fetcher.request import Fetcher
+
+
+class AsyncFetcher(Fetcher):
+    """
+    Fetcher that downloads the tiles with asyncio instead of a thread per
+    download, for pulls of thousands of tiles.
+
+    The tiles are scheduled through a priority queue and downloaded by
+    `max_connections` coroutines over a single connection pool. The
+    bandwidth of all downloads together can be limited. Tile selection and
+    the cache behave as in `Fetcher`.
+
+    Args:
+        base_url (str): The base URL for fetching AHN data.
+        city_name (str): The name of the city for which to fetch AHN data.
+        bbox (list[float] | None, optional): The bounding box coordinates [minx, miny, maxx, maxy]
+            for a specific area of interest. Defaults to None.
+        cache (TileCache | None, optional): A persistent tile cache. Defaults
+            to None.
+        revalidate (bool, optional): Revalidate cached tiles with a conditional
+            GET. Defaults to False.
+        min_overlap_area (float, optional): Skip tiles whose overlap with the city
+            or bbox is smaller than this area in square metres. Defaults to 0.0.
+        retries (int, optional): The number of retries of a failed download.
+            Defaults to 5.
+        timeout (float, optional): The connect and read timeout of the requests
+            in seconds. Defaults to 60.0.
+        max_connections (int, optional): The maximum number of parallel
+            downloads. Defaults to 64.
+        chunk_size (int, optional): The size in bytes of the chunks a download
+            is written in. Defaults to 1 MiB.
+        bandwidth (float | None, optional): The maximum total throughput in
+            bytes per second. Defaults to None, which means no limit.
+        priority (Callable[[str], float] | None, optional): Returns the
+            priority of a tile URL, lower values are downloaded first.
+            Defaults to None, which downloads the tiles in the order of
+            `urls`.
+        urls (list[str] | None, optional): The tile URLs to fetch. Defaults
+            to None, which looks up the tiles of the city or bbox.
+
+    Raises:
+        ValueError: If the base URL is invalid.
+        DownloadError: From `fetch`, `iter_fetch` and `aiter_fetch`, if a tile
+            cannot be downloaded.
+
+    Attributes:
+        max_connections (int): The maximum number of parallel downloads.
+        bandwidth (float | None): The maximum total throughput in bytes per
+            second.
+        priority (Callable[[str], float] | None): The priority of a tile URL.
+
+    Methods:
+        iter_fetch: Fetches AHN data and yields the tiles as they complete.
+        aiter_fetch: Asynchronously yields the tiles as they complete.
+        _download_async: Downloads a single tile.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        city_name: str,
+        bbox: list[float] | None = None,
+        cache: TileCache | None = None,
+        revalidate: bool = False,
+        min_overlap_area: float = 0.0,
+        retries: int = 5,
+        timeout: float = 60.0,
+        max_connections: int = 64,
+        chunk_size: int = 1024 * 1024,
+        bandwidth: float | None = None,
+        priority: Callable[[str], float] | None = None,
+        urls: list[str] | None = None,
+    ):
+        super().__init__(
+            base_url,
+            city_name,
+            bbox,
+            cache,
+            revalidate,
+            min_overlap_area,
+            retries,
+            timeout,
+            max_workers=max_connections,
+            chunk_size=chunk_size,
+            urls=urls,
+        )
+        self.max_connections = max_connections
+        self.bandwidth = bandwidth
+        self.priority = priority
+
+    def iter_fetch(
+        self, max_in_flight: int | None = None
+    ) -> Iterator[tuple[str, str]]:
+        """
+        Fetches AHN data and yields every tile as soon as its download is
+        finished.
+
+        The event loop runs in a background thread, so that the downloads
+        continue while the caller processes a tile.
+
+        Args:
+            max_in_flight (int | None, optional): The maximum number of tiles
+                that are being downloaded or have been yielded but not yet
+                consumed. Defaults to None, which means no limit.
+
+        Yields:
+            tuple[str, str]: The URL of the tile and the file name where the
+            data is stored.
+        """
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        tiles = self.aiter_fetch(max_in_flight)
+        try:
+            while True:
+                try:
+                    yield asyncio.run_coroutine_threadsafe(
+                        tiles.__anext__(), loop
+                    ).result()
+                except StopAsyncIteration:
+                    return
+        finally:
+            asyncio.run_coroutine_threadsafe(tiles.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+    async def aiter_fetch(
+        self, max_in_flight: int | None = None
+    ) -> AsyncGenerator[tuple[str, str], None]:
+        """
+        Fetches AHN data and asynchronously yields every tile as soon as its
+        download is finished.
+
+        Args:
+            max_in_flight (int | None, optional): The maximum number of tiles
+                that are being downloaded or have been yielded but not yet
+                consumed. Defaults to None, which means no limit.
+
+        Yields:
+            tuple[str, str]: The URL of the tile and the file name where the
+            data is stored.
+        """
+        logging.info("Start fetching AHN data")
+        logging.info(f"Fetching {len(self.urls)} tiles")
+
+        queue: asyncio.PriorityQueue[
+            tuple[float, int, str]
+        ] = asyncio.PriorityQueue()
+        for i, url in enumerate(self.urls):
+            priority = self.priority(url) if self.priority else float(i)
+            # The position breaks ties, so that URLs are never compared.
+            queue.put_nowait((priority, i, url))
+        finished: asyncio.Queue[
+            tuple[str, str] | BaseException
+        ] = asyncio.Queue()
+        window = asyncio.Semaphore(max_in_flight or max(len(self.urls), 1))
+        limiter = (
+            BandwidthLimiter(self.bandwidth)
+            if self.bandwidth is not None
+            else None
+        )
+
+        async def worker(session: aiohttp.ClientSession) -> None:
+            while not queue.empty():
+                # A download only starts once there is room in the window, and
+                # then takes the tile with the highest priority at that time.
+                await window.acquire()
+                if queue.empty():
+                    window.release()
+                    return
+                _, _, url = queue.get_nowait()
+                try:
+                    path = await self._download_async(session, url, limiter)
+                except Exception as e:
+                    finished.put_nowait(e)
+                    return
+                finished.put_nowait((url, path))
+
+        connector = aiohttp.TCPConnector(limit=self.max_connections)
+        timeout = aiohttp.ClientTimeout(
+            sock_connect=self.timeout, sock_read=self.timeout
+        )
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout, auto_decompress=False
+        ) as session:
+            workers = [
+                asyncio.create_task(worker(session))
+                for _ in range(min(self.max_connections, len(self.urls)))
+            ]
+            try:
+                with tqdm(total=len(self.urls)) as pbar:
+                    pbar.set_description("Fetching AHN data")
+                    for _ in range(len(self.urls)):
+                        result = await finished.get()
+                        if isinstance(result, BaseException):
+                            raise result
+                        pbar.update(1)
+                        yield result
+                        window.release()
+            finally:
+                # Stop the remaining downloads when the consumer stops early
+                # or a download failed.
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                # Remove or release the tiles that finished but were never
+                # yielded.
+                while not finished.empty():
+                    result = finished.get_nowait()
+                    if isinstance(result, BaseException):
+                        continue
+                    if self.cache is not None:
+                        self._release(result[0])
+                    else:
+                        os.remove(result[1])
+
+    async def _download_async(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        limiter: BandwidthLimiter | None,
+    ) -> str:
+        """
+        Downloads a single tile, or takes it from the cache.
+
+        Args:
+            session (aiohttp.ClientSession): The session of the fetch.
+            url (str): The URL of the tile.
+            limiter (BandwidthLimiter | None): The bandwidth limit shared by
+                all downloads.
+
+        Returns:
+            str: The file name where the data is stored.
+
+        Raises:
+            DownloadError: If the tile cannot be downloaded.
+        """
+        cached, headers = await asyncio.to_thread(self._lookup_cache, url)
+        if cached is not None:
+            return cached
+
+        try:
+            # Created without a thread, so that a cancelled download cannot
+            # lose the path of its file.
+            temp_path = self._temp_file()
+            try:
+                result = await download_async(
+                    session,
+                    url,
+                    temp_path,
+                    headers,
+                    retries=self.retries,
+                    chunk_size=self.chunk_size,
+                    limiter=limiter,
+                )
+            except BaseException:
+                os.remove(temp_path)
+                raise
+            if self.cache is None:
+                return temp_path
+            return await asyncio.to_thread(
+                self._store, url, temp_path, result
+            )
+        except BaseException:
+            # The cached tile that was revalidated is not handed out.
+            self._release(url)
+            raise
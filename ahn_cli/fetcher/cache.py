@@ -0,0 +1,352 @@
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import BinaryIO, Iterator
+
+if sys.platform != "win32":
+    import fcntl
+
+
+@dataclass
+class CacheEntry:
+    """
+    Metadata of a single tile stored in the cache.
+
+    Attributes:
+        tile_index (str): The AHN subunit index of the tile, e.g. "37EN1_15".
+        filename (str): The file name of the tile inside the cache directory.
+        size (int): The size of the tile in bytes.
+        etag (str | None): The ETag the server returned for the tile.
+        last_modified (str | None): The Last-Modified header the server
+            returned for the tile.
+        last_access (float): The time (epoch seconds) the tile was last used.
+    """
+
+    tile_index: str
+    filename: str
+    size: int
+    etag: str | None = None
+    last_modified: str | None = None
+    last_access: float = 0.0
+
+
+class TileCache:
+    """
+    A persistent on-disk cache of downloaded AHN tiles.
+
+    Tiles are stored under their tile index and tracked in a JSON index file
+    together with the HTTP validators (ETag / Last-Modified) the server
+    returned, so that they can be revalidated with a conditional GET. When
+    the total size exceeds `max_bytes`, the least recently used tiles are
+    evicted. Tiles in use are never evicted, so a run that needs more tiles
+    than the budget allows temporarily exceeds it instead of deleting tiles
+    that are still to be processed.
+
+    Several processes may share a cache directory. Every update re-reads the
+    index under an exclusive `flock` of a lock file, so that the entries of
+    other processes are merged instead of overwritten, and every tile in use
+    is held with a shared `flock`, so that the other processes skip it when
+    they evict. On Windows, only the threads of a process are synchronized.
+
+    Args:
+        directory (str): The directory where the tiles are stored.
+        max_bytes (int | None, optional): The size budget of the cache in
+            bytes. Defaults to None, which means unlimited.
+
+    Methods:
+        get: Returns the cache entry of a tile and marks it as used.
+        path: Returns the path of a cached tile.
+        conditional_headers: Returns the headers for a conditional GET.
+        put: Moves a downloaded tile into the cache.
+        release: Allows a tile that is no longer used to be evicted.
+        close: Releases all tiles.
+        owns: Checks whether a file is managed by the cache.
+        total_size: Returns the total size of the cached tiles.
+    """
+
+    INDEX_FILE = "index.json"
+    LOCK_FILE = "index.lock"
+
+    def __init__(self, directory: str, max_bytes: int | None = None):
+        if max_bytes is not None and max_bytes < 0:
+            raise ValueError("Cache size must not be negative.")
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._in_use: set[str] = set()
+        # The open files of the tiles in use, which hold their shared locks.
+        self._held: dict[str, BinaryIO] = {}
+        os.makedirs(self.directory, exist_ok=True)
+        self._entries = self._load_index()
+
+    def get(self, tile_index: str) -> CacheEntry | None:
+        """
+        Returns the cache entry of a tile and marks it as recently used.
+
+        Args:
+            tile_index (str): The tile index to look up.
+
+        Returns:
+            CacheEntry | None: The entry, or None if the tile is not cached.
+        """
+        with self._index_locked():
+            entry = self._entries.get(tile_index)
+            if entry is None:
+                return None
+            if not self._hold(entry):
+                # The file was removed behind our back.
+                del self._entries[tile_index]
+                self._save_index()
+                return None
+            entry.last_access = time.time()
+            self._save_index()
+            return entry
+
+    def path(self, tile_index: str) -> str:
+        """
+        Returns the path of a cached tile.
+
+        Args:
+            tile_index (str): The tile index.
+
+        Returns:
+            str: The path of the tile inside the cache directory.
+
+        Raises:
+            KeyError: If the tile is not cached.
+        """
+        with self._index_locked():
+            return self._file_path(self._entries[tile_index])
+
+    def conditional_headers(self, tile_index: str) -> dict[str, str]:
+        """
+        Returns the request headers for revalidating a cached tile.
+
+        Args:
+            tile_index (str): The tile index.
+
+        Returns:
+            dict[str, str]: The If-None-Match / If-Modified-Since headers,
+            empty if the tile is not cached or has no validators.
+        """
+        with self._index_locked():
+            entry = self._entries.get(tile_index)
+            headers: dict[str, str] = {}
+            if entry is None:
+                return headers
+            if entry.etag is not None:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified is not None:
+                headers["If-Modified-Since"] = entry.last_modified
+            return headers
+
+    def put(
+        self,
+        tile_index: str,
+        src_path: str,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> str:
+        """
+        Moves a downloaded tile into the cache and evicts old tiles if the
+        cache exceeds its size budget.
+
+        Args:
+            tile_index (str): The tile index.
+            src_path (str): The path of the downloaded file. The file is moved,
+                so it must be on a file system where it can be renamed.
+            etag (str | None, optional): The ETag of the tile.
+            last_modified (str | None, optional): The Last-Modified header of
+                the tile.
+
+        Returns:
+            str: The path of the tile inside the cache directory.
+        """
+        filename = f"{tile_index}.LAZ"
+        dst_path = os.path.join(self.directory, filename)
+        with self._index_locked():
+            # A replaced tile is held again by its new file.
+            self._unhold(tile_index)
+            os.replace(src_path, dst_path)
+            entry = CacheEntry(
+                tile_index=tile_index,
+                filename=filename,
+                size=os.path.getsize(dst_path),
+                etag=etag,
+                last_modified=last_modified,
+                last_access=time.time(),
+            )
+            self._entries[tile_index] = entry
+            self._hold(entry)
+            self._evict()
+            self._save_index()
+        return dst_path
+
+    def release(self, tile_index: str) -> None:
+        """
+        Marks a tile as no longer used by this instance, so that it may be
+        evicted again, and drops its shared lock.
+
+        Args:
+            tile_index (str): The tile index.
+        """
+        with self._lock:
+            self._unhold(tile_index)
+
+    def close(self) -> None:
+        """
+        Releases all tiles used by this instance.
+        """
+        with self._lock:
+            for tile_index in list(self._held):
+                self._unhold(tile_index)
+
+    def owns(self, path: str) -> bool:
+        """
+        Checks whether a file lives in the cache directory.
+
+        Args:
+            path (str): The path to check.
+
+        Returns:
+            bool: True if the file is managed by the cache, False otherwise.
+        """
+        return os.path.dirname(os.path.abspath(path)) == self.directory
+
+    def total_size(self) -> int:
+        """
+        Returns the total size of the cached tiles in bytes.
+        """
+        with self._index_locked():
+            return sum(entry.size for entry in self._entries.values())
+
+    def temp_dir(self) -> str:
+        """
+        Returns a directory for partial downloads on the same file system as
+        the cache, so that finished downloads can be moved in atomically.
+        """
+        path = os.path.join(self.directory, "tmp")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _evict(self) -> None:
+        if self.max_bytes is None:
+            return
+        total = sum(entry.size for entry in self._entries.values())
+        candidates = sorted(
+            (
+                entry
+                for entry in self._entries.values()
+                if entry.tile_index not in self._in_use
+            ),
+            key=lambda entry: entry.last_access,
+        )
+        for entry in candidates:
+            if total <= self.max_bytes:
+                break
+            # Other processes only take the lock of a tile while they hold
+            # the index lock, so the tile cannot be taken before it is gone.
+            if _is_locked(self._file_path(entry)):
+                continue
+            try:
+                os.remove(self._file_path(entry))
+            except FileNotFoundError:
+                pass
+            except PermissionError:
+                # On Windows, a tile that is open elsewhere cannot be removed.
+                continue
+            total -= entry.size
+            del self._entries[entry.tile_index]
+
+    def _hold(self, entry: CacheEntry) -> bool:
+        """
+        Marks a tile as in use and takes a shared lock of its file.
+
+        Returns:
+            bool: False if the file of the tile does not exist.
+        """
+        if entry.tile_index in self._held:
+            return True
+        try:
+            f = open(self._file_path(entry), "rb")
+        except FileNotFoundError:
+            return False
+        if sys.platform != "win32":
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+        self._held[entry.tile_index] = f
+        self._in_use.add(entry.tile_index)
+        return True
+
+    def _unhold(self, tile_index: str) -> None:
+        self._in_use.discard(tile_index)
+        f = self._held.pop(tile_index, None)
+        if f is not None:
+            f.close()
+
+    @contextlib.contextmanager
+    def _index_locked(self) -> Iterator[None]:
+        """
+        Locks the index against the other threads and processes, and
+        re-reads it, since other processes may have changed it.
+        """
+        lock_path = os.path.join(self.directory, self.LOCK_FILE)
+        with self._lock, open(lock_path, "a") as lock_file:
+            if sys.platform != "win32":
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            self._entries = self._load_index()
+            yield
+
+    def _file_path(self, entry: CacheEntry) -> str:
+        return os.path.join(self.directory, entry.filename)
+
+    def _load_index(self) -> dict[str, CacheEntry]:
+        index_path = os.path.join(self.directory, self.INDEX_FILE)
+        if not os.path.exists(index_path):
+            return {}
+        try:
+            with open(index_path) as f:
+                records = json.load(f)
+            return {
+                record["tile_index"]: CacheEntry(**record)
+                for record in records
+            }
+        except (ValueError, TypeError, KeyError):
+            # A corrupted index only costs a re-download.
+            return {}
+
+    def _save_index(self) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump([asdict(entry) for entry in self._entries.values()], f)
+        os.replace(tmp_path, os.path.join(self.directory, self.INDEX_FILE))
+
+
+def _is_locked(path: str) -> bool:
+    """
+    Checks whether another process holds a lock of a file.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        bool: True if the file is locked, False if it is not or does not
+        exist.
+    """
+    if sys.platform == "win32":
+        return False
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(fd)
+    return False
@@ -0,0 +1,122 @@
+import importlib.util
+import logging
+import os
+import tempfile
+from functools import lru_cache
+
+import geopandas as gpd
+import numpy as np
+from shapely import STRtree
+from shapely.geometry.base import BaseGeometry
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+MUNICIPALITY_FILE = os.path.join(DATA_DIR, "municipality_simple.geojson")
+AHN_TILE_FILE = os.path.join(DATA_DIR, "ahn_subunit.geojson")
+
+
+def read_geodataframe(path: str) -> gpd.GeoDataFrame:
+    """
+    Reads a vector file once per process.
+
+    If pyarrow is installed, the parsed data frame is also stored as
+    GeoParquet in the user cache directory, keyed by the size and
+    modification time of the file, so that later runs skip parsing the
+    GeoJSON. The returned data frame is shared and must not be modified.
+
+    Args:
+        path (str): The path of the vector file.
+
+    Returns:
+        gpd.GeoDataFrame: The data of the file.
+    """
+    return _read_geodataframe(os.path.abspath(str(path)))
+
+
+def cache_dir() -> str:
+    """
+    Returns the directory of the cached catalogs, under XDG_CACHE_HOME or
+    ~/.cache.
+    """
+    return os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+        "ahn_cli",
+        "catalog",
+    )
+
+
+@lru_cache(maxsize=None)
+def _read_geodataframe(path: str) -> gpd.GeoDataFrame:
+    if importlib.util.find_spec("pyarrow") is None:
+        # GeoParquet needs the optional pyarrow.
+        return gpd.read_file(path)
+    stat = os.stat(path)
+    name = os.path.basename(path)
+    directory = cache_dir()
+    cache_path = os.path.join(
+        directory, f"{name}-{stat.st_size}-{stat.st_mtime_ns}.parquet"
+    )
+    try:
+        return gpd.read_parquet(cache_path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        # A broken cache must never break a run, fall back to parsing.
+        logging.debug(f"Could not load the cached {name}: {e}")
+
+    gdf = gpd.read_file(path)
+    tmp_path = None
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".parquet")
+        os.close(fd)
+        gdf.to_parquet(tmp_path)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        # The cache is only an optimization, e.g. the home directory may be
+        # read-only.
+        logging.debug(f"Could not cache {name}: {e}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return gdf
+
+
+def municipalities() -> gpd.GeoDataFrame:
+    """
+    Returns the bundled municipality boundaries.
+    """
+    return read_geodataframe(MUNICIPALITY_FILE)
+
+
+def ahn_tiles() -> gpd.GeoDataFrame:
+    """
+    Returns the bundled AHN subunit tiles.
+    """
+    return read_geodataframe(AHN_TILE_FILE)
+
+
+@lru_cache(maxsize=None)
+def ahn_tile_tree() -> STRtree:
+    """
+    Returns a spatial index over the geometries of `ahn_tiles()`, in the same
+    order as the data frame.
+    """
+    return STRtree(ahn_tiles().geometry.values)
+
+
+def query_ahn_tiles(
+    geometry: BaseGeometry, predicate: str | None = None
+) -> np.ndarray:
+    """
+    Returns the positions in `ahn_tiles()` of the tiles that match a geometry,
+    in the order of the data frame.
+
+    Args:
+        geometry (BaseGeometry): The query geometry in EPSG:4326.
+        predicate (str | None, optional): The predicate to test, e.g.
+            "intersects". Defaults to None, which compares the bounding boxes
+            only.
+
+    Returns:
+        np.ndarray: The sorted positions of the matching tiles.
+    """
+    return np.sort(ahn_tile_tree().query(geometry, predicate=predicate))
@@ -0,0 +1,103 @@
+import threading
+import time
+
+
+class AdaptiveConcurrency:
+    """
+    Chooses the number of parallel downloads from the measured throughput.
+
+    The controller hill-climbs: every `interval` seconds it compares the
+    throughput of the last interval with the one before and keeps moving the
+    limit in the same direction while the throughput improves by more than
+    `tolerance`, and reverses otherwise. More parallel downloads than needed
+    to saturate the link only load the server, so a flat throughput also
+    reverses. Retries signal an overloaded server and halve the limit
+    immediately.
+
+    Downloads report their bytes per chunk as they arrive, so the throughput
+    of an interval counts what was transferred in it, not the size of the
+    tiles that happened to finish in it.
+
+    Args:
+        max_limit (int): The upper bound of the limit, e.g. the size of the
+            thread pool.
+        initial (int, optional): The initial limit. Defaults to 2.
+        interval (float, optional): The length of a measuring interval in
+            seconds. Defaults to 5.0.
+        tolerance (float, optional): The relative increase of the throughput
+            that counts as an improvement. Defaults to 0.1.
+
+    Methods:
+        limit: Returns the current limit.
+        record: Records transferred bytes.
+        record_retry: Records a retried request.
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        initial: int = 2,
+        interval: float = 5.0,
+        tolerance: float = 0.1,
+    ) -> None:
+        if max_limit < 1:
+            raise ValueError("Maximum concurrency must be greater than 0.")
+        self.max_limit = max_limit
+        self.interval = interval
+        self.tolerance = tolerance
+        self._limit = min(max(initial, 1), max_limit)
+        self._step = 1
+        self._bytes = 0
+        self._started = time.monotonic()
+        self._previous_rate: float | None = None
+        self._lock = threading.Lock()
+
+    def limit(self) -> int:
+        """
+        Returns the current number of downloads that may run in parallel.
+        """
+        with self._lock:
+            return self._limit
+
+    def record(self, nbytes: int) -> None:
+        """
+        Records bytes received by a running transfer, e.g. a chunk of a
+        download, and adjusts the limit at the end of a measuring interval.
+
+        Args:
+            nbytes (int): The number of transferred bytes.
+        """
+        with self._lock:
+            self._bytes += nbytes
+            elapsed = time.monotonic() - self._started
+            if elapsed < self.interval:
+                return
+            rate = self._bytes / elapsed
+            previous = self._previous_rate
+            if previous is not None and rate < previous * (
+                1 + self.tolerance
+            ):
+                # The last step did not pay off, so step back. Near the
+                # optimum this oscillates by one download.
+                self._step = -self._step
+            self._set_limit(self._limit + self._step)
+            self._previous_rate = rate
+            self._reset()
+
+    def record_retry(self) -> None:
+        """
+        Records a retried request, which halves the limit.
+        """
+        with self._lock:
+            self._step = 1
+            self._set_limit(self._limit // 2)
+            # The throughput of the new limit is measured from scratch.
+            self._previous_rate = None
+            self._reset()
+
+    def _set_limit(self, limit: int) -> None:
+        self._limit = min(max(limit, 1), self.max_limit)
+
+    def _reset(self) -> None:
+        self._bytes = 0
+        self._started = time.monotonic()
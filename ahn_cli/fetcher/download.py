@@ -0,0 +1,332 @@
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Mapping
+
+import requests
+
+# Status codes worth retrying, everything else is a permanent failure.
+RETRY_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class DownloadError(Exception):
+    """Raised when a file cannot be downloaded."""
+
+
+class RetryableError(DownloadError):
+    """Raised when an attempt of a download failed and is worth retrying."""
+
+
+@dataclass
+class Download:
+    """
+    The outcome of a download.
+
+    Attributes:
+        url (str): The downloaded URL.
+        path (str): The file the body was written to.
+        not_modified (bool): True if the server answered a conditional
+            request with 304 Not Modified, in which case nothing was written.
+        size (int): The size of the file in bytes.
+        etag (str | None): The ETag of the resource.
+        last_modified (str | None): The Last-Modified header of the resource.
+    """
+
+    url: str
+    path: str
+    not_modified: bool = False
+    size: int = 0
+    etag: str | None = None
+    last_modified: str | None = None
+
+
+@dataclass
+class Transfer:
+    """
+    A response whose body is to be written to the file of a download.
+
+    Attributes:
+        mode (str): The mode the file is opened with, "ab" to append the
+            rest of a resumed body and "wb" otherwise.
+        expected (int | None): The size the file must have once the body is
+            written, or None if the server did not announce it.
+        etag (str | None): The ETag of the resource.
+    """
+
+    mode: str
+    expected: int | None = None
+    etag: str | None = None
+
+
+def download(
+    url: str,
+    path: str,
+    headers: dict[str, str] | None = None,
+    session: requests.Session | None = None,
+    retries: int = 5,
+    backoff: float = 1.0,
+    timeout: float = 60.0,
+    chunk_size: int = 8 * 1024 * 1024,
+    on_retry: Callable[[], None] | None = None,
+    on_progress: Callable[[int], None] | None = None,
+) -> Download:
+    """
+    Downloads a URL into a file, resuming the file if it already holds the
+    first part of the body.
+
+    Interrupted transfers are resumed with an HTTP Range request after an
+    exponential backoff of `backoff * 2 ** attempt` seconds. The size of the
+    file is verified against the Content-Length or Content-Range of the
+    response, so a truncated body is never reported as a success.
+
+    Args:
+        url (str): The URL to download.
+        path (str): The destination file. An existing file is treated as a
+            partial download and resumed.
+        headers (dict[str, str] | None, optional): Extra request headers, e.g.
+            If-None-Match for a conditional request.
+        session (requests.Session | None, optional): The session to send the
+            requests with. Defaults to None, which uses `requests.get`.
+        retries (int, optional): The number of retries after a failed
+            attempt. Defaults to 5.
+        backoff (float, optional): The base delay in seconds between retries.
+            Defaults to 1.0.
+        timeout (float, optional): The connect and read timeout in seconds.
+            Defaults to 60.0.
+        chunk_size (int, optional): The size of the chunks written to the
+            file. Defaults to 8 MiB.
+        on_retry (Callable[[], None] | None, optional): Called before every
+            retry, e.g. to throttle the other downloads. Defaults to None.
+        on_progress (Callable[[int], None] | None, optional): Called with the
+            number of bytes of every chunk written to the file, e.g. to
+            measure the throughput while the download runs. Defaults to None.
+
+    Returns:
+        Download: The outcome of the download.
+
+    Raises:
+        DownloadError: If the server rejects the request or the download
+            still fails after all retries.
+    """
+    get = session.get if session is not None else requests.get
+    etag: str | None = None
+    last_error: Exception | None = None
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            delay = retry_delay(url, attempt, retries, backoff, last_error)
+            if on_retry is not None:
+                on_retry()
+            time.sleep(delay)
+
+        offset, req_headers = request_headers(path, headers, etag)
+        try:
+            with get(
+                url, headers=req_headers, stream=True, timeout=timeout
+            ) as res:
+                transfer = read_response(
+                    url, path, res.status_code, res.headers, offset, etag
+                )
+                if isinstance(transfer, Download):
+                    return transfer
+                etag = transfer.etag
+                with open(path, transfer.mode) as f:
+                    for chunk in res.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+                        if on_progress is not None:
+                            on_progress(len(chunk))
+                return finish_download(url, path, transfer, res.headers)
+        except (
+            RetryableError,
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+        ) as e:
+            last_error = e
+
+    raise DownloadError(
+        f"Failed to download {url} after {retries + 1} attempts: "
+        f"{last_error}"
+    )
+
+
+def retry_delay(
+    url: str,
+    attempt: int,
+    retries: int,
+    backoff: float,
+    last_error: Exception | None,
+) -> float:
+    """
+    Logs a retry of a download and returns its exponential backoff of
+    `backoff * 2 ** (attempt - 1)` seconds.
+
+    Args:
+        url (str): The URL of the download.
+        attempt (int): The number of the attempt, 1 for the first retry.
+        retries (int): The number of retries.
+        backoff (float): The base delay in seconds.
+        last_error (Exception | None): The error of the previous attempt.
+
+    Returns:
+        float: The delay in seconds before the attempt.
+    """
+    delay = backoff * 2 ** (attempt - 1)
+    logging.warning(
+        f"Retrying {url} in {delay:.1f}s ({attempt}/{retries}): "
+        f"{last_error}"
+    )
+    return delay
+
+
+def request_headers(
+    path: str, headers: dict[str, str] | None, etag: str | None
+) -> tuple[int, dict[str, str]]:
+    """
+    Returns the headers of an attempt of a download, which resumes the file
+    with a Range request if it already holds the first part of the body.
+
+    Args:
+        path (str): The destination file.
+        headers (dict[str, str] | None): Extra request headers.
+        etag (str | None): The ETag of an earlier attempt, which restarts
+            the download from scratch if the resource changed meanwhile.
+
+    Returns:
+        tuple[int, dict[str, str]]: The size of the partial file, and the
+            request headers.
+    """
+    offset = os.path.getsize(path) if os.path.exists(path) else 0
+    req_headers = {"Accept-Encoding": "identity", **(headers or {})}
+    if offset > 0:
+        req_headers["Range"] = f"bytes={offset}-"
+        if etag is not None:
+            req_headers["If-Range"] = etag
+    return offset, req_headers
+
+
+def read_response(
+    url: str,
+    path: str,
+    status: int,
+    headers: Mapping[str, str],
+    offset: int,
+    etag: str | None,
+) -> Download | Transfer:
+    """
+    Checks the status and range of a response before its body is read.
+
+    Args:
+        url (str): The URL of the download.
+        path (str): The destination file.
+        status (int): The status code of the response.
+        headers (Mapping[str, str]): The headers of the response.
+        offset (int): The size of the partial file the request resumed.
+        etag (str | None): The ETag of an earlier attempt.
+
+    Returns:
+        Download | Transfer: The outcome of the download if the response
+            ends it without a body, e.g. 304 Not Modified, and otherwise how
+            the body is written.
+
+    Raises:
+        RetryableError: If the attempt failed and is worth retrying. A
+            partial file that does not match the response is removed.
+        DownloadError: If the server rejects the request.
+    """
+    if status == 304:
+        return Download(
+            url,
+            path,
+            not_modified=True,
+            etag=headers.get("ETag"),
+            last_modified=headers.get("Last-Modified"),
+        )
+    if status == 416 and offset > 0:
+        if content_range_total(headers) == offset:
+            # The previous attempt already got the whole body.
+            return Download(url, path, size=offset, etag=etag)
+        os.remove(path)
+        raise RetryableError(f"{url}: invalid range")
+    if status in RETRY_STATUS_CODES:
+        raise RetryableError(f"{url}: HTTP {status}")
+    if status not in (200, 206):
+        raise DownloadError(f"{url}: HTTP {status}")
+    if status == 206 and content_range_start(headers) != offset:
+        os.remove(path)
+        raise RetryableError(f"{url}: unexpected Content-Range")
+    return Transfer(
+        "ab" if status == 206 else "wb",
+        expected_size(status, headers),
+        headers.get("ETag", etag),
+    )
+
+
+def finish_download(
+    url: str, path: str, transfer: Transfer, headers: Mapping[str, str]
+) -> Download:
+    """
+    Verifies the size of a file once the body of a response is written, so
+    that a truncated body is never reported as a success.
+
+    Args:
+        url (str): The URL of the download.
+        path (str): The destination file.
+        transfer (Transfer): The checked response.
+        headers (Mapping[str, str]): The headers of the response.
+
+    Returns:
+        Download: The outcome of the download.
+
+    Raises:
+        RetryableError: If the file does not have the expected size.
+    """
+    size = os.path.getsize(path)
+    if transfer.expected is not None and size != transfer.expected:
+        raise RetryableError(
+            f"{url}: received {size} of {transfer.expected} bytes"
+        )
+    return Download(
+        url,
+        path,
+        size=size,
+        etag=transfer.etag,
+        last_modified=headers.get("Last-Modified"),
+    )
+
+
+def expected_size(status: int, headers: Mapping[str, str]) -> int | None:
+    """
+    Returns the size the file must have once the body of a response is
+    written, or None if the server did not announce it.
+
+    Args:
+        status (int): The status code of the response.
+        headers (Mapping[str, str]): The headers of the response.
+
+    Returns:
+        int | None: The expected size of the file in bytes.
+    """
+    if status == 206:
+        match = CONTENT_RANGE.match(headers.get("Content-Range", ""))
+        if match is None:
+            return None
+        if match.group(3) != "*":
+            return int(match.group(3))
+        return int(match.group(2)) + 1
+    length = headers.get("Content-Length")
+    return int(length) if length is not None else None
+
+
+def content_range_start(headers: Mapping[str, str]) -> int | None:
+    """Returns the first byte of a 'bytes <start>-<end>/<total>' range."""
+    match = CONTENT_RANGE.match(headers.get("Content-Range", ""))
+    return int(match.group(1)) if match is not None else None
+
+
+def content_range_total(headers: Mapping[str, str]) -> int | None:
+    """Returns the total size from a 'bytes */<total>' Content-Range."""
+    match = re.match(r"bytes \*/(\d+)", headers.get("Content-Range", ""))
+    return int(match.group(1)) if match is not None else None
@@ -1,33 +1,41 @@
-import os
-
 import geopandas as gpd
+import numpy as np
+import shapely
 from pyproj import Transformer
+from shapely.geometry import box
+from shapely.geometry.base import BaseGeometry
 
+from ahn_cli.fetcher import catalog
 from ahn_cli.fetcher.municipality import city_polygon
 
 
 def geotiles() -> gpd.GeoDataFrame:
-    file_path = os.path.join(
-        os.path.dirname(__file__), "data/ahn_subunit.geojson"
-    )
-
-    ahn_tile_gdf = gpd.read_file(file_path)
-    return ahn_tile_gdf
+    return catalog.ahn_tiles()
 
 
-def ahn_subunit_indicies_of_city(city_name: str) -> list[str]:
+def ahn_subunit_indicies_of_city(
+    city_name: str, min_overlap_area: float = 0.0
+) -> list[str]:
     """Return a list of AHN tile indicies that intersect with the city's boundary."""  # noqa
     city_poly = city_polygon(city_name)
+    geometry = shapely.union_all(city_poly.geometry.values)
     geotiles_tile_gdf = geotiles()
 
-    # Filter the DataFrame based on lowercase column values
-    filtered_df = geotiles_tile_gdf.overlay(city_poly)
-    tile_indices: list[str] = filtered_df["AHN_subuni"].tolist()  # noqa
-
-    return tile_indices
+    # Tiles that only touch the boundary share no points with the city.
+    positions = catalog.query_ahn_tiles(geometry, predicate="intersects")
+    touching = shapely.touches(
+        geotiles_tile_gdf.geometry.values[positions], geometry
+    )
+    positions = _drop_small_overlaps(
+        positions[~touching], geometry, min_overlap_area
+    )
+    filtered_df = geotiles_tile_gdf.iloc[positions]
+    return _unique(filtered_df["AHN_subuni"].tolist())
 
 
-def ahn_subunit_indicies_of_bbox(bbox: list[float]) -> list[str]:
+def ahn_subunit_indicies_of_bbox(
+    bbox: list[float], min_overlap_area: float = 0.0
+) -> list[str]:
     """Return a list of AHN tile indicies that intersect with the bbox."""  # noqa
     geotiles_tile_gdf = geotiles()
 
@@ -36,8 +44,30 @@ def ahn_subunit_indicies_of_bbox(bbox: list[float]) -> list[str]:
     )
     minx, miny = transformer.transform(bbox[0], bbox[1])
     maxx, maxy = transformer.transform(bbox[2], bbox[3])
-    # Filter the DataFrame based on lowercase column values
-    filtered_df = geotiles_tile_gdf.cx[minx:maxx, miny:maxy]
-    tile_indices: list[str] = filtered_df["AHN_subuni"].tolist()  # noqa
+    # Bounding box query on the spatial index, like GeoDataFrame.cx
+    geometry = box(minx, miny, maxx, maxy)
+    positions = catalog.query_ahn_tiles(geometry)
+    positions = _drop_small_overlaps(positions, geometry, min_overlap_area)
+    filtered_df = geotiles_tile_gdf.iloc[positions]
+    return _unique(filtered_df["AHN_subuni"].tolist())
+
+
+def _drop_small_overlaps(
+    positions: np.ndarray, geometry: BaseGeometry, min_overlap_area: float
+) -> np.ndarray:
+    """
+    Drops the tiles whose overlap with a geometry is smaller than
+    `min_overlap_area` square metres. Only the candidate tiles are
+    reprojected to EPSG:28992 to measure the overlap.
+    """
+    if min_overlap_area <= 0 or len(positions) == 0:
+        return positions
+    tiles = geotiles().geometry.iloc[positions].to_crs("EPSG:28992")
+    area = gpd.GeoSeries([geometry], crs="EPSG:4326").to_crs("EPSG:28992")
+    overlap = tiles.intersection(area.iloc[0]).area.to_numpy()
+    return positions[overlap >= min_overlap_area]
+
 
-    return tile_indices
+def _unique(tile_indices: list[str]) -> list[str]:
+    """Drop duplicated tile indicies, keeping the first occurrence."""
+    return list(dict.fromkeys(tile_indices))
@@ -1,17 +1,12 @@
-import os
-
-import geopandas as gpd
 from geopandas import GeoDataFrame
 
+from ahn_cli.fetcher import catalog
+
 
 def city_polygon(city_name: str) -> GeoDataFrame:
     """Return a polygon of the city's boundary."""
     s_city_name = city_name.lower()
-    file_path = os.path.join(
-        os.path.dirname(__file__), "data/municipality_simple.geojson"
-    )
-
-    municipality_df = gpd.read_file(file_path)
+    municipality_df = catalog.municipalities()
 
     # Filter the DataFrame based on lowercase column values
     filtered_df = municipality_df[
@@ -1,16 +1,28 @@
+import functools
 import logging
 import os
 import tempfile
-import threading
-from concurrent.futures import ThreadPoolExecutor
-from threading import Lock
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import Iterable, Iterator
 from urllib.parse import urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 
-from ahn_cli.fetcher.geotiles import (ahn_subunit_indicies_of_bbox,
-                                      ahn_subunit_indicies_of_city)
+from ahn_cli.fetcher.cache import TileCache
+from ahn_cli.fetcher.concurrency import AdaptiveConcurrency
+from ahn_cli.fetcher.download import Download, download
+from ahn_cli.fetcher.geotiles import (
+    ahn_subunit_indicies_of_bbox,
+    ahn_subunit_indicies_of_city,
+)
 
 
 class Fetcher:
@@ -22,9 +34,32 @@ class Fetcher:
         city_name (str): The name of the city for which to fetch AHN data.
         bbox (list[float] | None, optional): The bounding box coordinates [minx, miny, maxx, maxy]
             for a specific area of interest. Defaults to None.
+        cache (TileCache | None, optional): A persistent tile cache. When given,
+            cached tiles are used instead of downloading them again. Defaults to None.
+        revalidate (bool, optional): Revalidate cached tiles with a conditional
+            GET (ETag / Last-Modified) instead of trusting them blindly.
+            Defaults to False.
+        min_overlap_area (float, optional): Skip tiles whose overlap with the city
+            or bbox is smaller than this area in square metres. Defaults to 0.0.
+        retries (int, optional): The number of retries of a failed download,
+            which resume the partial file. Defaults to 5.
+        timeout (float, optional): The connect and read timeout of the requests
+            in seconds. Defaults to 60.0.
+        max_workers (int, optional): The maximum number of parallel downloads,
+            which is also the size of the connection pool. Defaults to 8.
+        chunk_size (int, optional): The size in bytes of the chunks a download
+            is written in. Defaults to 8 MiB.
+        adaptive (bool, optional): Adjust the number of parallel downloads
+            between 1 and `max_workers` to the measured throughput instead of
+            always running `max_workers` downloads. Defaults to False.
+        urls (list[str] | None, optional): The tile URLs to fetch, e.g. the
+            union of the tiles of several areas. Defaults to None, which
+            looks up the tiles of the city or bbox.
 
     Raises:
         ValueError: If the base URL is invalid.
+        DownloadError: From `fetch` and `iter_fetch`, if a tile cannot be
+            downloaded.
 
     Attributes:
         base_url (str): The base URL for fetching AHN data.
@@ -32,22 +67,65 @@ class Fetcher:
         bbox (list[float] | None): The bounding box coordinates [minx, miny, maxx, maxy]
             for a specific area of interest.
         urls (list[str]): The constructed URLs for fetching AHN data.
+        cache (TileCache | None): The persistent tile cache.
+        revalidate (bool): Whether cached tiles are revalidated.
+        min_overlap_area (float): The minimum overlap of a tile in square metres.
+        retries (int): The number of retries of a failed download.
+        timeout (float): The timeout of the requests in seconds.
+        max_workers (int): The maximum number of parallel downloads.
+        chunk_size (int): The size of the chunks a download is written in.
+        session (requests.Session): The session shared by all downloads, which
+            keeps the connections to the server alive between tiles. It is
+            created on first use.
+        concurrency (AdaptiveConcurrency | None): The controller of the number
+            of parallel downloads in adaptive mode.
 
     Methods:
         fetch: Fetches AHN data.
+        iter_fetch: Fetches AHN data and yields the tiles as they complete.
+        _discard: Removes or releases the tiles that were not yielded.
+        _release: Releases a cached tile that is not handed out.
+        _download: Downloads a single tile.
+        _lookup_cache: Looks a tile up in the cache.
+        _temp_file: Creates the file a tile is downloaded into.
+        _store: Stores a downloaded tile in the cache.
+        _limit: Returns the number of downloads that may run in parallel.
         _check_valid_url: Checks if the base URL is valid.
         _construct_urls: Constructs the URLs for fetching AHN data.
+        _tile_index: Extracts the tile index from a URL.
     """
 
     def __init__(
-        self, base_url: str, city_name: str, bbox: list[float] | None = None
+        self,
+        base_url: str,
+        city_name: str,
+        bbox: list[float] | None = None,
+        cache: TileCache | None = None,
+        revalidate: bool = False,
+        min_overlap_area: float = 0.0,
+        retries: int = 5,
+        timeout: float = 60.0,
+        max_workers: int = 8,
+        chunk_size: int = 8 * 1024 * 1024,
+        adaptive: bool = False,
+        urls: list[str] | None = None,
     ):
         if not self._check_valid_url(base_url):
             raise ValueError("Invalid URL")
         self.base_url = base_url
         self.city_name = city_name
         self.bbox = bbox
-        self.urls = self._construct_urls()
+        self.cache = cache
+        self.revalidate = revalidate
+        self.min_overlap_area = min_overlap_area
+        self.retries = retries
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.concurrency = (
+            AdaptiveConcurrency(max_workers) if adaptive else None
+        )
+        self.urls = urls if urls is not None else self._construct_urls()
 
     def fetch(self) -> dict:
         """
@@ -55,35 +133,246 @@ class Fetcher:
 
         Returns:
             dict: A dictionary containing the fetched AHN data, where the keys are the URLs
-            and the values are the temporary file names where the data is stored.
+            and the values are the file names where the data is stored. Files
+            inside the cache directory are owned by the cache and must not be
+            removed by the caller.
+        """
+        return dict(self.iter_fetch())
+
+    def iter_fetch(
+        self, max_in_flight: int | None = None
+    ) -> Iterator[tuple[str, str]]:
+        """
+        Fetches AHN data and yields every tile as soon as its download is
+        finished, so that it can be processed while the other tiles are still
+        downloading.
+
+        Args:
+            max_in_flight (int | None, optional): The maximum number of tiles
+                that are being downloaded or have been yielded but not yet
+                consumed. The next download only starts once the consumer asks
+                for the next tile, which caps the disk usage. Defaults to None,
+                which means no limit.
+
+        Yields:
+            tuple[str, str]: The URL of the tile and the file name where the
+            data is stored.
         """
         logging.info("Start fetching AHN data")
         logging.info(f"Fetching {len(self.urls)} tiles")
 
-        def req(
-            url: str, nth: int, results: dict, lock: Lock, pbar: tqdm
-        ) -> None:
-            res = requests.get(url, stream=True)
-            with tempfile.NamedTemporaryFile(
-                delete=False, mode="w+b", suffix=".laz"
-            ) as temp_file:
-                for chunk in tqdm(
-                    res.iter_content(chunk_size=500 * 1024 * 1024),
-                    desc="writing a file",
-                ):
-                    temp_file.write(chunk)
-                with lock:
-                    results[url] = temp_file.name
-            pbar.update(1)
-
-        results: dict = {}
-        lock = threading.Lock()
-        with tqdm(total=len(self.urls)) as pbar:
+        window = max_in_flight if max_in_flight else len(self.urls)
+        urls = iter(self.urls)
+        running: set[Future] = set()
+        # Downloads that are finished but not yet yielded.
+        finished: deque[Future] = deque()
+        # Tiles that are downloading or finished but not yet consumed.
+        in_flight = 0
+        # The session is created here rather than by the first worker.
+        session = self.session
+        with tqdm(total=len(self.urls)) as pbar, ThreadPoolExecutor(
+            max_workers=self.max_workers
+        ) as executor:
             pbar.set_description("Fetching AHN data")
-            with ThreadPoolExecutor(max_workers=8) as executor:
-                for i, url in enumerate(self.urls):
-                    executor.submit(req, url, i, results, lock, pbar)
-        return results
+            try:
+                while True:
+                    while in_flight < window and len(running) < self._limit():
+                        url = next(urls, None)
+                        if url is None:
+                            break
+                        running.add(
+                            executor.submit(self._download, url, session)
+                        )
+                        in_flight += 1
+                    if not finished:
+                        if not running:
+                            break
+                        done, running = wait(
+                            running, return_when=FIRST_COMPLETED
+                        )
+                        finished.extend(done)
+                    future = finished.popleft()
+                    in_flight -= 1
+                    pbar.update(1)
+                    yield future.result()
+            finally:
+                # Do not start new downloads when the consumer stops early,
+                # and wait for the running ones to remove their files.
+                executor.shutdown(cancel_futures=True)
+                self._discard([*finished, *running])
+
+    def _discard(self, futures: Iterable[Future]) -> None:
+        """
+        Removes the files of downloads that finished but were never yielded,
+        e.g. because the consumer stopped early or another tile failed. Files
+        in the cache are owned by the cache and kept, but released, so that
+        they may be evicted again.
+
+        Args:
+            futures (Iterable[Future]): The downloads that were not yielded.
+        """
+        for future in futures:
+            if future.cancelled() or future.exception() is not None:
+                continue
+            url, path = future.result()
+            if self.cache is not None:
+                self._release(url)
+            elif os.path.exists(path):
+                os.remove(path)
+
+    def _release(self, url: str) -> None:
+        """
+        Releases the cached tile of a URL that is not handed out, e.g. after
+        a failed revalidation, so that it may be evicted again.
+
+        Args:
+            url (str): The URL of the tile.
+        """
+        if self.cache is not None:
+            self.cache.release(self._tile_index(url))
+
+    def _download(
+        self, url: str, session: requests.Session
+    ) -> tuple[str, str]:
+        """
+        Downloads a single tile, or takes it from the cache.
+
+        Args:
+            url (str): The URL of the tile.
+            session (requests.Session): The session of the download.
+
+        Returns:
+            tuple[str, str]: The URL of the tile and the file name where the
+            data is stored.
+
+        Raises:
+            DownloadError: If the tile cannot be downloaded.
+        """
+        cached, headers = self._lookup_cache(url)
+        if cached is not None:
+            return url, cached
+
+        try:
+            temp_path = self._temp_file()
+            try:
+                result = download(
+                    url,
+                    temp_path,
+                    headers,
+                    session=session,
+                    retries=self.retries,
+                    timeout=self.timeout,
+                    chunk_size=self.chunk_size,
+                    on_retry=(
+                        self.concurrency.record_retry
+                        if self.concurrency is not None
+                        else None
+                    ),
+                    on_progress=(
+                        self.concurrency.record
+                        if self.concurrency is not None
+                        else None
+                    ),
+                )
+            except BaseException:
+                os.remove(temp_path)
+                raise
+            return url, self._store(url, temp_path, result)
+        except BaseException:
+            # The cached tile that was revalidated is not handed out.
+            self._release(url)
+            raise
+
+    def _lookup_cache(self, url: str) -> tuple[str | None, dict[str, str]]:
+        """
+        Looks a tile up in the cache.
+
+        Args:
+            url (str): The URL of the tile.
+
+        Returns:
+            tuple[str | None, dict[str, str]]: The cached file if it can be
+            used without a request, and the headers of the request otherwise,
+            which are conditional when a cached tile is revalidated.
+        """
+        tile_index = self._tile_index(url)
+        if self.cache is not None and self.cache.get(tile_index):
+            if not self.revalidate:
+                return self.cache.path(tile_index), {}
+            return None, self.cache.conditional_headers(tile_index)
+        return None, {}
+
+    def _temp_file(self) -> str:
+        """
+        Creates an empty file to download a tile into. With a cache, the file
+        is created in the cache directory so that it can be moved into the
+        cache without copying.
+
+        Returns:
+            str: The path of the file.
+        """
+        with tempfile.NamedTemporaryFile(
+            delete=False,
+            mode="w+b",
+            suffix=".laz",
+            dir=self.cache.temp_dir() if self.cache else None,
+        ) as temp_file:
+            return temp_file.name
+
+    def _store(self, url: str, temp_path: str, result: Download) -> str:
+        """
+        Stores a downloaded tile in the cache, if any.
+
+        Args:
+            url (str): The URL of the tile.
+            temp_path (str): The file the tile was downloaded into.
+            result (Download): The outcome of the download.
+
+        Returns:
+            str: The file name where the data is stored.
+        """
+        if self.cache is None:
+            return temp_path
+        tile_index = self._tile_index(url)
+        if result.not_modified:
+            logging.info(f"Tile {tile_index} is up to date in the cache")
+            os.remove(temp_path)
+            return self.cache.path(tile_index)
+        return self.cache.put(
+            tile_index, temp_path, result.etag, result.last_modified
+        )
+
+    def _limit(self) -> int:
+        """
+        Returns the number of downloads that may run in parallel.
+
+        Returns:
+            int: The limit of the adaptive controller, or `max_workers`.
+        """
+        if self.concurrency is not None:
+            return self.concurrency.limit()
+        return self.max_workers
+
+    @functools.cached_property
+    def session(self) -> requests.Session:
+        """
+        The HTTP session shared by all downloads. Its connection pool
+        holds a connection for every worker, so that downloads reuse the TCP
+        and TLS connections of earlier tiles instead of opening new ones.
+
+        Returns:
+            requests.Session: The session.
+        """
+        session = requests.Session()
+        # Retries are handled by `download`, which resumes partial files.
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.max_workers,
+            max_retries=0,
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
 
     def _check_valid_url(self, url: str) -> bool:
         """
@@ -108,12 +397,52 @@ class Fetcher:
         Returns:
             list[str]: A list of URLs for fetching AHN data.
         """
-        tiles_indices = (
-            ahn_subunit_indicies_of_bbox(self.bbox)
-            if self.bbox
-            else ahn_subunit_indicies_of_city(self.city_name)
+        return tile_urls(
+            self.base_url, self.city_name, self.bbox, self.min_overlap_area
         )
-        urls = []
-        for tile_index in tiles_indices:
-            urls.append(os.path.join(self.base_url + f"{tile_index}.LAZ"))
-        return urls
+
+    def _tile_index(self, url: str) -> str:
+        """
+        Extracts the tile index from a tile URL.
+
+        Args:
+            url (str): The URL of the tile.
+
+        Returns:
+            str: The tile index, e.g. "37EN1_15".
+        """
+        filename = os.path.basename(urlparse(url).path)
+        return os.path.splitext(filename)[0]
+
+
+def tile_urls(
+    base_url: str,
+    city_name: str | None,
+    bbox: list[float] | None = None,
+    min_overlap_area: float = 0.0,
+) -> list[str]:
+    """
+    Returns the URLs of the AHN tiles of a bbox, or of a city if no bbox is
+    given.
+
+    Args:
+        base_url (str): The base URL for fetching AHN data.
+        city_name (str | None): The name of the city.
+        bbox (list[float] | None, optional): The bounding box coordinates
+            [minx, miny, maxx, maxy]. Defaults to None.
+        min_overlap_area (float, optional): Skip tiles whose overlap with the
+            city or bbox is smaller than this area in square metres.
+            Defaults to 0.0.
+
+    Returns:
+        list[str]: The URLs of the tiles.
+    """
+    tiles_indices = (
+        ahn_subunit_indicies_of_bbox(bbox, min_overlap_area)
+        if bbox
+        else ahn_subunit_indicies_of_city(str(city_name), min_overlap_area)
+    )
+    urls = []
+    for tile_index in tiles_indices:
+        urls.append(os.path.join(base_url + f"{tile_index}.LAZ"))
+    return urls
@@ -12,3 +12,27 @@ class CLIArgs(TypedDict):
     decimate: int | None
     bbox: list[float] | None
     preview: bool
+    cache_dir: str | None
+    cache_size: int | None
+    revalidate_cache: bool
+    chunk_size: int | None
+    max_in_flight: int | None
+    workers: int | None
+    min_tile_overlap: float | None
+    download_workers: int | None
+    download_chunk_size: int | None
+    adaptive_concurrency: bool
+    async_fetch: bool
+    bandwidth_limit: float | None
+    tile_size: float | None
+    per_subunit: bool
+    columns: str | None
+    selective_decompression: bool
+    voxel_size: float | None
+    poisson_radius: float | None
+    profile: bool
+    profile_output: str | None
+    jobs: str | None
+    split_features: bool
+    feature_name: str | None
+    output_crs: str | None
@@ -2,8 +2,8 @@ from typing import cast
 import click
 from pyparsing import Any
 from ahn_cli.kwargs import CLIArgs
-from ahn_cli.validator import validate_all
-from ahn_cli.process import process
+from ahn_cli.validator import validate_all, validate_batch
+from ahn_cli.process import process, process_batch
 from ahn_cli import config
 
 
@@ -11,17 +11,43 @@ from ahn_cli import config
 Options:
  -c, --city <city_name>        Specify the name of the city to download point cloud data for.
  -o, --output <file>           Set the name of the output file where the data will be saved.
+                               A .copc.laz file is written as a Cloud Optimized Point Cloud,
+                               .parquet, .arrow/.feather and .npy outputs are columnar.
  -i, --include-class <class>   Include specific point cloud classes in the download.
                                Classes should be specified in a comma-separated list.
  -e, --exclude-class <class>   Exclude specific point cloud classes from the download.
                                Classes should be specified in a comma-separated list.
  -d, --decimate <step>         Decimate the point cloud by a given step.
+ -vs, --voxel-size <m>         Decimate the point cloud to one point per voxel of the given size.
+ -pr, --poisson-radius <m>     Decimate the point cloud to points at least the given distance apart.
  -ncc --no-clip-city           Do not clip the point cloud data to the city boundary.
  -cf, --clip-file <file>       Specify a file path to a clipping boundary file. The tool will
                                use this file to clip the point cloud data to a specific area.
  -e, --epsg <epsg>             Set the EPSG code for user's clip file.
+ -sf, --split-features         Write one file per feature of the clip file into the output directory.
+ -fn, --feature-name <column>  Name the files of split features after a column of the clip file.
  -b, --bbox <bbox>             Specify a bounding box to clip the point cloud data. It should be comma-separated list with minx,miny,maxx,maxy
  -p, --preview                 Preview the point cloud data in a 3D viewer.
+ -cd, --cache-dir <dir>        Keep downloaded tiles in a persistent cache directory and reuse them.
+ -cs, --cache-size <MB>        Set the size budget of the tile cache in megabytes.
+ -rc, --revalidate-cache       Revalidate cached tiles against the server (ETag/Last-Modified).
+ -ck, --chunk-size <points>    Stream each tile in chunks of the given number of points to bound memory usage.
+ -mf, --max-in-flight <tiles>  Set the number of tiles that may be downloaded ahead of processing.
+ -w, --workers <n>             Process tiles in the given number of worker processes.
+ -mo, --min-tile-overlap <m2>  Skip tiles whose overlap with the city or bbox is smaller than the given area.
+ -dw, --download-workers <n>   Set the maximum number of parallel downloads.
+ -dc, --download-chunk-size <MB> Set the size of the chunks a download is written in.
+ -ac, --adaptive-concurrency   Adapt the number of parallel downloads to the measured throughput.
+ -af, --async-fetch            Download the tiles with asyncio instead of threads (requires aiohttp).
+ -bl, --bandwidth-limit <MB/s> Limit the total download bandwidth of asynchronous fetching.
+ -ts, --tile-size <m>          Write the output as a directory of square tiles of the given size.
+ -ps, --per-subunit            Write the output as a directory with one file per AHN subunit.
+ -col, --columns <dims>        Set the dimensions of Parquet, Arrow or npy output.
+ -sd, --selective-decompression Decompress the other fields only for chunks with filtered points.
+ -oc, --output-crs <crs>       Reproject the output points to another CRS, e.g. EPSG:25831 or EPSG:4326.
+ -j, --jobs <file>             Run the jobs of a JSON job file, downloading the tiles they share once.
+ -pf, --profile                Print the time, points and bytes of every stage of the run.
+ -po, --profile-output <file>  Write the metrics of the run as JSON (.json) or Prometheus text (.prom).
  -h, --help [category]         Display help information. Optionally, specify a category to get
                                more detailed help for a specific command.
  -v, --version                 Display the version number of the tool and exit.
@@ -34,7 +60,7 @@ Options:
     "-o",
     "--output",
     type=str,
-    help="Set the name of the output file where the data will be saved.",
+    help="Set the name of the output file where the data will be saved. A file ending with .copc.laz is written as a Cloud Optimized Point Cloud. A .parquet, .arrow/.feather or .npy output gets the columns of --columns.",
 )
 @click.option(
     "-c",
@@ -67,7 +93,7 @@ Options:
     "--clip-file",
     "clip_file",
     type=str,
-    help="Specify a file path to a clipping boundary file. The tool will use this file to clip the point cloud data to a specific area.",
+    help="Specify a file path to a clipping boundary file. The tool will use this file to clip the point cloud data to a specific area. Points inside any of its Polygon or MultiPolygon features are kept.",
 )
 @click.option(
     "-e",
@@ -75,12 +101,40 @@ Options:
     type=int,
     help="Set the EPSG code for user's clip file.",
 )
+@click.option(
+    "-sf",
+    "--split-features",
+    "split_features",
+    is_flag=True,
+    help="Write the points of every feature of the clip file into a file of its own, in one pass over the tiles. The output is a directory with the files and an index.geojson of the files.",
+)
+@click.option(
+    "-fn",
+    "--feature-name",
+    "feature_name",
+    type=str,
+    help="Name the files of --split-features after the values of a column of the clip file instead of the feature index.",
+)
 @click.option(
     "-d",
     "--decimate",
     type=int,
     help="Decimate the point cloud by a given step.",
 )
+@click.option(
+    "-vs",
+    "--voxel-size",
+    "voxel_size",
+    type=float,
+    help="Decimate the point cloud to the point closest to the centre of every voxel of the given size in metres. The voxel grid is aligned across tiles.",
+)
+@click.option(
+    "-pr",
+    "--poisson-radius",
+    "poisson_radius",
+    type=float,
+    help="Decimate the point cloud to a Poisson-disk sample with points at least the given distance in metres apart. The distance holds within every tile, or chunk with --chunk-size.",
+)
 @click.option(
     "-b",
     "--bbox",
@@ -93,6 +147,143 @@ Options:
     is_flag=True,
     help="Preview the point cloud data in a 3D viewer.",
 )
+@click.option(
+    "-cd",
+    "--cache-dir",
+    "cache_dir",
+    type=str,
+    help="Keep downloaded tiles in a persistent cache directory and reuse them in later runs.",
+)
+@click.option(
+    "-cs",
+    "--cache-size",
+    "cache_size",
+    type=int,
+    help="Set the size budget of the tile cache in megabytes. The least recently used tiles are evicted first.",
+)
+@click.option(
+    "-rc",
+    "--revalidate-cache",
+    "revalidate_cache",
+    is_flag=True,
+    help="Revalidate cached tiles against the server (ETag/Last-Modified) instead of using them without network access.",
+)
+@click.option(
+    "-ck",
+    "--chunk-size",
+    "chunk_size",
+    type=int,
+    help="Stream each tile in chunks of the given number of points instead of reading whole tiles, which bounds the memory usage.",
+)
+@click.option(
+    "-mf",
+    "--max-in-flight",
+    "max_in_flight",
+    type=int,
+    help="Set the number of tiles that may be downloading or waiting to be processed at the same time. Defaults to 8.",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=int,
+    help="Process tiles in the given number of worker processes. The filtered tiles are merged into the output in the order they were fetched.",
+)
+@click.option(
+    "-mo",
+    "--min-tile-overlap",
+    "min_tile_overlap",
+    type=float,
+    help="Skip tiles whose overlap with the city or bounding box is smaller than the given area in square metres.",
+)
+@click.option(
+    "-dw",
+    "--download-workers",
+    "download_workers",
+    type=int,
+    help="Set the maximum number of parallel downloads, which is also the size of the HTTP connection pool. Defaults to 8.",
+)
+@click.option(
+    "-dc",
+    "--download-chunk-size",
+    "download_chunk_size",
+    type=int,
+    help="Set the size in megabytes of the chunks a download is written in. Defaults to 8.",
+)
+@click.option(
+    "-ac",
+    "--adaptive-concurrency",
+    "adaptive_concurrency",
+    is_flag=True,
+    help="Adapt the number of parallel downloads to the measured throughput, up to the number of download workers.",
+)
+@click.option(
+    "-af",
+    "--async-fetch",
+    "async_fetch",
+    is_flag=True,
+    help="Download the tiles with asyncio instead of a thread per download, for pulls of thousands of tiles. The number of download workers sets the number of connections. Requires the 'async' extra (aiohttp).",
+)
+@click.option(
+    "-bl",
+    "--bandwidth-limit",
+    "bandwidth_limit",
+    type=float,
+    help="Limit the total download bandwidth in megabytes per second. Only with --async-fetch.",
+)
+@click.option(
+    "-ts",
+    "--tile-size",
+    "tile_size",
+    type=float,
+    help="Write the output as a directory of square tiles of the given size in metres (EPSG:28992), at least 1, with an index.geojson of the tiles. The output is the directory.",
+)
+@click.option(
+    "-ps",
+    "--per-subunit",
+    "per_subunit",
+    is_flag=True,
+    help="Write the output as a directory with one file per AHN subunit and an index.geojson of the files. The output is the directory.",
+)
+@click.option(
+    "-col",
+    "--columns",
+    "columns",
+    type=str,
+    help="Set the dimensions written to a .parquet, .arrow/.feather or .npy output as a comma-separated list. Defaults to x,y,z,classification,intensity.",
+)
+@click.option(
+    "-sd",
+    "--selective-decompression",
+    "selective_decompression",
+    is_flag=True,
+    help="Filter on the decompressed coordinates and classes only, and decompress the other fields only for tiles or chunks with points that pass the filters. Pays off with class filters or small clip areas, best together with --chunk-size.",
+)
+@click.option(
+    "-oc",
+    "--output-crs",
+    "output_crs",
+    type=str,
+    help="Reproject the output points from RD New to another CRS, e.g. EPSG:25831 (ETRS89 / UTM 31N) or EPSG:4326 (WGS84). Heights stay NAP heights unless the CRS is three-dimensional or compound, e.g. EPSG:4979 or EPSG:25831+5709.",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=str,
+    help="Run the jobs of a JSON job file, each with its own city or bbox, filters and output, in one invocation. Tiles needed by several jobs are downloaded and decompressed once. The download, cache, chunk and profile options apply to all jobs.",
+)
+@click.option(
+    "-pf",
+    "--profile",
+    is_flag=True,
+    help="Print the time, points in and out, and bytes of every stage (fetch, rasterize, decode, every filter step and write) and the slowest tiles after the run.",
+)
+@click.option(
+    "-po",
+    "--profile-output",
+    "profile_output",
+    type=str,
+    help="Write the metrics of the run, per stage and per tile, to a file as JSON (.json) or in the Prometheus text format (.prom) for the node exporter's textfile collector.",
+)
 def main(**kwargs: Any) -> None:
     cfg = config.Config()
     params = cast(CLIArgs, kwargs)
@@ -112,12 +303,83 @@ def main(**kwargs: Any) -> None:
     clip_file = params.get("clip_file")
     epsg = params.get("epsg")
     decimate = params.get("decimate")
+    voxel_size = params.get("voxel_size")
+    poisson_radius = params.get("poisson_radius")
     bbox = (
         [float(x) for x in str(params.get("bbox", "")).split(",")]
         if params.get("bbox", "")
         else None
     )
     preview = params.get("preview")
+    cache_dir = params.get("cache_dir")
+    cache_size = params.get("cache_size")
+    revalidate_cache = params.get("revalidate_cache")
+    chunk_size = params.get("chunk_size")
+    max_in_flight = params.get("max_in_flight") or cfg.max_tiles_in_flight
+    workers = params.get("workers")
+    min_tile_overlap = params.get("min_tile_overlap")
+    download_workers = params.get("download_workers") or cfg.download_workers
+    download_chunk_size = (
+        params.get("download_chunk_size") or cfg.download_chunk_size
+    )
+    adaptive_concurrency = params.get("adaptive_concurrency")
+    async_fetch = params.get("async_fetch")
+    bandwidth_limit = params.get("bandwidth_limit")
+    tile_size = params.get("tile_size")
+    per_subunit = params.get("per_subunit")
+    selective_decompression = params.get("selective_decompression")
+    profile = params.get("profile")
+    profile_output = params.get("profile_output")
+    jobs_path = params.get("jobs")
+    split_features = params.get("split_features")
+    feature_name = params.get("feature_name")
+    output_crs = params.get("output_crs")
+    columns = (
+        [c.strip() for c in str(params.get("columns", "")).split(",")]
+        if params.get("columns", "")
+        else None
+    )
+    if jobs_path:
+        jobs = validate_batch(
+            cfg,
+            jobs_path,
+            output,
+            city,
+            bbox,
+            workers,
+            preview,
+            selective_decompression,
+            cache_dir,
+            cache_size,
+            chunk_size,
+            max_in_flight,
+            min_tile_overlap,
+            download_workers,
+            download_chunk_size,
+            adaptive_concurrency,
+            async_fetch,
+            bandwidth_limit,
+            profile_output,
+        )
+        process_batch(
+            cfg.geotiles_base_url,
+            str(cfg.city_polygon_file),
+            jobs,
+            cache_dir,
+            cache_size,
+            revalidate_cache,
+            chunk_size,
+            max_in_flight,
+            min_tile_overlap,
+            download_workers,
+            download_chunk_size,
+            adaptive_concurrency,
+            async_fetch,
+            bandwidth_limit,
+            profile,
+            profile_output,
+        )
+        return
     if validate_all(
         cfg,
         output,
@@ -129,6 +391,27 @@ def main(**kwargs: Any) -> None:
         epsg,
         decimate,
         bbox,
+        cache_dir,
+        cache_size,
+        chunk_size,
+        max_in_flight,
+        workers,
+        min_tile_overlap,
+        download_workers,
+        download_chunk_size,
+        adaptive_concurrency,
+        async_fetch,
+        bandwidth_limit,
+        tile_size,
+        per_subunit,
+        preview,
+        columns,
+        voxel_size,
+        poisson_radius,
+        profile_output,
+        split_features,
+        feature_name,
+        output_crs,
     ):
         process(
             cfg.geotiles_base_url,
@@ -143,6 +426,29 @@ def main(**kwargs: Any) -> None:
             decimate,
             bbox,
             preview,
+            cache_dir,
+            cache_size,
+            revalidate_cache,
+            chunk_size,
+            max_in_flight,
+            workers,
+            min_tile_overlap,
+            download_workers,
+            download_chunk_size,
+            adaptive_concurrency,
+            async_fetch,
+            bandwidth_limit,
+            tile_size,
+            per_subunit,
+            columns,
+            selective_decompression,
+            voxel_size,
+            poisson_radius,
+            profile,
+            profile_output,
+            split_features,
+            feature_name,
+            output_crs,
         )
 
 
@@ -0,0 +1,526 @@
+import hashlib
+import os
+import re
+import tempfile
+from typing import Any, Callable
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from rasterio.transform import Affine
+from shapely import MultiPolygon, Polygon
+
+from ahn_cli.manipulator import rasterizer
+from ahn_cli.manipulator.transformer import tranform_polygon
+
+MIN_RESOLUTION = 1.0  # metres
+MAX_CELLS = 4_000_000
+
+
+def adaptive_resolution(
+    polygon: Polygon | MultiPolygon,
+    min_resolution: float = MIN_RESOLUTION,
+    max_cells: int = MAX_CELLS,
+) -> float:
+    """
+    Chooses the finest raster resolution for a polygon that keeps the raster
+    within `max_cells` cells.
+
+    A finer raster has fewer points in boundary cells, which need the exact
+    test, so the resolution is only limited by the memory of the raster.
+
+    Args:
+        polygon (Polygon | MultiPolygon): The polygon to rasterize.
+        min_resolution (float, optional): The finest resolution to use.
+        max_cells (int, optional): The maximum number of raster cells.
+
+    Returns:
+        float: The raster resolution.
+    """
+    minx, miny, maxx, maxy = polygon.bounds
+    area = max(maxx - minx, min_resolution) * max(maxy - miny, min_resolution)
+    return max(min_resolution, float(np.sqrt(area / max_cells)))
+
+
+class PolygonClipper:
+    """
+    Exact point-in-polygon test accelerated by a raster of the polygon.
+
+    Points in raster cells that lie entirely inside or outside the polygon
+    are classified by a lookup in the raster. Only points in cells crossed by
+    the polygon's boundary are tested exactly with `shapely.intersects_xy`,
+    which is a small fraction of the points for any reasonable resolution.
+    Points on the boundary count as inside.
+
+    Args:
+        polygon (Polygon | MultiPolygon): The clip polygon, in the same CRS as
+            the points.
+        resolution (float | None, optional): The raster resolution. Defaults
+            to None, which chooses the resolution with `adaptive_resolution`.
+
+    Attributes:
+        polygon (Polygon | MultiPolygon): The clip polygon.
+        resolution (float): The raster resolution.
+        raster (np.ndarray): The cell classes, see
+            `rasterizer.polygon_to_cell_classes`.
+        transform (Affine): The affine transformation matrix of the raster.
+
+    Methods:
+        cached: Builds a clipper, memoized on disk.
+        contains: Returns a mask of the points inside the polygon.
+        classify_box: Classifies a box as inside, outside or crossing the
+            polygon.
+    """
+
+    def __init__(
+        self,
+        polygon: Polygon | MultiPolygon,
+        resolution: float | None = None,
+    ) -> None:
+        self.polygon = polygon
+        self.resolution = (
+            resolution
+            if resolution is not None
+            else adaptive_resolution(polygon)
+        )
+        self.raster, self.transform = rasterizer.polygon_to_cell_classes(
+            polygon, self.resolution
+        )
+        shapely.prepare(self.polygon)
+
+    @classmethod
+    def cached(
+        cls,
+        polygon: Polygon | MultiPolygon,
+        resolution: float | None = None,
+        cache_dir: str | None = None,
+    ) -> "PolygonClipper":
+        """
+        Builds a clipper, reusing the raster stored in `cache_dir` by an
+        earlier run for the same polygon and resolution.
+
+        Args:
+            polygon (Polygon | MultiPolygon): The clip polygon.
+            resolution (float | None, optional): The raster resolution.
+                Defaults to None, which chooses it adaptively.
+            cache_dir (str | None, optional): The directory where rasters are
+                memoized. Defaults to None, which disables the memoization.
+
+        Returns:
+            PolygonClipper: The clipper.
+        """
+        if resolution is None:
+            resolution = adaptive_resolution(polygon)
+        if cache_dir is None:
+            return cls(polygon, resolution)
+
+        key = hashlib.sha256(
+            shapely.to_wkb(polygon) + np.float64(resolution).tobytes()
+        ).hexdigest()
+        raster, transform = _memoized_raster(
+            os.path.join(cache_dir, f"{key}.npz"),
+            lambda: rasterizer.polygon_to_cell_classes(polygon, resolution),
+        )
+        clipper = cls.__new__(cls)
+        clipper.__setstate__(
+            {
+                "polygon": polygon,
+                "resolution": resolution,
+                "raster": raster,
+                "transform": transform,
+            }
+        )
+        return clipper
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        # Prepared geometries do not survive pickling, e.g. when the clipper
+        # is sent to a worker process.
+        self.__dict__.update(state)
+        shapely.prepare(self.polygon)
+
+    def contains(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """
+        Returns a mask of the points inside the polygon.
+
+        Args:
+            x (np.ndarray): The x coordinates of the points.
+            y (np.ndarray): The y coordinates of the points.
+
+        Returns:
+            np.ndarray: A boolean mask, True for the points inside the polygon.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        cols = np.floor((x - self.transform.c) / self.resolution)
+        rows = np.floor((self.transform.f - y) / self.resolution)
+        height, width = self.raster.shape
+        in_extent = (
+            (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+        )
+
+        classes = np.full(len(x), rasterizer.OUTSIDE, dtype=np.uint8)
+        classes[in_extent] = self.raster[
+            rows[in_extent].astype(np.intp), cols[in_extent].astype(np.intp)
+        ]
+
+        mask = classes == rasterizer.INSIDE
+        boundary = np.flatnonzero(classes == rasterizer.BOUNDARY)
+        if len(boundary) > 0:
+            mask[boundary] = shapely.intersects_xy(
+                self.polygon, x[boundary], y[boundary]
+            )
+        return mask
+
+    def classify_box(
+        self, minx: float, miny: float, maxx: float, maxy: float
+    ) -> int:
+        """
+        Classifies a box, e.g. the bounds of a tile, against the polygon.
+
+        Args:
+            minx (float): The minimum x of the box.
+            miny (float): The minimum y of the box.
+            maxx (float): The maximum x of the box.
+            maxy (float): The maximum y of the box.
+
+        Returns:
+            int: `rasterizer.INSIDE` if all points of the box are inside the
+                polygon, `rasterizer.OUTSIDE` if none are, and
+                `rasterizer.BOUNDARY` otherwise.
+        """
+        if minx >= maxx or miny >= maxy:
+            # A degenerate box is not a valid polygon, test it point-wise.
+            return rasterizer.BOUNDARY
+        box = shapely.box(minx, miny, maxx, maxy)
+        if not self.polygon.intersects(box):
+            return rasterizer.OUTSIDE
+        if self.polygon.covers(box):
+            return rasterizer.INSIDE
+        return rasterizer.BOUNDARY
+
+
+class FeatureClipper:
+    """
+    Labels points with the index of the clip feature they lie in, for clip
+    files with any number of Polygon and MultiPolygon features, e.g.
+    thousands of parcels.
+
+    The features are indexed with an STRtree. Points in raster cells that
+    lie entirely inside a feature or outside all features are labelled by a
+    lookup in a raster of feature indices. Only points in cells crossed by a
+    boundary are tested exactly, with one bulk query of the tree, so that
+    there is no pass over the points per feature. Points on a boundary count
+    as inside, and points in overlapping features get the lowest index.
+
+    Args:
+        features (list[Polygon | MultiPolygon]): The clip features, in the
+            same CRS as the points.
+        resolution (float | None, optional): The raster resolution. Defaults
+            to None, which chooses the resolution with `adaptive_resolution`.
+
+    Attributes:
+        features (list[Polygon | MultiPolygon]): The clip features.
+        resolution (float): The raster resolution.
+        raster (np.ndarray): The cell labels, see
+            `rasterizer.polygons_to_cell_labels`.
+        transform (Affine): The affine transformation matrix of the raster.
+        tree (shapely.STRtree): The spatial index of the features.
+
+    Methods:
+        cached: Builds a clipper, memoized on disk.
+        labels: Returns the index of the feature every point lies in.
+        contains: Returns a mask of the points inside any feature.
+        classify_box: Classifies a box as inside a feature, outside all
+            features or crossing a boundary.
+    """
+
+    def __init__(
+        self,
+        features: list[Polygon | MultiPolygon],
+        resolution: float | None = None,
+    ) -> None:
+        if len(features) == 0:
+            raise ValueError("At least one clip feature is required.")
+        self.features = list(features)
+        self.resolution = (
+            resolution
+            if resolution is not None
+            else adaptive_resolution(_extent(self.features))
+        )
+        self.raster, self.transform = rasterizer.polygons_to_cell_labels(
+            self.features, self.resolution
+        )
+        self.tree = shapely.STRtree(self.features)
+
+    @classmethod
+    def cached(
+        cls,
+        features: list[Polygon | MultiPolygon],
+        resolution: float | None = None,
+        cache_dir: str | None = None,
+    ) -> "FeatureClipper":
+        """
+        Builds a clipper, reusing the raster stored in `cache_dir` by an
+        earlier run for the same features and resolution.
+
+        Args:
+            features (list[Polygon | MultiPolygon]): The clip features.
+            resolution (float | None, optional): The raster resolution.
+                Defaults to None, which chooses it adaptively.
+            cache_dir (str | None, optional): The directory where rasters are
+                memoized. Defaults to None, which disables the memoization.
+
+        Returns:
+            FeatureClipper: The clipper.
+        """
+        if len(features) == 0:
+            raise ValueError("At least one clip feature is required.")
+        if resolution is None:
+            resolution = adaptive_resolution(_extent(features))
+        if cache_dir is None:
+            return cls(features, resolution)
+
+        digest = hashlib.sha256(b"features")
+        for feature in features:
+            digest.update(shapely.to_wkb(feature))
+        digest.update(np.float64(resolution).tobytes())
+        raster, transform = _memoized_raster(
+            os.path.join(cache_dir, f"{digest.hexdigest()}.npz"),
+            lambda: rasterizer.polygons_to_cell_labels(features, resolution),
+        )
+        clipper = cls.__new__(cls)
+        clipper.features = list(features)
+        clipper.resolution = resolution
+        clipper.raster = raster
+        clipper.transform = transform
+        clipper.tree = shapely.STRtree(clipper.features)
+        return clipper
+
+    def labels(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """
+        Returns the index of the feature every point lies in.
+
+        Args:
+            x (np.ndarray): The x coordinates of the points.
+            y (np.ndarray): The y coordinates of the points.
+
+        Returns:
+            np.ndarray: The int32 feature indices, `rasterizer.NO_FEATURE`
+                for the points outside all features.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        cols = np.floor((x - self.transform.c) / self.resolution)
+        rows = np.floor((self.transform.f - y) / self.resolution)
+        height, width = self.raster.shape
+        in_extent = (
+            (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+        )
+
+        labels = np.full(len(x), rasterizer.NO_FEATURE, dtype=np.int32)
+        labels[in_extent] = self.raster[
+            rows[in_extent].astype(np.intp), cols[in_extent].astype(np.intp)
+        ]
+
+        boundary = np.flatnonzero(labels == rasterizer.BOUNDARY_LABEL)
+        labels[boundary] = rasterizer.NO_FEATURE
+        if len(boundary) > 0:
+            points, features = self.tree.query(
+                shapely.points(x[boundary], y[boundary]),
+                predicate="intersects",
+            )
+            # The lowest feature index of every point.
+            order = np.lexsort((features, points))
+            points, features = points[order], features[order]
+            first = np.ones(len(points), dtype=bool)
+            first[1:] = points[1:] != points[:-1]
+            labels[boundary[points[first]]] = features[first]
+        return labels
+
+    def contains(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """
+        Returns a mask of the points inside any feature.
+
+        Args:
+            x (np.ndarray): The x coordinates of the points.
+            y (np.ndarray): The y coordinates of the points.
+
+        Returns:
+            np.ndarray: A boolean mask, True for the points inside a feature.
+        """
+        return self.labels(x, y) != rasterizer.NO_FEATURE
+
+    def classify_box(
+        self, minx: float, miny: float, maxx: float, maxy: float
+    ) -> int:
+        """
+        Classifies a box, e.g. the bounds of a tile, against the features.
+
+        Args:
+            minx (float): The minimum x of the box.
+            miny (float): The minimum y of the box.
+            maxx (float): The maximum x of the box.
+            maxy (float): The maximum y of the box.
+
+        Returns:
+            int: `rasterizer.INSIDE` if the box lies inside a single
+                feature, `rasterizer.OUTSIDE` if it misses all features, and
+                `rasterizer.BOUNDARY` otherwise.
+        """
+        if minx >= maxx or miny >= maxy:
+            # A degenerate box is not a valid polygon, test it point-wise.
+            return rasterizer.BOUNDARY
+        box = shapely.box(minx, miny, maxx, maxy)
+        if len(self.tree.query(box, predicate="intersects")) == 0:
+            return rasterizer.OUTSIDE
+        if len(self.tree.query(box, predicate="covered_by")) > 0:
+            return rasterizer.INSIDE
+        return rasterizer.BOUNDARY
+
+
+def _extent(features: list[Polygon | MultiPolygon]) -> Polygon:
+    """
+    Returns the bounding box of features.
+    """
+    return shapely.box(*shapely.total_bounds(features))
+
+
+def _memoized_raster(
+    path: str, build: Callable[[], tuple[np.ndarray, Affine]]
+) -> tuple[np.ndarray, Affine]:
+    """
+    Loads a raster and its transform from `path`, or builds and stores them
+    there. The file is replaced atomically, so that concurrent runs never
+    read a partial raster.
+    """
+    if os.path.exists(path):
+        with np.load(path) as data:
+            return data["raster"], Affine(*data["transform"])
+
+    raster, transform = build()
+    cache_dir = os.path.dirname(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".npz")
+    with os.fdopen(fd, "wb") as f:
+        np.savez(f, raster=raster, transform=np.array(transform[:6]))
+    os.replace(tmp_path, path)
+    return raster, transform
+
+
+def city_clip_polygon(
+    city_df: gpd.GeoDataFrame, city_name: str
+) -> Polygon | MultiPolygon:
+    """
+    Returns the boundary of a city in EPSG:28992.
+
+    Args:
+        city_df (gpd.GeoDataFrame): The municipality data.
+        city_name (str): The name of the city, case insensitive.
+
+    Returns:
+        Polygon | MultiPolygon: The city's boundary, a MultiPolygon for
+            cities with islands.
+
+    Raises:
+        ValueError: If the polygon fails to be reprojected.
+    """
+    record = city_df[city_df["name"].str.lower() == city_name.lower()]
+    polygon = record.iloc[0].geometry
+    crs = city_df.crs
+    if crs is not None:
+        polygon = tranform_polygon(polygon, crs, "EPSG:28992")
+    if polygon is None:
+        raise ValueError("Failed to reproject polygon")
+    return polygon
+
+
+def file_clip_features(
+    filepath: str, epsg: str | None = None
+) -> list[Polygon | MultiPolygon]:
+    """
+    Reads the Polygon and MultiPolygon features of a clip file in
+    EPSG:28992. Features of other geometry types are ignored.
+
+    Args:
+        filepath (str): The path to the clip file.
+        epsg (str | None, optional): The CRS of the clip file, e.g.
+            "EPSG:4326". Defaults to None, which uses the CRS of the file.
+
+    Returns:
+        list[Polygon | MultiPolygon]: The clip features in the order of the
+            file.
+
+    Raises:
+        ValueError: If the clip file has no polygons.
+    """
+    gdf = _read_polygon_features(filepath)
+    if epsg is not None:
+        gdf = gdf.set_crs(epsg, allow_override=True)
+    if gdf.crs is not None:
+        gdf = gdf.to_crs("EPSG:28992")
+    return list(gdf.geometry)
+
+
+def file_clip_feature_names(
+    filepath: str, column: str | None = None
+) -> list[str]:
+    """
+    Returns names for the features of `file_clip_features`, usable as file
+    names: the values of a column, or "feature_<index>".
+
+    Args:
+        filepath (str): The path to the clip file.
+        column (str | None, optional): The column with the names. Defaults
+            to None, which names the features after their index.
+
+    Returns:
+        list[str]: The names in the order of the features.
+
+    Raises:
+        ValueError: If the clip file has no polygons, the column does not
+            exist, or the names are not unique.
+    """
+    gdf = _read_polygon_features(filepath)
+    if column is None:
+        return [f"feature_{i}" for i in range(len(gdf))]
+    if column not in gdf.columns:
+        raise ValueError(f"Clip file has no column {column}.")
+    names = [re.sub(r"[^\w.-]", "_", str(value)) for value in gdf[column]]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Values of column {column} are not unique.")
+    return names
+
+
+def _read_polygon_features(filepath: str) -> gpd.GeoDataFrame:
+    """
+    Reads the non-empty Polygon and MultiPolygon features of a clip file.
+    """
+    gdf = gpd.read_file(filepath)
+    gdf = gdf[
+        gdf.geometry.type.isin(["Polygon", "MultiPolygon"])
+        & ~gdf.geometry.is_empty
+    ]
+    if len(gdf) == 0:
+        raise ValueError("Clip file has no polygons.")
+    return gdf
+
+
+def file_clip_polygon(
+    filepath: str, epsg: str | None = None
+) -> Polygon | MultiPolygon:
+    """
+    Reads the union of the Polygon and MultiPolygon features of a clip file
+    in EPSG:28992.
+
+    Args:
+        filepath (str): The path to the clip file.
+        epsg (str | None, optional): The CRS of the clip file, e.g.
+            "EPSG:4326". Defaults to None, which uses the CRS of the file.
+
+    Returns:
+        Polygon | MultiPolygon: The clip polygon.
+
+    Raises:
+        ValueError: If the clip file has no polygons.
+    """
+    return shapely.union_all(file_clip_features(filepath, epsg))
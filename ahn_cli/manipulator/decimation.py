@@ -0,0 +1,126 @@
+import itertools
+
+import numpy as np
+
+# The Poisson-disk sampling grid has cells of radius / sqrt(3), which hold at
+# most one sample, so samples within the radius are at most two cells away.
+_NEIGHBOURS = np.array(list(itertools.product(range(-2, 3), repeat=3)))
+_PHASES = 27
+
+
+def voxel_grid_indices(xyz: np.ndarray, cell_size: float) -> np.ndarray:
+    """
+    Returns the indices of one point per cubic cell of a voxel grid, the
+    point closest to the centre of its cell.
+
+    The grid is anchored at the origin of the coordinates, so that cells of
+    adjacent tiles line up. Cells are binned by hashing the quantized
+    coordinates into one integer key and grouping the keys with a sort,
+    which takes O(n log n) time without Python loops.
+
+    Args:
+        xyz (np.ndarray): The coordinates of the points, of shape (n, 3).
+        cell_size (float): The size of the cells.
+
+    Returns:
+        np.ndarray: The sorted indices of the kept points.
+
+    Raises:
+        ValueError: If the cells are too small for the extent of the points.
+    """
+    if len(xyz) == 0:
+        return np.zeros(0, dtype=np.intp)
+    scaled = xyz / cell_size
+    cells = np.floor(scaled).astype(np.int64)
+    origin = cells.min(axis=0)
+    keys = _cell_keys(cells - origin, cells.max(axis=0) - origin + 1)
+    distances = np.sum((scaled - cells - 0.5) ** 2, axis=1)
+    order = np.lexsort((distances, keys))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = keys[order[1:]] != keys[order[:-1]]
+    return np.sort(order[first])
+
+
+def poisson_disk_indices(xyz: np.ndarray, radius: float) -> np.ndarray:
+    """
+    Returns the indices of an approximate Poisson-disk sample of the points,
+    in which no two points are closer than `radius`.
+
+    Every cell of a grid with cells of `radius / sqrt(3)` proposes the point
+    closest to its centre. The candidates are accepted in 27 phases of cells
+    that are three cells apart in every axis, so that the candidates of a
+    phase cannot conflict with each other. A candidate is accepted if no
+    sample of an earlier phase lies within the radius.
+
+    The pairs of candidates within the radius are found once, with one
+    vectorized lookup of the sorted cell keys per neighbouring cell offset,
+    which is a constant offset of the keys.
+
+    Args:
+        xyz (np.ndarray): The coordinates of the points, of shape (n, 3).
+        radius (float): The minimum distance between the samples.
+
+    Returns:
+        np.ndarray: The sorted indices of the sampled points.
+
+    Raises:
+        ValueError: If the radius is too small for the extent of the points.
+    """
+    cell_size = radius / np.sqrt(3)
+    candidates = voxel_grid_indices(xyz, cell_size)
+    if len(candidates) == 0:
+        return candidates
+    points = xyz[candidates]
+    cells = np.floor(points / cell_size).astype(np.int64)
+    # The cells are shifted to be non-negative, with two cells of room for
+    # the neighbours on every side, so that neighbour keys do not wrap.
+    cells -= cells.min(axis=0) - 2
+    extent = cells.max(axis=0) + 3
+    keys = _cell_keys(cells, extent)
+    order = np.argsort(keys)
+    keys, points, cells = keys[order], points[order], cells[order]
+    phases = _cell_keys(cells % 3, np.array([3, 3, 3]))
+
+    # The pairs within the radius whose second candidate is in an earlier
+    # phase, as only those can reject the first one.
+    firsts, seconds = [], []
+    for offset in _NEIGHBOURS:
+        if not offset.any():
+            continue
+        neighbour_keys = keys + _cell_keys(offset[np.newaxis], extent)[0]
+        pos = np.minimum(np.searchsorted(keys, neighbour_keys), len(keys) - 1)
+        first = np.flatnonzero(keys[pos] == neighbour_keys)
+        second = pos[first]
+        close = (phases[second] < phases[first]) & (
+            np.sum((points[first] - points[second]) ** 2, axis=1) < radius**2
+        )
+        firsts.append(first[close])
+        seconds.append(second[close])
+    first = np.concatenate(firsts)
+    second = np.concatenate(seconds)
+    by_phase = np.argsort(phases[first], kind="stable")
+    first, second = first[by_phase], second[by_phase]
+    bounds = np.searchsorted(phases[first], np.arange(_PHASES + 1))
+
+    accepted = np.zeros(len(keys), dtype=bool)
+    for phase in range(_PHASES):
+        start, end = bounds[phase], bounds[phase + 1]
+        rejected = np.zeros(len(keys), dtype=bool)
+        rejected[first[start:end][accepted[second[start:end]]]] = True
+        accepted |= (phases == phase) & ~rejected
+    return np.sort(candidates[order[accepted]])
+
+
+def _cell_keys(cells: np.ndarray, extent: np.ndarray) -> np.ndarray:
+    """
+    Hashes non-negative integer cell coordinates below `extent` into one
+    integer key per cell.
+
+    Raises:
+        ValueError: If the grid has too many cells for 64-bit keys.
+    """
+    if np.prod(extent.astype(np.float64)) >= 2**62:
+        raise ValueError(
+            "The grid has too many cells, the cells are too small."
+        )
+    return (cells[:, 0] * extent[1] + cells[:, 1]) * extent[2] + cells[:, 2]
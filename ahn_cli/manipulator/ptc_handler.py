@@ -3,11 +3,19 @@ from typing import Self
 import geopandas as gpd
 import laspy
 import numpy as np
-import rasterio
-from shapely import Polygon
+from shapely import MultiPolygon, Polygon
 
-from ahn_cli.manipulator import rasterizer
-from ahn_cli.manipulator.transformer import tranform_polygon
+from ahn_cli.fetcher.catalog import read_geodataframe
+from ahn_cli.manipulator.clipper import (
+    FeatureClipper,
+    PolygonClipper,
+    city_clip_polygon,
+    file_clip_features,
+)
+from ahn_cli.manipulator.decimation import (
+    poisson_disk_indices,
+    voxel_grid_indices,
+)
 
 
 class PntCHandler:
@@ -18,25 +26,34 @@ class PntCHandler:
         las (laspy.LasData): The point cloud data.
         city_df (gpd.GeoDataFrame): The city data.
         city_name (str): The name of the city.
-        raster_res (float): The raster resolution.
+        raster_res (float | None): The raster resolution used to speed up
+            clipping, chosen adaptively if None.
         epsg (str | None): The EPSG code.
+        lazy (bool): Whether the steps only narrow down the indices of the
+            surviving points, which are copied once by `points`, instead of
+            copying the point records after every step.
 
     Methods:
         __init__: Initializes the PntCHandler object.
         decimate: Decimates the point cloud by selecting every `step`-th point.
+        voxel_decimate: Keeps one point per cell of a voxel grid.
+        poisson_decimate: Keeps a Poisson-disk sample of the points.
         include: Filters the point cloud to include only the specified classes.
         exclude: Exclude points with specific classification values from the pipeline.
         clip: Clip the point cloud by a polygon.
         clip_by_arbitrary_polygon: Clip the point cloud by an arbitrary polygon.
         clip_by_bbox: Clips the point cloud by a bounding box.
+        count: Returns the number of points that pass the steps so far.
+        indices: Returns the indices of the points that pass the steps so far.
         points: Execute the pipeline and return the processed point cloud.
     """
 
     las = laspy.LasData
     city_df: gpd.GeoDataFrame
     city_name: str
-    raster_res: float = 10.0  # default raster resolution
+    raster_res: float | None = None  # adaptive raster resolution
     epsg: str | None = None
+    lazy: bool = False
 
     def __init__(
         self,
@@ -44,24 +61,63 @@ class PntCHandler:
         city_filepath: str,
         city_name: str,
         epsg: int = 4326,
+        lazy: bool = False,
     ) -> None:
         self.las = las
-        self.city_df = gpd.read_file(city_filepath)
+        self.city_df = read_geodataframe(city_filepath)
         self.city_name = city_name
         self.epsg = "EPSG:" + str(epsg)
+        self.lazy = lazy
+        # The indices of the surviving points in lazy mode, None while all
+        # points survive.
+        self._index: np.ndarray | None = None
 
-    def decimate(self, step: int) -> Self:
+    def decimate(self, step: int, start: int = 0) -> Self:
         """
         Decimates the point cloud by selecting every `step`-th point.
 
         Args:
             step (int): The decimation step size.
+            start (int, optional): The index of the first point to keep. Used
+                to continue the decimation across chunks of a tile.
+                Defaults to 0.
 
         Returns:
             Self: The modified pipeline object.
         """
-        valid_point_masks = np.arange(0, len(self.las.points), step)
-        self.las.points = self.las.points[valid_point_masks]
+        valid_point_masks = np.arange(start, self.count(), step)
+        self._keep(valid_point_masks)
+        return self
+
+    def voxel_decimate(self, cell_size: float) -> Self:
+        """
+        Decimates the point cloud to one point per cubic cell of a voxel
+        grid, the point closest to the centre of its cell. The grid is
+        anchored at the origin, so that the cells of adjacent tiles line up.
+
+        Args:
+            cell_size (float): The size of the cells in metres.
+
+        Returns:
+            Self: The modified pipeline object.
+        """
+        self._keep(voxel_grid_indices(self._xyz(), cell_size))
+        return self
+
+    def poisson_decimate(self, radius: float) -> Self:
+        """
+        Decimates the point cloud to a Poisson-disk sample, in which no two
+        points are closer than `radius`, which preserves the shape of the
+        surfaces better than a voxel grid.
+
+        Args:
+            radius (float): The minimum distance between the points in
+                metres.
+
+        Returns:
+            Self: The modified pipeline object.
+        """
+        self._keep(poisson_disk_indices(self._xyz(), radius))
         return self
 
     def include(self, include_classes: list[int]) -> Self:
@@ -74,8 +130,8 @@ class PntCHandler:
         Returns:
             Self: The updated instance of the pipeline.
         """
-        mask = np.isin(self.las.classification, include_classes)
-        self.las.points = self.las.points[mask]
+        mask = np.isin(self._dimension("classification"), include_classes)
+        self._keep(mask)
         return self
 
     def exclude(self, exclude_classes: list[int]) -> Self:
@@ -89,80 +145,53 @@ class PntCHandler:
             Self: The modified pipeline object.
 
         """
-        mask = np.isin(self.las.classification, exclude_classes, invert=True)
-        self.las.points = self.las.points[mask]
+        mask = np.isin(
+            self._dimension("classification"), exclude_classes, invert=True
+        )
+        self._keep(mask)
         return self
 
-    def clip(self) -> Self:
+    def clip(self, clipper: PolygonClipper | None = None) -> Self:
         """
         Clips the point cloud to the extent of the city polygon.
 
+        Args:
+            clipper (PolygonClipper | None, optional): A prebuilt clipper of
+                the city polygon, shared by all tiles of a run. Defaults to
+                None, which builds it from the city file.
+
         Returns:
             Self: The modified pipeline object.
         """
-        rasterized_polygon, transform = rasterizer.polygon_to_raster(
-            self._city_polygon(), self.raster_res
-        )
+        if clipper is None:
+            clipper = PolygonClipper(self._city_polygon(), self.raster_res)
+        return self._clip_by_clipper(clipper)
 
-        xyz = self.las.xyz
-        transformer = rasterio.transform.AffineTransformer(transform)
-        rows, cols = transformer.rowcol(xyz[:, 0], xyz[:, 1])
-        rows, cols = np.array(rows, dtype=int), np.array(cols, dtype=int)
-        # Store original bounds checks
-        original_rows_out_of_bounds = (rows < 0) | (
-            rows >= rasterized_polygon.shape[0]
-        )
-        original_cols_out_of_bounds = (cols < 0) | (
-            cols >= rasterized_polygon.shape[1]
-        )
-
-        rows = np.clip(rows, 0, rasterized_polygon.shape[0] - 1)
-        cols = np.clip(cols, 0, rasterized_polygon.shape[1] - 1)
-        valid_points_mask = (
-            (rasterized_polygon[rows, cols] == 1)
-            & (~original_rows_out_of_bounds)
-            & (~original_cols_out_of_bounds)
-        )
-        self.las.points = self.las.points[valid_points_mask]
-        return self
-
-    def clip_by_arbitrary_polygon(self, clip_file: str) -> Self:
+    def clip_by_arbitrary_polygon(
+        self,
+        clip_file: str,
+        clipper: PolygonClipper | FeatureClipper | None = None,
+    ) -> Self:
         """
-        Clips the point cloud by an arbitrary polygon defined in a clip file.
+        Clips the point cloud by the Polygon and MultiPolygon features of a
+        clip file, keeping the points inside any of them.
 
         Args:
-            clip_file (str): The path to the clip file containing the polygon.
+            clip_file (str): The path to the clip file containing the
+                polygons.
+            clipper (PolygonClipper | FeatureClipper | None, optional): A
+                prebuilt clipper of the clip file's polygons, shared by all
+                tiles of a run. Defaults to None, which builds it from the
+                clip file.
 
         Returns:
             Self: The modified instance of the pipeline.
         """
-
-        polygon = self._arbitrary_polygon(clip_file)
-        rasterized_polygon, transform = rasterizer.polygon_to_raster(
-            polygon, self.raster_res
-        )
-
-        xyz = self.las.xyz
-        transformer = rasterio.transform.AffineTransformer(transform)
-        rows, cols = transformer.rowcol(xyz[:, 0], xyz[:, 1])
-        rows, cols = np.array(rows, dtype=int), np.array(cols, dtype=int)
-        # Store original bounds checks
-        original_rows_out_of_bounds = (rows < 0) | (
-            rows >= rasterized_polygon.shape[0]
-        )
-        original_cols_out_of_bounds = (cols < 0) | (
-            cols >= rasterized_polygon.shape[1]
-        )
-
-        rows = np.clip(rows, 0, rasterized_polygon.shape[0] - 1)
-        cols = np.clip(cols, 0, rasterized_polygon.shape[1] - 1)
-        valid_points_mask = (
-            (rasterized_polygon[rows, cols] == 1)
-            & (~original_rows_out_of_bounds)
-            & (~original_cols_out_of_bounds)
-        )
-        self.las.points = self.las.points[valid_points_mask]
-        return self
+        if clipper is None:
+            clipper = FeatureClipper(
+                self._arbitrary_features(clip_file), self.raster_res
+            )
+        return self._clip_by_clipper(clipper)
 
     def clip_by_bbox(self, bbox: list[float]) -> Self:
         """
@@ -175,66 +204,153 @@ class PntCHandler:
             Self: The modified instance of the pipeline.
         """
 
-        x_valid = (self.las.x >= bbox[0]) & (self.las.x <= bbox[2])
-        y_valid = (self.las.y >= bbox[1]) & (self.las.y <= bbox[3])
+        x, y = self._xy()
+        x_valid = (x >= bbox[0]) & (x <= bbox[2])
+        y_valid = (y >= bbox[1]) & (y <= bbox[3])
         valid_points_mask = np.where(x_valid & y_valid)[0]
-        self.las.points = self.las.points[valid_points_mask]
+        self._keep(valid_points_mask)
 
         return self
 
+    def count(self) -> int:
+        """
+        Returns the number of points that pass the steps so far, without
+        copying the points in lazy mode.
+
+        Returns:
+            int: The number of points.
+        """
+        if self._index is not None:
+            return len(self._index)
+        return len(self.las.points)
+
+    def indices(self) -> np.ndarray:
+        """
+        Returns the indices of the points that pass the steps so far into the
+        points the handler was created with, e.g. to take the survivors from
+        a differently decompressed copy of the points. Only in lazy mode, as
+        the other steps drop the points.
+
+        Returns:
+            np.ndarray: The indices of the points.
+
+        Raises:
+            ValueError: If the handler is not lazy.
+        """
+        if not self.lazy:
+            raise ValueError("Indices are only kept in lazy mode.")
+        if self._index is not None:
+            return self._index
+        return np.arange(len(self.las.points))
+
     def points(self) -> laspy.LasData:
         """
-        Returns the point cloud data.
+        Returns the point cloud data. In lazy mode, the surviving points are
+        copied here, once for all steps.
 
         Returns:
             laspy.LasData: The point cloud data.
         """
+        if self._index is not None:
+            self.las.points = self.las.points[self._index]
+            self._index = None
         return self.las
 
-    def _city_polygon(self) -> Polygon:
+    def _keep(self, selection: np.ndarray) -> None:
+        """
+        Keeps the points selected by a boolean mask or by indices into the
+        points that pass the steps so far.
+
+        Args:
+            selection (np.ndarray): The mask or indices of the points to keep.
+        """
+        if not self.lazy:
+            self.las.points = self.las.points[selection]
+        elif self._index is None:
+            self._index = np.arange(len(self.las.points))[selection]
+        else:
+            self._index = self._index[selection]
+
+    def _dimension(self, name: str) -> np.ndarray:
+        """
+        Returns a dimension of the points that pass the steps so far.
+        """
+        values = np.asarray(self.las[name])
+        return values if self._index is None else values[self._index]
+
+    def _xy(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the scaled x and y of the points that pass the steps so far.
+        Only the coordinates of these points are scaled in lazy mode.
+        """
+        if self._index is None:
+            return np.asarray(self.las.x), np.asarray(self.las.y)
+        scales, offsets = self.las.points.scales, self.las.points.offsets
+        x = self.las.points.array["X"][self._index] * scales[0] + offsets[0]
+        y = self.las.points.array["Y"][self._index] * scales[1] + offsets[1]
+        return x, y
+
+    def _xyz(self) -> np.ndarray:
+        """
+        Returns the scaled coordinates of the points that pass the steps so
+        far, of shape (n, 3).
+        """
+        x, y = self._xy()
+        if self._index is None:
+            z = np.asarray(self.las.z)
+        else:
+            z = (
+                self.las.points.array["Z"][self._index]
+                * self.las.points.scales[2]
+                + self.las.points.offsets[2]
+            )
+        return np.stack([x, y, z], axis=1)
+
+    def _clip_by_clipper(
+        self, clipper: PolygonClipper | FeatureClipper
+    ) -> Self:
+        """
+        Keeps the points that lie inside the clipper's polygons.
+
+        Args:
+            clipper (PolygonClipper | FeatureClipper): The clipper of polygons
+                in EPSG:28992.
+
+        Returns:
+            Self: The modified instance of the pipeline.
+        """
+        valid_points_mask = clipper.contains(*self._xy())
+        self._keep(valid_points_mask)
+        return self
+
+    def _city_polygon(self) -> Polygon | MultiPolygon:
         """
         Retrieves the polygon for a given city name.
 
         Args:
             None
         Returns:
-            Polygon: The polygon representing the city's boundary.
+            Polygon | MultiPolygon: The polygon representing the city's
+                boundary.
         Raises:
             ValueError: If the polygon fails to be reprojected.
         """
-        record = self.city_df[
-            self.city_df["name"].str.lower() == self.city_name.lower()
-        ]
-        polygon = record.iloc[0].geometry
-        crs = self.city_df.crs
-        if crs is not None:
-            polygon = tranform_polygon(polygon, crs, "EPSG:28992")
-        if polygon is None:
-            raise ValueError("Failed to reproject polygon")
-        return polygon
+        return city_clip_polygon(self.city_df, self.city_name)
 
-    def _arbitrary_polygon(self, filepath: str) -> Polygon:
+    def _arbitrary_features(
+        self, filepath: str
+    ) -> list[Polygon | MultiPolygon]:
         """
-        Reads a file containing city data, extracts the first polygon geometry,
-        transforms it to a specific coordinate reference system (CRS), and returns
-        the well-known text (WKT) representation of the polygon.
+        Reads the Polygon and MultiPolygon features of a clip file in
+        EPSG:28992.
 
         Args:
-            filepath (str): The path to the file containing city data.
+            filepath (str): The path to the clip file.
 
         Returns:
-            str: The well-known text (WKT) representation of the polygon.
+            list[Polygon | MultiPolygon]: The clip features.
 
         Raises:
-            ValueError: If the polygon fails to be reprojected.
+            ValueError: If the clip file has no polygons.
         """
-        gdf = gpd.read_file(filepath)
-        polygon = gdf[gdf.geometry.type == "Polygon"].iloc[0].geometry
-        crs = gdf.crs
-        if self.epsg is not None:
-            polygon = tranform_polygon(polygon, self.epsg, "EPSG:28992")
-        elif crs is not None:
-            polygon = tranform_polygon(polygon, crs, "EPSG:28992")
-        if polygon is None:
-            raise ValueError("Failed to reproject polygon")
-        return polygon
+        return file_clip_features(filepath, self.epsg)
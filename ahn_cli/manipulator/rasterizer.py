@@ -3,7 +3,7 @@ from typing import Tuple
 import numpy as np
 from rasterio.features import rasterize
 from rasterio.transform import Affine, from_origin
-from shapely import Polygon
+from shapely import MultiPolygon, Polygon
 
 
 def polygon_to_raster(
@@ -38,3 +38,125 @@ def polygon_to_raster(
         dtype="uint8",
     )
     return rasterized, transform
+
+
+OUTSIDE = 0
+INSIDE = 1
+BOUNDARY = 2
+
+
+def polygon_to_cell_classes(
+    polygon: Polygon | MultiPolygon,
+    resolution: float,
+) -> Tuple[np.ndarray, Affine]:
+    """
+    Classifies the cells of a raster over the polygon's extent as lying
+    entirely outside, entirely inside or on the boundary of the polygon.
+
+    Cells touched by the polygon's boundary, and their direct neighbours to
+    be robust against rounding in the rasterization, are BOUNDARY. Every other
+    cell lies entirely on one side of the boundary, so its centre decides
+    whether it is INSIDE or OUTSIDE.
+
+    Args:
+        polygon (Polygon | MultiPolygon): The polygon to classify the cells of.
+        resolution (float): The size of a cell.
+
+    Returns:
+        Tuple[np.ndarray, Affine]: A tuple containing the uint8 raster of cell
+        classes and the affine transformation matrix.
+    """
+    bbox = polygon.bounds
+    # One extra row and column so that points on the max edges are covered.
+    height = int((bbox[3] - bbox[1]) / resolution) + 1
+    width = int((bbox[2] - bbox[0]) / resolution) + 1
+
+    transform = from_origin(bbox[0], bbox[3], resolution, resolution)
+    shape = (height, width)
+    classes = rasterize(
+        shapes=[polygon],
+        out_shape=shape,
+        transform=transform,
+        fill=OUTSIDE,
+        default_value=INSIDE,
+        all_touched=False,
+        dtype="uint8",
+    )
+    classes[_boundary_cells([polygon], shape, transform)] = BOUNDARY
+    return classes, transform
+
+
+NO_FEATURE = -1
+BOUNDARY_LABEL = -2
+
+
+def polygons_to_cell_labels(
+    polygons: list[Polygon | MultiPolygon],
+    resolution: float,
+) -> Tuple[np.ndarray, Affine]:
+    """
+    Labels the cells of a raster over the extent of several polygons with
+    the index of the polygon they lie entirely inside, like
+    `polygon_to_cell_classes` for a single polygon.
+
+    Cells on the boundary of any polygon are BOUNDARY_LABEL and cells outside
+    all polygons are NO_FEATURE. Where polygons overlap, the cell gets the
+    lowest index.
+
+    Args:
+        polygons (list[Polygon | MultiPolygon]): The polygons to label the
+            cells with.
+        resolution (float): The size of a cell.
+
+    Returns:
+        Tuple[np.ndarray, Affine]: A tuple containing the int32 raster of cell
+        labels and the affine transformation matrix.
+    """
+    minx = min(polygon.bounds[0] for polygon in polygons)
+    miny = min(polygon.bounds[1] for polygon in polygons)
+    maxx = max(polygon.bounds[2] for polygon in polygons)
+    maxy = max(polygon.bounds[3] for polygon in polygons)
+    height = int((maxy - miny) / resolution) + 1
+    width = int((maxx - minx) / resolution) + 1
+
+    transform = from_origin(minx, maxy, resolution, resolution)
+    shape = (height, width)
+    # Later shapes are burnt over earlier ones, so the lowest index wins.
+    labels = rasterize(
+        shapes=[(polygons[i], i) for i in reversed(range(len(polygons)))],
+        out_shape=shape,
+        transform=transform,
+        fill=NO_FEATURE,
+        all_touched=False,
+        dtype="int32",
+    )
+    labels[_boundary_cells(polygons, shape, transform)] = BOUNDARY_LABEL
+    return labels, transform
+
+
+def _boundary_cells(
+    polygons: list[Polygon | MultiPolygon],
+    shape: Tuple[int, int],
+    transform: Affine,
+) -> np.ndarray:
+    """
+    Returns a mask of the cells touched by the boundaries of polygons, and
+    their direct neighbours to be robust against rounding in the
+    rasterization.
+    """
+    touched = rasterize(
+        shapes=[polygon.boundary for polygon in polygons],
+        out_shape=shape,
+        transform=transform,
+        fill=0,
+        all_touched=True,
+        dtype="uint8",
+    ).astype(bool)
+
+    boundary = touched.copy()
+    boundary[1:, :] |= touched[:-1, :]
+    boundary[:-1, :] |= touched[1:, :]
+    dilated = boundary.copy()
+    dilated[:, 1:] |= boundary[:, :-1]
+    dilated[:, :-1] |= boundary[:, 1:]
+    return dilated
@@ -1,12 +1,27 @@
+import copy
+import logging
+import warnings
+
+import laspy
+import numpy as np
 import pyproj
 import shapely
 from shapely.ops import transform
 
+# The CRS of AHN: RD New, and RD New with NAP heights.
+AHN_CRS = "EPSG:28992"
+AHN_COMPOUND_CRS = "EPSG:7415"
+DEGREE_SCALE = 1e-7
+METRE_SCALE = 0.001
+
+_INT32 = np.iinfo(np.int32)
+
 
-# Memo: hope to support more types of geometry
 def tranform_polygon(
-    geometry: shapely.Polygon, source_crs: str, target_crs: str
-) -> shapely.Polygon | None:
+    geometry: shapely.Polygon | shapely.MultiPolygon,
+    source_crs: str,
+    target_crs: str,
+) -> shapely.Polygon | shapely.MultiPolygon | None:
     proj = pyproj.Transformer.from_crs(
         pyproj.CRS(source_crs),
         pyproj.CRS(target_crs),
@@ -14,6 +29,162 @@ def tranform_polygon(
     ).transform
     if geometry.is_empty:
         return None
-    elif geometry.geom_type == "Polygon":
+    elif geometry.geom_type in ("Polygon", "MultiPolygon"):
         return transform(proj, geometry)
     return None
+
+
+class PointReprojector:
+    """
+    Reprojects the coordinates of AHN points from RD New to another CRS,
+    e.g. ETRS89 / UTM 31N (EPSG:25831) or WGS84 (EPSG:4326).
+
+    The heights stay NAP heights for a two-dimensional target CRS. For a
+    three-dimensional or compound target CRS, e.g. EPSG:4979 or
+    EPSG:25831+5709, the points are reprojected from RD New + NAP
+    (EPSG:7415) and the heights are transformed as well.
+
+    The transformer is built once and every chunk of points is reprojected
+    with one vectorized call. The output has scales of 1e-7 degrees or 1 mm
+    and offsets near the points of every input tile, and its header carries
+    the target CRS as WKT or GeoTIFF VLRs.
+
+    Args:
+        target_crs (str): The target CRS, e.g. "EPSG:25831".
+
+    Attributes:
+        target_crs (pyproj.CRS): The target CRS.
+        transform_z (bool): Whether the heights are transformed.
+        transformer (pyproj.Transformer): The transformer from the AHN CRS.
+        scales (np.ndarray): The scales of the reprojected points.
+
+    Methods:
+        reproject: Reprojects points and their header.
+    """
+
+    def __init__(self, target_crs: str) -> None:
+        self.target_crs = pyproj.CRS(target_crs)
+        self.transform_z = len(self.target_crs.axis_info) > 2
+        with warnings.catch_warnings():
+            # Missing grids are reported below.
+            warnings.simplefilter("ignore", UserWarning)
+            group = pyproj.transformer.TransformerGroup(
+                pyproj.CRS(AHN_COMPOUND_CRS if self.transform_z else AHN_CRS),
+                self.target_crs,
+                always_xy=True,
+            )
+        if len(group.transformers) == 0:
+            raise ValueError(
+                f"Points cannot be reprojected to {self.target_crs.name}."
+            )
+        self.transformer = group.transformers[0]
+        missing_grids = sorted(
+            {
+                grid.short_name
+                for operation in group.unavailable_operations
+                for grid in operation.grids
+                if not grid.available
+            }
+        )
+        if self.transform_z and any(
+            operation.has_ballpark_transformation
+            for operation in self.transformer.operations or []
+        ):
+            raise ValueError(
+                f"NAP heights cannot be transformed to "
+                f"{self.target_crs.name} without the PROJ grids "
+                f"{missing_grids}. Download them with projsync or set "
+                "PROJ_NETWORK=ON."
+            )
+        if not group.best_available:
+            logging.warning(
+                f"Reprojecting to {self.target_crs.name} without the PROJ "
+                f"grids {missing_grids} is less accurate. Download them with "
+                "projsync or set PROJ_NETWORK=ON."
+            )
+        horizontal_unit = self.target_crs.axis_info[0].unit_name
+        horizontal_scale = (
+            DEGREE_SCALE if horizontal_unit == "degree" else METRE_SCALE
+        )
+        self.scales = np.array(
+            [horizontal_scale, horizontal_scale, METRE_SCALE]
+        )
+        # The header of the last input tile and its reprojected header, as
+        # all chunks of a tile share the header.
+        self._source_header: laspy.LasHeader | None = None
+        self._header: laspy.LasHeader | None = None
+
+    def reproject(
+        self, points: laspy.ScaleAwarePointRecord, header: laspy.LasHeader
+    ) -> tuple[laspy.ScaleAwarePointRecord, laspy.LasHeader]:
+        """
+        Reprojects points in place, and returns them with the header of
+        their input tile in the target CRS.
+
+        Args:
+            points (laspy.ScaleAwarePointRecord): The points in RD New.
+            header (laspy.LasHeader): The header of the input tile of the
+                points.
+
+        Returns:
+            tuple[laspy.ScaleAwarePointRecord, laspy.LasHeader]: The
+                reprojected points and header.
+
+        Raises:
+            ValueError: If the points cannot be reprojected, or do not fit in
+                the coordinate range of the output.
+        """
+        if header is not self._source_header:
+            self._header = self._reproject_header(header)
+            self._source_header = header
+        assert self._header is not None
+        scales, offsets = self._header.scales, self._header.offsets
+
+        x = np.asarray(points.x)
+        y = np.asarray(points.y)
+        z = np.asarray(points.z)
+        if self.transform_z:
+            x, y, z = self.transformer.transform(x, y, z)
+        else:
+            x, y = self.transformer.transform(x, y)
+        for axis, (name, values) in enumerate(zip("XYZ", (x, y, z))):
+            integers = np.round((values - offsets[axis]) / scales[axis])
+            if len(integers) and not (
+                np.isfinite(integers).all()
+                and integers.min() >= _INT32.min
+                and integers.max() <= _INT32.max
+            ):
+                raise ValueError(
+                    f"The {name.lower()} coordinates cannot be reprojected "
+                    f"to {self.target_crs.name}."
+                )
+            points.array[name] = integers
+        points.scales = scales
+        points.offsets = offsets
+        return points, self._header
+
+    def _reproject_header(self, header: laspy.LasHeader) -> laspy.LasHeader:
+        """
+        Returns a copy of a header in the target CRS, with the scales of the
+        target CRS and offsets at the reprojected bounds of the header.
+        """
+        minx, miny, maxx, maxy = self.transformer.transform_bounds(
+            header.mins[0], header.mins[1], header.maxs[0], header.maxs[1]
+        )
+        if not np.isfinite([minx, miny, maxx, maxy]).all():
+            raise ValueError(
+                f"The tile cannot be reprojected to {self.target_crs.name}."
+            )
+        reprojected = copy.deepcopy(header)
+        reprojected.scales = self.scales
+        reprojected.offsets = np.array(
+            [
+                np.floor(minx),
+                np.floor(miny),
+                0.0 if self.transform_z else header.offsets[2],
+            ]
+        )
+        reprojected.mins = np.array([minx, miny, header.mins[2]])
+        reprojected.maxs = np.array([maxx, maxy, header.maxs[2]])
+        reprojected.add_crs(self.target_crs)
+        return reprojected
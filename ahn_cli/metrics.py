@@ -0,0 +1,258 @@
+import contextlib
+import json
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterator
+
+PROFILE_EXTENSIONS = (".json", ".prom")
+
+
+@dataclass
+class StageMetrics:
+    """
+    The counters of a stage of the pipeline.
+
+    Attributes:
+        seconds (float): The time spent in the stage.
+        calls (int): The number of times the stage ran.
+        points_in (int): The number of points going into the stage.
+        points_out (int): The number of points coming out of the stage.
+        bytes (int): The number of bytes read or written by the stage.
+    """
+
+    seconds: float = 0.0
+    calls: int = 0
+    points_in: int = 0
+    points_out: int = 0
+    bytes: int = 0
+
+    def add(self, other: "StageMetrics") -> None:
+        self.seconds += other.seconds
+        self.calls += other.calls
+        self.points_in += other.points_in
+        self.points_out += other.points_out
+        self.bytes += other.bytes
+
+
+@dataclass
+class Metrics:
+    """
+    Timers and counters of a run, per stage of the pipeline and per tile,
+    to tell whether a run is bound by the network, LAZ decoding, a filter or
+    writing.
+
+    The stages are "fetch" (waiting for downloads), "rasterize" (clip
+    polygons), "decode" (LAZ decompression), "filter.<step>" (the steps of
+    PntCHandler) and "write". Metrics of worker processes are merged into
+    the metrics of the run.
+
+    Attributes:
+        stages (dict[str, StageMetrics]): The counters of every stage.
+        tiles (list[dict[str, Any]]): The counters of every tile.
+        started (float): The start of the run on the performance counter.
+    """
+
+    stages: dict[str, StageMetrics] = field(default_factory=dict)
+    tiles: list[dict[str, Any]] = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+
+    @contextlib.contextmanager
+    def measure(
+        self, stage: str, points_in: int = 0, bytes: int = 0
+    ) -> Iterator[StageMetrics]:
+        """
+        Times a stage. The yielded counters can be updated inside the block,
+        e.g. with the number of points coming out of the stage.
+
+        Args:
+            stage (str): The name of the stage.
+            points_in (int, optional): The number of points going into the
+                stage. Defaults to 0.
+            bytes (int, optional): The number of bytes of the stage.
+                Defaults to 0.
+
+        Yields:
+            StageMetrics: The counters of this run of the stage.
+        """
+        counters = StageMetrics(
+            calls=1, points_in=points_in, points_out=points_in, bytes=bytes
+        )
+        start = time.perf_counter()
+        try:
+            yield counters
+        finally:
+            counters.seconds = time.perf_counter() - start
+            self.add(stage, counters)
+
+    def add(self, stage: str, counters: StageMetrics) -> None:
+        """
+        Adds counters to a stage.
+
+        Args:
+            stage (str): The name of the stage.
+            counters (StageMetrics): The counters to add.
+        """
+        self.stages.setdefault(stage, StageMetrics()).add(counters)
+
+    def tile(
+        self,
+        name: str,
+        seconds: float,
+        points_in: int,
+        points_out: int,
+        bytes: int,
+        peak_memory: float | None = None,
+    ) -> None:
+        """
+        Records the counters of a processed tile.
+
+        Args:
+            name (str): The name of the subunit of the tile.
+            seconds (float): The time spent processing the tile.
+            points_in (int): The number of points of the tile.
+            points_out (int): The number of points that passed the filters.
+            bytes (int): The size of the downloaded tile.
+            peak_memory (float | None, optional): The peak memory in
+                megabytes of the process that filtered the tile. Defaults to
+                the peak memory of this process so far.
+        """
+        self.tiles.append(
+            {
+                "name": name,
+                "seconds": seconds,
+                "points_in": points_in,
+                "points_out": points_out,
+                "bytes": bytes,
+                "peak_rss_mb": (
+                    peak_memory if peak_memory is not None else peak_rss_mb()
+                ),
+            }
+        )
+
+    def merge(self, other: "Metrics") -> None:
+        """
+        Adds the stage counters and tiles of other metrics, e.g. of a worker
+        process.
+        """
+        for stage, counters in other.stages.items():
+            self.add(stage, counters)
+        self.tiles.extend(other.tiles)
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        Returns the metrics as a dictionary that can be serialized to JSON.
+        """
+        return {
+            "seconds": time.perf_counter() - self.started,
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": {
+                stage: asdict(counters)
+                for stage, counters in self.stages.items()
+            },
+            "tiles": self.tiles,
+        }
+
+    def summary(self) -> str:
+        """
+        Returns a table of the time, points and bytes of every stage, and
+        the slowest tiles.
+        """
+        metrics = self.to_dict()
+        lines = [
+            f"{'stage':<20} {'seconds':>9} {'share':>6} {'calls':>7} "
+            f"{'points in':>12} {'points out':>12} {'MB':>9}"
+        ]
+        stage_seconds = sum(s.seconds for s in self.stages.values()) or 1.0
+        for stage, counters in self.stages.items():
+            lines.append(
+                f"{stage:<20} {counters.seconds:>9.3f} "
+                f"{counters.seconds / stage_seconds:>6.1%} "
+                f"{counters.calls:>7} {counters.points_in:>12} "
+                f"{counters.points_out:>12} "
+                f"{counters.bytes / 1024 / 1024:>9.1f}"
+            )
+        lines.append(
+            f"{len(self.tiles)} tiles in {metrics['seconds']:.3f} s, "
+            f"peak memory {metrics['peak_rss_mb']:.0f} MB"
+        )
+        for tile in sorted(self.tiles, key=lambda t: -t["seconds"])[:5]:
+            lines.append(
+                f"  {tile['name']:<18} {tile['seconds']:>9.3f} s "
+                f"{tile['points_in']:>12} -> {tile['points_out']:<12} "
+                f"peak {tile['peak_rss_mb']:.0f} MB"
+            )
+        return "\n".join(lines)
+
+    def to_prometheus(self) -> str:
+        """
+        Returns the metrics in the Prometheus text format, e.g. for the
+        textfile collector of the node exporter.
+        """
+        metrics = self.to_dict()
+        lines = []
+        for name, help_text, attribute in [
+            ("seconds", "Time spent in a stage.", "seconds"),
+            ("calls", "Runs of a stage.", "calls"),
+            ("points_in", "Points going into a stage.", "points_in"),
+            ("points_out", "Points coming out of a stage.", "points_out"),
+            ("bytes", "Bytes read or written by a stage.", "bytes"),
+        ]:
+            metric = f"ahn_cli_stage_{name}_total"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for stage, counters in self.stages.items():
+                lines.append(
+                    f'{metric}{{stage="{stage}"}} '
+                    f"{getattr(counters, attribute)}"
+                )
+        for metric, help_text, kind, value in [
+            ("ahn_cli_tiles_total", "Processed tiles.", "counter", len(self.tiles)),
+            ("ahn_cli_run_seconds", "Duration of the run.", "gauge", metrics["seconds"]),
+            ("ahn_cli_peak_rss_bytes", "Peak resident set size.", "gauge", int(metrics["peak_rss_mb"] * 1024 * 1024)),
+        ]:  # fmt: skip
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """
+        Writes the metrics as JSON, or in the Prometheus text format if the
+        path ends with ".prom". The file is replaced atomically, so that a
+        collector never reads a partial file.
+
+        Args:
+            path (str): The path of the metrics file.
+
+        Raises:
+            ValueError: If the path does not end with ".json" or ".prom".
+        """
+        if not path.lower().endswith(PROFILE_EXTENSIONS):
+            raise ValueError("Profile output must end with .json or .prom.")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            if path.lower().endswith(".prom"):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+
+
+def peak_rss_mb() -> float:
+    """
+    Returns the peak resident set size of this process and its finished
+    child processes in megabytes, or 0 where the ``resource`` module is
+    unavailable (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
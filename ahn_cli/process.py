@@ -1,13 +1,83 @@
+import contextlib
+import copy
 import logging
+import multiprocessing
 import os
+import shutil
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Callable, Iterable, Iterator, TypeVar
+from urllib.parse import urlparse
 
 import numpy as np
 from tqdm import tqdm
-from ahn_cli.fetcher.request import Fetcher
+from ahn_cli.batch import Job
+from ahn_cli.fetcher.cache import TileCache
+from ahn_cli.fetcher.catalog import read_geodataframe
+from ahn_cli.fetcher.request import Fetcher, tile_urls
+from ahn_cli.manipulator.clipper import (
+    FeatureClipper,
+    PolygonClipper,
+    city_clip_polygon,
+    file_clip_feature_names,
+    file_clip_features,
+)
+from ahn_cli.manipulator import rasterizer
+from ahn_cli.manipulator.decimation import voxel_grid_indices
 from ahn_cli.manipulator.ptc_handler import PntCHandler
 from ahn_cli.manipulator.preview import previewer
+from ahn_cli.manipulator.transformer import PointReprojector
+from ahn_cli.metrics import Metrics, StageMetrics
+from ahn_cli.writer.base import PointWriter
+from ahn_cli.writer.columnar import ColumnarWriter, is_columnar_output
+from ahn_cli.writer.copc import COPC_EXTENSION, CopcWriter
+from ahn_cli.writer.las import LasFileWriter
+from ahn_cli.writer.reprojected import ReprojectingWriter
+from ahn_cli.writer.tiled import FeatureWriter, TiledWriter
 import laspy
-from laspy.lasappender import LasAppender
+from laspy import DecompressionSelection
+
+
+MERGE_CHUNK_SIZE = 5_000_000
+# The fields the filters need, decompressed first with selective
+# decompression.
+FILTER_FIELDS = (
+    DecompressionSelection.xy_returns_channel()
+    | DecompressionSelection.CLASSIFICATION
+)
+
+
+@dataclass
+class FilterParams:
+    """
+    The filters applied to every tile. Bundled so that they can be sent to
+    worker processes.
+    """
+
+    city_polygon_path: str
+    city_name: str | None
+    include_classes: list[int] | None = None
+    exclude_classes: list[int] | None = None
+    no_clip_city: bool | None = False
+    clip_file: str | None = None
+    epsg: int | None = None
+    decimate: int | None = None
+    bbox: list[float] | None = None
+    chunk_size: int | None = None
+    selective_decompression: bool | None = False
+    voxel_size: float | None = None
+    poisson_radius: float | None = None
+    city_clipper: PolygonClipper | None = None
+    clip_file_clipper: FeatureClipper | None = None
+
+
+T = TypeVar("T")
+
+# The filters of the run, set once in every worker process.
+_worker_params: FilterParams | None = None
 
 
 def process(
@@ -23,64 +93,976 @@ def process(
     decimate: int | None = None,
     bbox: list[float] | None = None,
     preview: bool | None = False,
+    cache_dir: str | None = None,
+    cache_size: int | None = None,
+    revalidate_cache: bool | None = False,
+    chunk_size: int | None = None,
+    max_tiles_in_flight: int | None = None,
+    workers: int | None = None,
+    min_tile_overlap: float | None = None,
+    download_workers: int | None = None,
+    download_chunk_size: int | None = None,
+    adaptive_concurrency: bool | None = False,
+    async_fetch: bool | None = False,
+    bandwidth_limit: float | None = None,
+    tile_size: float | None = None,
+    per_subunit: bool | None = False,
+    columns: list[str] | None = None,
+    selective_decompression: bool | None = False,
+    voxel_size: float | None = None,
+    poisson_radius: float | None = None,
+    profile: bool | None = False,
+    profile_output: str | None = None,
+    split_features: bool | None = False,
+    feature_name: str | None = None,
+    output_crs: str | None = None,
+    urls: list[str] | None = None,
 ) -> None:
-    ahn_fetcher = Fetcher(base_url, city_name, bbox)
-    fetched_files = ahn_fetcher.fetch()
+    # Timers and counters of the stages, reported with `profile`.
+    metrics = Metrics()
+    cache = _tile_cache(cache_dir, cache_size)
+    ahn_fetcher = _fetcher(
+        base_url,
+        city_name,
+        bbox,
+        cache,
+        revalidate_cache,
+        min_tile_overlap,
+        download_workers,
+        download_chunk_size,
+        adaptive_concurrency,
+        async_fetch,
+        bandwidth_limit,
+        # The tiles to fetch instead of those of the city or bbox, e.g. of a
+        # local server.
+        urls,
+    )
+    params = FilterParams(
+        city_polygon_path,
+        city_name,
+        include_classes,
+        exclude_classes,
+        no_clip_city,
+        clip_file,
+        epsg,
+        decimate,
+        bbox,
+        chunk_size,
+        selective_decompression,
+        voxel_size,
+        poisson_radius,
+    )
+    with metrics.measure("rasterize"):
+        _build_clippers(params, cache_dir)
 
-    files = list(fetched_files.values())
-    for i, file in enumerate(
-        tqdm(files, desc="Processing files", unit="file", total=len(files))
-    ):
-        logging.info("Start processing downloaded files...")
-        with laspy.open(file) as las:
-            if i == 0:
-                global_header = las.header
-            # update maxs and mins if necessary
-            header = las.header
-            offset = global_header.offsets - header.offsets
-            maxs = np.maximum(global_header.maxs, las.header.max)
-            mins = np.minimum(global_header.mins, las.header.min)
-            global_header.maxs = maxs
-            global_header.mins = mins
-
-            p_handler = PntCHandler(
-                las.read(),
-                city_polygon_path,
-                city_name,
-                epsg if epsg is not None else 4326,
+    def release(file: str) -> None:
+        if cache is None or not cache.owns(file):
+            os.remove(file)
+        else:
+            cache.release(_tile_name(file))
+
+    output_writer = _output_writer(
+        output_path,
+        tile_size,
+        per_subunit,
+        columns,
+        params if split_features else None,
+        feature_name,
+        output_crs,
+    )
+
+    try:
+        # Tiles are processed as soon as they are downloaded, while at most
+        # `max_tiles_in_flight` tiles are downloading or waiting on disk. The
+        # time spent waiting for downloads is the fetch stage.
+        fetched_tiles = (
+            (_tile_name(url), file)
+            for url, file in _measured(
+                ahn_fetcher.iter_fetch(max_tiles_in_flight),
+                metrics,
+                "fetch",
+                n_bytes=lambda tile: os.path.getsize(tile[1]),
+            )
+        )
+        if workers is not None and workers > 1:
+            _process_in_parallel(
+                fetched_tiles,
+                len(ahn_fetcher.urls),
+                params,
+                workers,
+                release,
+                output_writer,
+                metrics,
+            )
+        else:
+            _process_serially(
+                fetched_tiles,
+                len(ahn_fetcher.urls),
+                params,
+                release,
+                output_writer,
+                metrics,
             )
+        with metrics.measure("write.close"):
+            written = output_writer.close()
+        logging.info(f"Wrote the output to {written}")
+    finally:
+        # Releases the cached tiles that were never handed out, e.g. when a
+        # tile failed.
+        if cache is not None:
+            cache.close()
 
-            if bbox is not None:
-                p_handler.clip_by_bbox(bbox)
-            if include_classes is not None and len(include_classes) > 0:
-                p_handler.include(include_classes)
-            if exclude_classes is not None and len(exclude_classes) > 0:
-                p_handler.exclude(exclude_classes)
-            if not no_clip_city and city_name is not None:
-                p_handler.clip()
-            if clip_file is not None:
-                p_handler.clip_by_arbitrary_polygon(clip_file)
-            if decimate is not None:
-                p_handler.decimate(decimate)
-
-            with laspy.open(
-                output_path, mode="w" if i == 0 else "a", header=global_header
-            ) as writer:
-                points = p_handler.points().points
-                if len(points) == 0:
-                    continue
-                points.x = points.x - offset[0]
-                points.y = points.y - offset[1]
-                points.z = points.z - offset[2]
-
-                if isinstance(writer, laspy.LasWriter):
-                    writer.write_points(points)
-                if isinstance(writer, LasAppender):
-                    writer.append_points(points)
-
-    for file in files:
-        os.remove(file)
+    if profile:
+        print(metrics.summary())
+    if profile_output is not None:
+        metrics.write(profile_output)
 
     if preview:
         print("Previewing output file...")
         previewer(output_path)
+
+
+def _open_output(
+    writer: PointWriter, header: laspy.LasHeader, source: str
+) -> None:
+    """
+    Writes no points of a tile, which opens a single LAS/LAZ output with the
+    header of the first tile. A run whose filters leave no points then still
+    writes a valid empty file.
+    """
+    writer.write(
+        laspy.ScaleAwarePointRecord.zeros(0, header=header), header, source
+    )
+
+
+def _tile_name(url: str) -> str:
+    """
+    Returns the name of the subunit of a tile URL, e.g. "37EN1_15".
+    """
+    return os.path.splitext(os.path.basename(urlparse(url).path))[0]
+
+
+def process_batch(
+    base_url: str,
+    city_polygon_path: str,
+    jobs: list[Job],
+    cache_dir: str | None = None,
+    cache_size: int | None = None,
+    revalidate_cache: bool | None = False,
+    chunk_size: int | None = None,
+    max_tiles_in_flight: int | None = None,
+    min_tile_overlap: float | None = None,
+    download_workers: int | None = None,
+    download_chunk_size: int | None = None,
+    adaptive_concurrency: bool | None = False,
+    async_fetch: bool | None = False,
+    bandwidth_limit: float | None = None,
+    profile: bool | None = False,
+    profile_output: str | None = None,
+) -> None:
+    """
+    Runs several jobs, e.g. neighbouring cities, in one run.
+
+    The union of the tiles of all jobs is downloaded once. Every tile is
+    decompressed once, one chunk at a time with `chunk_size`, and its points
+    are fanned out to the filters and output of every job whose area needs
+    the tile.
+
+    Args:
+        base_url (str): The base URL of the AHN tiles.
+        city_polygon_path (str): The path of the municipality boundaries.
+        jobs (list[Job]): The jobs.
+        The other arguments are the download, cache and profiling options of
+            `process`, shared by all jobs.
+    """
+    metrics = Metrics()
+    cache = _tile_cache(cache_dir, cache_size)
+    job_urls = [
+        tile_urls(base_url, job.city, job.bbox, min_tile_overlap or 0.0)
+        for job in jobs
+    ]
+    # The union of the tiles in the order of the jobs, so that the tiles of
+    # the first jobs are finished first.
+    urls = list(dict.fromkeys(url for urls in job_urls for url in urls))
+    logging.info(f"{len(jobs)} jobs share {len(urls)} tiles")
+    ahn_fetcher = _fetcher(
+        base_url,
+        "",
+        None,
+        cache,
+        revalidate_cache,
+        min_tile_overlap,
+        download_workers,
+        download_chunk_size,
+        adaptive_concurrency,
+        async_fetch,
+        bandwidth_limit,
+        urls,
+    )
+    job_params = []
+    with metrics.measure("rasterize"):
+        for job in jobs:
+            params = FilterParams(
+                city_polygon_path,
+                job.city,
+                job.include_classes,
+                job.exclude_classes,
+                job.no_clip_city,
+                job.clip_file,
+                job.epsg,
+                job.decimate,
+                job.bbox,
+                chunk_size,
+                voxel_size=job.voxel_size,
+                poisson_radius=job.poisson_radius,
+            )
+            _build_clippers(params, cache_dir)
+            job_params.append(params)
+    writers = [
+        _output_writer(
+            job.output,
+            job.tile_size,
+            job.per_subunit,
+            job.columns,
+            params if job.split_features else None,
+            job.feature_name,
+            job.output_crs,
+        )
+        for job, params in zip(jobs, job_params)
+    ]
+    job_url_sets = [set(job_tiles) for job_tiles in job_urls]
+    tile_jobs = {
+        url: [i for i, tiles in enumerate(job_url_sets) if url in tiles]
+        for url in urls
+    }
+
+    try:
+        for url, file in tqdm(
+            _measured(
+                ahn_fetcher.iter_fetch(max_tiles_in_flight),
+                metrics,
+                "fetch",
+                n_bytes=lambda tile: os.path.getsize(tile[1]),
+            ),
+            desc="Processing files",
+            unit="file",
+            total=len(urls),
+        ):
+            name = _tile_name(url)
+            start = time.perf_counter()
+            n_written = 0
+            try:
+                with laspy.open(file) as las:
+                    indices = tile_jobs[url]
+                    for i in indices:
+                        _open_output(writers[i], las.header, name)
+                    for i, points in _fanned_out_points(
+                        las, [job_params[i] for i in indices], metrics
+                    ):
+                        with metrics.measure("write", len(points)):
+                            writers[indices[i]].write(points, las.header, name)
+                        n_written += len(points)
+                    metrics.tile(
+                        name,
+                        time.perf_counter() - start,
+                        las.header.point_count,
+                        n_written,
+                        os.path.getsize(file),
+                    )
+            finally:
+                if cache is None or not cache.owns(file):
+                    os.remove(file)
+                else:
+                    cache.release(name)
+
+        with metrics.measure("write.close"):
+            for writer in writers:
+                written = writer.close()
+                logging.info(f"Wrote the output to {written}")
+    finally:
+        if cache is not None:
+            cache.close()
+    if profile:
+        print(metrics.summary())
+    if profile_output is not None:
+        metrics.write(profile_output)
+
+
+def _tile_cache(
+    cache_dir: str | None, cache_size: int | None
+) -> TileCache | None:
+    """
+    Returns the persistent tile cache, if a cache directory is given.
+    """
+    if cache_dir is None:
+        return None
+    return TileCache(
+        cache_dir,
+        cache_size * 1024 * 1024 if cache_size is not None else None,
+    )
+
+
+def _fetcher(
+    base_url: str,
+    city_name: str,
+    bbox: list[float] | None,
+    cache: TileCache | None,
+    revalidate_cache: bool | None,
+    min_tile_overlap: float | None,
+    download_workers: int | None,
+    download_chunk_size: int | None,
+    adaptive_concurrency: bool | None,
+    async_fetch: bool | None,
+    bandwidth_limit: float | None,
+    urls: list[str] | None = None,
+) -> Fetcher:
+    """
+    Returns the fetcher of the tiles of a city or bbox, or of `urls`.
+    """
+    if async_fetch:
+        # aiohttp is an optional dependency.
+        from ahn_cli.fetcher.async_request import AsyncFetcher
+
+        return AsyncFetcher(
+            base_url,
+            city_name,
+            bbox,
+            cache,
+            bool(revalidate_cache),
+            min_tile_overlap or 0.0,
+            max_connections=download_workers or 8,
+            chunk_size=(download_chunk_size or 8) * 1024 * 1024,
+            bandwidth=(
+                bandwidth_limit * 1024 * 1024
+                if bandwidth_limit is not None
+                else None
+            ),
+            urls=urls,
+        )
+    return Fetcher(
+        base_url,
+        city_name,
+        bbox,
+        cache,
+        bool(revalidate_cache),
+        min_tile_overlap or 0.0,
+        max_workers=download_workers or 8,
+        chunk_size=(download_chunk_size or 8) * 1024 * 1024,
+        adaptive=bool(adaptive_concurrency),
+        urls=urls,
+    )
+
+
+def _build_clippers(params: FilterParams, cache_dir: str | None) -> None:
+    """
+    Builds the clippers of the city and the clip file of `params`.
+
+    The clip polygons are reprojected and rasterized once per run instead of
+    once per tile, and the rasters are memoized in the cache directory.
+    """
+    clip_mask_dir = (
+        os.path.join(cache_dir, "clip_masks")
+        if cache_dir is not None
+        else None
+    )
+    if not params.no_clip_city and params.city_name is not None:
+        params.city_clipper = PolygonClipper.cached(
+            city_clip_polygon(
+                read_geodataframe(params.city_polygon_path), params.city_name
+            ),
+            cache_dir=clip_mask_dir,
+        )
+    if params.clip_file is not None:
+        epsg = params.epsg if params.epsg is not None else 4326
+        params.clip_file_clipper = FeatureClipper.cached(
+            file_clip_features(params.clip_file, "EPSG:" + str(epsg)),
+            cache_dir=clip_mask_dir,
+        )
+
+
+def _output_writer(
+    output_path: str,
+    tile_size: float | None,
+    per_subunit: bool | None,
+    columns: list[str] | None,
+    feature_filters: FilterParams | None = None,
+    feature_name: str | None = None,
+    output_crs: str | None = None,
+) -> PointWriter:
+    """
+    Returns the writer of an output.
+
+    With a tile size or per subunit, `output_path` is a directory of tiles,
+    and with `feature_filters`, the filters of a clip file, it is a
+    directory with a file per clip feature named after the `feature_name`
+    column. A ".copc.laz" output is written as a Cloud Optimized Point
+    Cloud, Parquet, Arrow and npy outputs get the selected columns only, and
+    other outputs are a single LAS or LAZ file. With `output_crs`, the
+    points are reprojected on their way into the writer.
+    """
+    writer: PointWriter
+    if feature_filters is not None:
+        if (
+            feature_filters.clip_file is None
+            or feature_filters.clip_file_clipper is None
+        ):
+            raise ValueError("Splitting by feature requires a clip file.")
+        writer = FeatureWriter(
+            output_path,
+            feature_filters.clip_file_clipper,
+            file_clip_feature_names(feature_filters.clip_file, feature_name),
+        )
+    elif tile_size is not None or per_subunit:
+        writer = TiledWriter(output_path, tile_size)
+    elif output_path.lower().endswith(COPC_EXTENSION):
+        writer = CopcWriter(output_path)
+    elif is_columnar_output(output_path):
+        writer = ColumnarWriter(output_path, columns)
+    else:
+        writer = LasFileWriter(output_path)
+    if output_crs is not None:
+        writer = ReprojectingWriter(writer, PointReprojector(output_crs))
+    return writer
+
+
+def _process_serially(
+    tiles: Iterable[tuple[str, str]],
+    n_files: int,
+    params: FilterParams,
+    release: Callable[[str], None],
+    output_writer: PointWriter,
+    metrics: Metrics,
+) -> None:
+    """
+    Filters the tiles one after another and writes them to `output_writer`.
+    The tiles are pairs of the name of the subunit and the downloaded file.
+    """
+    for name, file in tqdm(
+        tiles, desc="Processing files", unit="file", total=n_files
+    ):
+        logging.info("Start processing downloaded files...")
+        start = time.perf_counter()
+        n_written = 0
+        try:
+            with laspy.open(file) as las:
+                _open_output(output_writer, las.header, name)
+                for points in _filtered_points(las, params, file, metrics):
+                    with metrics.measure("write", len(points)):
+                        output_writer.write(points, las.header, name)
+                    n_written += len(points)
+                metrics.tile(
+                    name,
+                    time.perf_counter() - start,
+                    las.header.point_count,
+                    n_written,
+                    os.path.getsize(file),
+                )
+        finally:
+            release(file)
+
+
+def _process_in_parallel(
+    tiles: Iterable[tuple[str, str]],
+    n_files: int,
+    params: FilterParams,
+    workers: int,
+    release: Callable[[str], None],
+    output_writer: PointWriter,
+    metrics: Metrics,
+) -> None:
+    """
+    Filters the tiles in worker processes and merges the filtered parts into
+    `output_writer` in the order the tiles were fetched.
+
+    Every worker writes the surviving points of a tile to an uncompressed LAS
+    part, so that LAZ decompression, filtering and the compression of the
+    output run in parallel. At most `2 * workers` tiles are queued, which
+    bounds the disk usage of the parts.
+    """
+    part_dir = tempfile.mkdtemp(prefix="ahn_cli_")
+    queue: deque[tuple[Future, str, str, str]] = deque()
+    try:
+        # Forking a process that has running threads (downloads, GDAL) can
+        # deadlock the workers, so they are spawned.
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(params,),
+        ) as executor, tqdm(
+            total=n_files, desc="Processing files", unit="file"
+        ) as pbar:
+
+            def merge_next() -> None:
+                future, name, file, part = queue.popleft()
+                try:
+                    metrics.merge(future.result())
+                finally:
+                    release(file)
+                with laspy.open(part) as las:
+                    _open_output(output_writer, las.header, name)
+                    for points in las.chunk_iterator(MERGE_CHUNK_SIZE):
+                        with metrics.measure("write", len(points)):
+                            output_writer.write(points, las.header, name)
+                os.remove(part)
+                pbar.update(1)
+
+            for i, (name, file) in enumerate(tiles):
+                part = os.path.join(part_dir, f"{i}.las")
+                queue.append(
+                    (
+                        executor.submit(_process_tile, name, file, part),
+                        name,
+                        file,
+                        part,
+                    )
+                )
+                while queue and (
+                    queue[0][0].done() or len(queue) >= 2 * workers
+                ):
+                    merge_next()
+            while queue:
+                merge_next()
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+
+def _init_worker(params: FilterParams) -> None:
+    """
+    Receives the filters of the run once per worker process, so that the
+    clip rasters are not sent along with every tile.
+    """
+    global _worker_params
+    _worker_params = params
+
+
+def _process_tile(name: str, file: str, part_path: str) -> Metrics:
+    """
+    Filters a single tile into an uncompressed LAS part. This function runs
+    in a worker process.
+
+    Returns:
+        Metrics: The metrics of the tile, merged into those of the run.
+    """
+    params = _worker_params
+    assert params is not None, "worker is not initialized"
+    metrics = Metrics()
+    with laspy.open(file) as las, laspy.open(
+        part_path, mode="w", header=copy.deepcopy(las.header)
+    ) as writer:
+        for points in _filtered_points(las, params, file, metrics):
+            writer.write_points(points)
+    metrics.tile(
+        name,
+        time.perf_counter() - metrics.started,
+        las.header.point_count,
+        writer.header.point_count,
+        os.path.getsize(file),
+    )
+    return metrics
+
+
+def _filtered_points(
+    las: laspy.LasReader,
+    params: FilterParams,
+    path: str | None = None,
+    metrics: Metrics | None = None,
+) -> Iterator[laspy.ScaleAwarePointRecord]:
+    """
+    Yields the points of a tile that pass the filters.
+
+    The whole tile is read at once unless `params.chunk_size` is given, in
+    which case only one chunk of the tile is decompressed at a time. Tiles
+    whose header bounds lie outside the bbox or a clip polygon are not
+    decompressed at all.
+
+    With `params.selective_decompression`, the filters run on a second
+    reader of `path` that only decompresses the coordinates and classes of
+    LAZ point formats 6 and up, and the other fields of a tile or chunk are
+    only decompressed if any of its points pass.
+
+    The decompression and the filter steps are timed in `metrics` if given.
+    """
+    if metrics is None:
+        metrics = Metrics()
+    tile_params = _prune_filters(las.header, params)
+    if tile_params is None:
+        logging.debug("Skipping a tile outside the clip area.")
+        return
+    params = tile_params
+    selective = (
+        bool(params.selective_decompression)
+        and path is not None
+        and las.header.are_points_compressed
+        and las.header.point_format.id >= 6
+    )
+    with contextlib.ExitStack() as stack:
+        reader = las
+        if selective:
+            selection = FILTER_FIELDS
+            if (
+                params.voxel_size is not None
+                or params.poisson_radius is not None
+            ):
+                # The spatial decimation modes need the heights too.
+                selection |= DecompressionSelection.Z
+            reader = stack.enter_context(
+                laspy.open(path, decompression_selection=selection)
+            )
+        yield from _filtered_chunks(las, reader, params, selective, metrics)
+
+
+def _filtered_chunks(
+    las: laspy.LasReader,
+    reader: laspy.LasReader,
+    params: FilterParams,
+    selective: bool,
+    metrics: Metrics,
+) -> Iterator[laspy.ScaleAwarePointRecord]:
+    """
+    Yields the points of the tiles or chunks of `reader` that pass the
+    filters, taken from `las` if `selective`.
+    """
+    if params.chunk_size is None:
+        tiles: Iterator[laspy.LasData] = (t for t in [reader.read()])
+    else:
+        # The header is copied as filtering updates its point count, which
+        # the reader relies on.
+        chunk_header = copy.deepcopy(reader.header)
+        tiles = (
+            laspy.LasData(chunk_header, points=chunk)
+            for chunk in reader.chunk_iterator(params.chunk_size)
+        )
+    tiles = _measured(
+        tiles, metrics, "decode", n_points=lambda tile: len(tile.points)
+    )
+
+    n_survivors = 0
+    voxels: laspy.ScaleAwarePointRecord | None = None
+    # The range of the points of `tile` in the whole tile.
+    end = 0
+    for tile in tiles:
+        start, end = end, end + len(tile.points)
+        p_handler, n_survivors = _filter_chunk(
+            tile, params, metrics, n_survivors
+        )
+        if selective:
+            if p_handler.count() == 0:
+                continue
+            with metrics.measure("decode", end - start):
+                if las.points_read != start:
+                    las.seek(start)
+                points = las.read_points(end - start)[p_handler.indices()]
+        else:
+            points = p_handler.points().points
+        if params.voxel_size is not None:
+            voxels = _merge_voxels(voxels, points, params.voxel_size)
+        elif len(points) > 0:
+            yield points
+    if voxels is not None and len(voxels) > 0:
+        yield voxels
+
+
+def _fanned_out_points(
+    las: laspy.LasReader, job_params: list[FilterParams], metrics: Metrics
+) -> Iterator[tuple[int, laspy.ScaleAwarePointRecord]]:
+    """
+    Decompresses a tile once, in chunks of the chunk size of the jobs, and
+    yields the points of every chunk that pass the filters of every job,
+    with the index of the job. Jobs whose bbox or clip polygons do not
+    overlap the header bounds of the tile are skipped.
+    """
+    tile_params = {
+        i: params
+        for i, params in enumerate(
+            _prune_filters(las.header, params) for params in job_params
+        )
+        if params is not None
+    }
+    if not tile_params:
+        return
+    chunk_size = job_params[0].chunk_size or las.header.point_count
+    chunks = _measured(
+        las.chunk_iterator(chunk_size),
+        metrics,
+        "decode",
+        n_points=len,
+    )
+    # Every job filters its own LasData of the shared points, as lazy
+    # filtering replaces the points of the LasData.
+    header = copy.deepcopy(las.header)
+    n_survivors = dict.fromkeys(tile_params, 0)
+    voxels: dict[int, laspy.ScaleAwarePointRecord] = {}
+    for chunk in chunks:
+        for i, params in tile_params.items():
+            p_handler, n_survivors[i] = _filter_chunk(
+                laspy.LasData(header, points=chunk),
+                params,
+                metrics,
+                n_survivors[i],
+            )
+            points = p_handler.points().points
+            if params.voxel_size is not None:
+                voxels[i] = _merge_voxels(
+                    voxels.get(i), points, params.voxel_size
+                )
+                continue
+            if len(points) == 0:
+                continue
+            if len(tile_params) > 1 and np.may_share_memory(
+                points.array, chunk.array
+            ):
+                # Writers may rescale the points in place, while the other
+                # jobs still filter the chunk.
+                points = points[np.arange(len(points))]
+            yield i, points
+    for i, points in voxels.items():
+        if len(points) > 0:
+            yield i, points
+
+
+def _filter_chunk(
+    tile: laspy.LasData,
+    params: FilterParams,
+    metrics: Metrics,
+    n_survivors: int,
+) -> tuple[PntCHandler, int]:
+    """
+    Applies the filters and the decimation to a tile or a chunk of a tile.
+
+    Args:
+        tile (laspy.LasData): The points of the tile or chunk.
+        params (FilterParams): The filters.
+        metrics (Metrics): The metrics the steps are timed in.
+        n_survivors (int): The number of points of the previous chunks of
+            the tile that passed the filters before decimation.
+
+    Returns:
+        tuple[PntCHandler, int]: The lazy handler of the surviving points,
+            and the number of survivors including this chunk.
+    """
+    p_handler = PntCHandler(
+        tile,
+        params.city_polygon_path,
+        params.city_name or "",
+        params.epsg if params.epsg is not None else 4326,
+        lazy=True,
+    )
+    _filter(p_handler, params, metrics)
+    if params.decimate is not None:
+        # Keep every `decimate`-th point of the whole tile, not of each
+        # chunk.
+        n_points = p_handler.count()
+        decimate = params.decimate
+        _step(
+            metrics,
+            "decimate",
+            p_handler,
+            lambda: p_handler.decimate(decimate, -n_survivors % decimate),
+        )
+        n_survivors += n_points
+    if params.voxel_size is not None:
+        voxel_size = params.voxel_size
+        _step(
+            metrics,
+            "voxel",
+            p_handler,
+            lambda: p_handler.voxel_decimate(voxel_size),
+        )
+    if params.poisson_radius is not None:
+        radius = params.poisson_radius
+        _step(
+            metrics,
+            "poisson",
+            p_handler,
+            lambda: p_handler.poisson_decimate(radius),
+        )
+    return p_handler, n_survivors
+
+
+def _merge_voxels(
+    voxels: laspy.ScaleAwarePointRecord | None,
+    points: laspy.ScaleAwarePointRecord,
+    voxel_size: float,
+) -> laspy.ScaleAwarePointRecord:
+    """
+    Merges the voxel decimated points of a chunk into those of the previous
+    chunks of the tile, keeping the point closest to the centre of every
+    voxel. As the chunks keep their closest points too, this selects the
+    same points in the same order as decimating the whole tile at once,
+    while holding at most one point per voxel of the tile.
+
+    Args:
+        voxels (laspy.ScaleAwarePointRecord | None): The points kept from
+            the previous chunks, None for the first chunk.
+        points (laspy.ScaleAwarePointRecord): The voxel decimated points of
+            the chunk, with the scales and offsets of the tile.
+        voxel_size (float): The size of the voxels in metres.
+
+    Returns:
+        laspy.ScaleAwarePointRecord: A copy of the points kept from the
+            chunks so far.
+    """
+    if voxels is not None:
+        points = laspy.ScaleAwarePointRecord(
+            np.concatenate([voxels.array, points.array]),
+            points.point_format,
+            points.scales,
+            points.offsets,
+        )
+    xyz = np.stack(
+        [np.asarray(points.x), np.asarray(points.y), np.asarray(points.z)],
+        axis=1,
+    )
+    return points[voxel_grid_indices(xyz, voxel_size)]
+
+
+def _prune_filters(
+    header: laspy.LasHeader, params: FilterParams
+) -> FilterParams | None:
+    """
+    Compares the header bounds of a tile with the bbox and the clip polygons.
+
+    Returns:
+        FilterParams | None: None if the tile lies outside the bbox or a clip
+            polygon, otherwise the filters without the bbox and clip
+            polygons that contain the whole tile, which need no point-wise
+            test.
+    """
+    minx, miny = header.mins[0], header.mins[1]
+    maxx, maxy = header.maxs[0], header.maxs[1]
+    if params.bbox is not None:
+        bbox_minx, bbox_miny, bbox_maxx, bbox_maxy = params.bbox
+        if (
+            maxx < bbox_minx
+            or minx > bbox_maxx
+            or maxy < bbox_miny
+            or miny > bbox_maxy
+        ):
+            return None
+        if (
+            minx >= bbox_minx
+            and maxx <= bbox_maxx
+            and miny >= bbox_miny
+            and maxy <= bbox_maxy
+        ):
+            params = replace(params, bbox=None)
+
+    if not params.no_clip_city and params.city_clipper is not None:
+        relation = params.city_clipper.classify_box(minx, miny, maxx, maxy)
+        if relation == rasterizer.OUTSIDE:
+            return None
+        if relation == rasterizer.INSIDE:
+            params = replace(params, no_clip_city=True, city_clipper=None)
+
+    if params.clip_file is not None and params.clip_file_clipper is not None:
+        relation = params.clip_file_clipper.classify_box(
+            minx, miny, maxx, maxy
+        )
+        if relation == rasterizer.OUTSIDE:
+            return None
+        if relation == rasterizer.INSIDE:
+            params = replace(params, clip_file=None, clip_file_clipper=None)
+    return params
+
+
+def _filter(
+    p_handler: PntCHandler,
+    params: FilterParams,
+    metrics: Metrics | None = None,
+) -> PntCHandler:
+    """
+    Applies the point-wise filters to a tile or a chunk of a tile, timing
+    every step in `metrics` if given.
+
+    Decimation is not applied here as it depends on the position of the
+    points in the whole tile.
+    """
+    if metrics is None:
+        metrics = Metrics()
+    if params.bbox is not None:
+        bbox = params.bbox
+        _step(
+            metrics, "bbox", p_handler, lambda: p_handler.clip_by_bbox(bbox)
+        )
+    if params.include_classes is not None and len(params.include_classes) > 0:
+        include_classes = params.include_classes
+        _step(
+            metrics,
+            "include",
+            p_handler,
+            lambda: p_handler.include(include_classes),
+        )
+    if params.exclude_classes is not None and len(params.exclude_classes) > 0:
+        exclude_classes = params.exclude_classes
+        _step(
+            metrics,
+            "exclude",
+            p_handler,
+            lambda: p_handler.exclude(exclude_classes),
+        )
+    if not params.no_clip_city and params.city_name is not None:
+        _step(
+            metrics,
+            "clip_city",
+            p_handler,
+            lambda: p_handler.clip(params.city_clipper),
+        )
+    if params.clip_file is not None:
+        clip_file = params.clip_file
+        _step(
+            metrics,
+            "clip_file",
+            p_handler,
+            lambda: p_handler.clip_by_arbitrary_polygon(
+                clip_file, params.clip_file_clipper
+            ),
+        )
+    return p_handler
+
+
+def _step(
+    metrics: Metrics,
+    name: str,
+    p_handler: PntCHandler,
+    step: Callable[[], object],
+) -> None:
+    """
+    Runs a step of a PntCHandler and records it as the stage "filter.<name>"
+    with the number of points before and after the step.
+    """
+    with metrics.measure(f"filter.{name}", p_handler.count()) as counters:
+        step()
+        counters.points_out = p_handler.count()
+
+
+def _measured(
+    items: Iterable[T],
+    metrics: Metrics,
+    stage: str,
+    n_points: Callable[[T], int] = lambda item: 0,
+    n_bytes: Callable[[T], int] = lambda item: 0,
+) -> Iterator[T]:
+    """
+    Yields the items of an iterable, e.g. downloaded tiles or decompressed
+    chunks, and records the time spent waiting for every item as `stage`.
+    """
+    iterator = iter(items)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        points = n_points(item)
+        metrics.add(
+            stage,
+            StageMetrics(
+                time.perf_counter() - start,
+                1,
+                points,
+                points,
+                n_bytes(item),
+            ),
+        )
+        yield item
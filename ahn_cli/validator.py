@@ -1,7 +1,13 @@
+import importlib.util
 import os
-import geopandas as gpd
+
+import pyproj
 
 from ahn_cli import config
+from ahn_cli.batch import Job, read_jobs
+from ahn_cli.fetcher.catalog import read_geodataframe
+from ahn_cli.metrics import PROFILE_EXTENSIONS
+from ahn_cli.writer.columnar import is_columnar_output
 
 AHN_CLASSES = [0, 1, 2, 6, 7, 4, 6]
 
@@ -14,10 +20,10 @@ def validate_output(output: str) -> str:
     return output
 
 
-def validate_city(cityname: str, cityfile_path: str) -> str:
+def validate_city(cityname: str | None, cityfile_path: str) -> str:
     if cityname is None:
         raise ValueError("City name is required.")
-    city_df = gpd.read_file(cityfile_path)
+    city_df = read_geodataframe(cityfile_path)
     if cityname.lower() not in city_df["name"].str.lower().tolist():
         raise ValueError("City name not found in city list.")
     return cityname
@@ -77,6 +83,24 @@ def validate_decimate(decimate: int | None) -> int | None:
     return decimate
 
 
+def validate_spatial_decimation(
+    decimate: int | None,
+    voxel_size: float | None,
+    poisson_radius: float | None,
+) -> None:
+    modes = [
+        m for m in (decimate, voxel_size, poisson_radius) if m is not None
+    ]
+    if len(modes) > 1:
+        raise ValueError(
+            "Decimate, voxel size and Poisson radius are exclusive."
+        )
+    if voxel_size is not None and voxel_size <= 0:
+        raise ValueError("Voxel size must be greater than 0.")
+    if poisson_radius is not None and poisson_radius <= 0:
+        raise ValueError("Poisson radius must be greater than 0.")
+
+
 def validate_bbox(bbox: list[float] | None) -> list[float] | None:
     if bbox is None:
         return None
@@ -87,6 +111,219 @@ def validate_bbox(bbox: list[float] | None) -> list[float] | None:
     return bbox
 
 
+def validate_cache(
+    cache_dir: str | None, cache_size: int | None
+) -> str | None:
+    if cache_dir is None:
+        if cache_size is not None:
+            raise ValueError("Cache size requires a cache directory.")
+        return None
+    if os.path.exists(cache_dir) and not os.path.isdir(cache_dir):
+        raise ValueError("Cache directory is not a directory.")
+    if cache_size is not None and cache_size < 0:
+        raise ValueError("Cache size must not be negative.")
+    return cache_dir
+
+
+def validate_chunk_size(chunk_size: int | None) -> int | None:
+    if chunk_size is None:
+        return None
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be greater than 0.")
+    return chunk_size
+
+
+def validate_max_in_flight(max_in_flight: int | None) -> int | None:
+    if max_in_flight is None:
+        return None
+    if max_in_flight < 1:
+        raise ValueError("Number of tiles in flight must be greater than 0.")
+    return max_in_flight
+
+
+def validate_workers(workers: int | None) -> int | None:
+    if workers is None:
+        return None
+    if workers < 1:
+        raise ValueError("Number of workers must be greater than 0.")
+    return workers
+
+
+def validate_min_tile_overlap(
+    min_tile_overlap: float | None,
+) -> float | None:
+    if min_tile_overlap is None:
+        return None
+    if min_tile_overlap < 0:
+        raise ValueError("Minimum tile overlap must not be negative.")
+    return min_tile_overlap
+
+
+def validate_download_workers(download_workers: int | None) -> int | None:
+    if download_workers is None:
+        return None
+    if download_workers < 1:
+        raise ValueError("Number of download workers must be greater than 0.")
+    return download_workers
+
+
+def validate_download_chunk_size(
+    download_chunk_size: int | None,
+) -> int | None:
+    if download_chunk_size is None:
+        return None
+    if download_chunk_size < 1:
+        raise ValueError("Download chunk size must be greater than 0.")
+    return download_chunk_size
+
+
+def validate_async_fetch(
+    async_fetch: bool | None,
+    adaptive_concurrency: bool | None,
+    bandwidth_limit: float | None,
+) -> bool | None:
+    if not async_fetch:
+        if bandwidth_limit is not None:
+            raise ValueError(
+                "Bandwidth limit requires asynchronous fetching."
+            )
+        return async_fetch
+    if importlib.util.find_spec("aiohttp") is None:
+        raise ValueError(
+            "Asynchronous fetching requires aiohttp, install ahn_cli[async]."
+        )
+    if adaptive_concurrency:
+        raise ValueError(
+            "Adaptive concurrency is not supported with asynchronous fetching."
+        )
+    if bandwidth_limit is not None and bandwidth_limit <= 0:
+        raise ValueError("Bandwidth limit must be greater than 0.")
+    return async_fetch
+
+
+def validate_tiled_output(
+    output_path: str,
+    tile_size: float | None,
+    per_subunit: bool | None,
+    preview: bool | None,
+) -> str | None:
+    if tile_size is None and not per_subunit:
+        return None
+    if tile_size is not None and per_subunit:
+        raise ValueError("Tile size and per subunit output are exclusive.")
+    if tile_size is not None and tile_size < 1:
+        raise ValueError("Tile size must be at least 1 metre.")
+    if os.path.exists(output_path) and not os.path.isdir(output_path):
+        raise ValueError("Output of tiled output must be a directory.")
+    if preview:
+        raise ValueError("Preview is not supported for tiled output.")
+    if output_path.lower().endswith(".copc.laz"):
+        raise ValueError("COPC output is not supported for tiled output.")
+    return output_path
+
+
+def validate_preview(output_path: str, preview: bool | None) -> bool | None:
+    if not preview:
+        return preview
+    if output_path.lower().endswith(".copc.laz") or is_columnar_output(
+        output_path
+    ):
+        raise ValueError(
+            "Preview is not supported for COPC and columnar output."
+        )
+    return preview
+
+
+def validate_columnar_output(
+    output_path: str,
+    columns: list[str] | None,
+    tile_size: float | None,
+    per_subunit: bool | None,
+) -> list[str] | None:
+    if not is_columnar_output(output_path):
+        if columns is not None:
+            raise ValueError(
+                "Columns can only be selected for Parquet, Arrow or npy "
+                "output."
+            )
+        return None
+    if tile_size is not None or per_subunit:
+        raise ValueError("Columnar output is not supported for tiled output.")
+    if columns is not None and len(columns) == 0:
+        raise ValueError("At least one column is required.")
+    if (
+        not output_path.lower().endswith(".npy")
+        and importlib.util.find_spec("pyarrow") is None
+    ):
+        raise ValueError(
+            "Parquet and Arrow output require pyarrow, install "
+            "ahn_cli[columnar]."
+        )
+    return columns
+
+
+def validate_split_features(
+    output_path: str,
+    split_features: bool | None,
+    feature_name: str | None,
+    clip_file: str | None,
+    tile_size: float | None,
+    per_subunit: bool | None,
+    preview: bool | None,
+) -> bool | None:
+    if not split_features:
+        if feature_name is not None:
+            raise ValueError("Feature name requires splitting by feature.")
+        return None
+    if clip_file is None:
+        raise ValueError("Splitting by feature requires a clip file.")
+    if tile_size is not None or per_subunit:
+        raise ValueError(
+            "Splitting by feature and tiled output are exclusive."
+        )
+    if os.path.exists(output_path) and not os.path.isdir(output_path):
+        raise ValueError("Output of split features must be a directory.")
+    if preview:
+        raise ValueError("Preview is not supported for split features.")
+    if output_path.lower().endswith(".copc.laz") or is_columnar_output(
+        output_path
+    ):
+        raise ValueError(
+            "COPC and columnar output are not supported for split features."
+        )
+    return split_features
+
+
+def validate_output_crs(
+    output_crs: str | None,
+    tile_size: float | None,
+    per_subunit: bool | None,
+    split_features: bool | None,
+) -> str | None:
+    if output_crs is None:
+        return None
+    try:
+        pyproj.CRS(output_crs)
+    except pyproj.exceptions.CRSError:
+        raise ValueError("Output CRS is not valid.")
+    if tile_size is not None or per_subunit or split_features:
+        raise ValueError(
+            "Output CRS is not supported for tiled output or split features."
+        )
+    return output_crs
+
+
+def validate_profile_output(profile_output: str | None) -> str | None:
+    if profile_output is None:
+        return None
+    if not profile_output.lower().endswith(PROFILE_EXTENSIONS):
+        raise ValueError("Profile output must end with .json or .prom.")
+    directory = os.path.dirname(os.path.abspath(profile_output))
+    if not os.path.isdir(directory):
+        raise ValueError("Directory of the profile output does not exist.")
+    return profile_output
+
+
 def validate_all(
     cfg: config.Config,
     output_path: str,
@@ -98,6 +335,27 @@ def validate_all(
     epsg: int | None = None,
     decimate: int | None = None,
     bbox: list[float] | None = None,
+    cache_dir: str | None = None,
+    cache_size: int | None = None,
+    chunk_size: int | None = None,
+    max_in_flight: int | None = None,
+    workers: int | None = None,
+    min_tile_overlap: float | None = None,
+    download_workers: int | None = None,
+    download_chunk_size: int | None = None,
+    adaptive_concurrency: bool | None = False,
+    async_fetch: bool | None = False,
+    bandwidth_limit: float | None = None,
+    tile_size: float | None = None,
+    per_subunit: bool | None = False,
+    preview: bool | None = False,
+    columns: list[str] | None = None,
+    voxel_size: float | None = None,
+    poisson_radius: float | None = None,
+    profile_output: str | None = None,
+    split_features: bool | None = False,
+    feature_name: str | None = None,
+    output_crs: str | None = None,
 ) -> bool:
     validate_output(output_path)
     if not bbox:
@@ -108,5 +366,109 @@ def validate_all(
     validate_clip_file(clip_file)
     validate_epsg(epsg)
     validate_decimate(decimate)
+    validate_spatial_decimation(decimate, voxel_size, poisson_radius)
     validate_bbox(bbox)
+    validate_cache(cache_dir, cache_size)
+    validate_chunk_size(chunk_size)
+    validate_max_in_flight(max_in_flight)
+    validate_workers(workers)
+    validate_min_tile_overlap(min_tile_overlap)
+    validate_download_workers(download_workers)
+    validate_download_chunk_size(download_chunk_size)
+    validate_async_fetch(async_fetch, adaptive_concurrency, bandwidth_limit)
+    validate_tiled_output(output_path, tile_size, per_subunit, preview)
+    validate_columnar_output(output_path, columns, tile_size, per_subunit)
+    validate_preview(output_path, preview)
+    validate_split_features(
+        output_path,
+        split_features,
+        feature_name,
+        clip_file,
+        tile_size,
+        per_subunit,
+        preview,
+    )
+    validate_output_crs(output_crs, tile_size, per_subunit, split_features)
+    validate_profile_output(profile_output)
     return True
+
+
+def validate_batch(
+    cfg: config.Config,
+    jobs_path: str,
+    output_path: str | None = None,
+    city_name: str | None = None,
+    bbox: list[float] | None = None,
+    workers: int | None = None,
+    preview: bool | None = False,
+    selective_decompression: bool | None = False,
+    cache_dir: str | None = None,
+    cache_size: int | None = None,
+    chunk_size: int | None = None,
+    max_in_flight: int | None = None,
+    min_tile_overlap: float | None = None,
+    download_workers: int | None = None,
+    download_chunk_size: int | None = None,
+    adaptive_concurrency: bool | None = False,
+    async_fetch: bool | None = False,
+    bandwidth_limit: float | None = None,
+    profile_output: str | None = None,
+) -> list[Job]:
+    if output_path or city_name or bbox:
+        raise ValueError(
+            "Output, city and bbox are set per job in the job file."
+        )
+    if workers is not None or preview or selective_decompression:
+        raise ValueError(
+            "Workers, preview and selective decompression are not "
+            "supported for batch jobs."
+        )
+    if not os.path.isfile(jobs_path):
+        raise ValueError("Job file does not exist.")
+    jobs = read_jobs(jobs_path)
+    outputs = set()
+    for job in jobs:
+        validate_output(job.output)
+        if not job.bbox:
+            validate_city(job.city, str(cfg.city_polygon_file))
+        validate_include_classes(job.include_classes)
+        validate_exclude_classes(job.exclude_classes)
+        validate_include_exclude(job.include_classes, job.exclude_classes)
+        validate_clip_file(job.clip_file)
+        validate_epsg(job.epsg)
+        validate_decimate(job.decimate)
+        validate_spatial_decimation(
+            job.decimate, job.voxel_size, job.poisson_radius
+        )
+        validate_bbox(job.bbox)
+        validate_tiled_output(
+            job.output, job.tile_size, job.per_subunit, False
+        )
+        validate_columnar_output(
+            job.output, job.columns, job.tile_size, job.per_subunit
+        )
+        validate_split_features(
+            job.output,
+            job.split_features,
+            job.feature_name,
+            job.clip_file,
+            job.tile_size,
+            job.per_subunit,
+            False,
+        )
+        validate_output_crs(
+            job.output_crs, job.tile_size, job.per_subunit, job.split_features
+        )
+        output = os.path.abspath(job.output)
+        if output in outputs:
+            raise ValueError(f"Output {job.output} is used by several jobs.")
+        outputs.add(output)
+    validate_cache(cache_dir, cache_size)
+    validate_chunk_size(chunk_size)
+    validate_max_in_flight(max_in_flight)
+    validate_min_tile_overlap(min_tile_overlap)
+    validate_download_workers(download_workers)
+    validate_download_chunk_size(download_chunk_size)
+    validate_async_fetch(async_fetch, adaptive_concurrency, bandwidth_limit)
+    validate_profile_output(profile_output)
+    return jobs
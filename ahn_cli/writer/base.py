@@ -0,0 +1,35 @@
+from typing import Protocol
+
+import laspy
+
+
+class PointWriter(Protocol):
+    """
+    A writer of the filtered points of a run, e.g. the default single LAS/LAZ
+    file, a directory of tiles or a COPC file.
+    """
+
+    def write(
+        self,
+        points: laspy.ScaleAwarePointRecord,
+        header: laspy.LasHeader,
+        source: str,
+    ) -> None:
+        """
+        Writes the filtered points of a part of an input tile.
+
+        Args:
+            points (laspy.ScaleAwarePointRecord): The points to write.
+            header (laspy.LasHeader): The header of the input tile.
+            source (str): The name of the input subunit, e.g. "37EN1_15".
+        """
+        ...
+
+    def close(self) -> str:
+        """
+        Finishes the output.
+
+        Returns:
+            str: The path of the written file or index.
+        """
+        ...
@@ -0,0 +1,220 @@
+import json
+import os
+from typing import Any, BinaryIO
+
+import laspy
+import numpy as np
+from numpy.lib import format as npy_format
+
+COLUMNAR_EXTENSIONS = (".parquet", ".arrow", ".feather", ".npy")
+DEFAULT_COLUMNS = ["x", "y", "z", "classification", "intensity"]
+NPY_INDEX_FILE = "index.json"
+
+
+def is_columnar_output(output_path: str) -> bool:
+    """
+    Returns whether an output path is written in a columnar format.
+    """
+    return output_path.lower().endswith(COLUMNAR_EXTENSIONS)
+
+
+class ColumnarWriter:
+    """
+    Writes selected dimensions of the points in a columnar format, so that
+    analytics read only the columns they need without decoding LAS records.
+
+    The format follows the extension of the output:
+
+    - ".parquet": a Parquet file with one row group per input tile, whose
+      column statistics let readers such as DuckDB skip row groups.
+    - ".arrow" or ".feather": an Arrow IPC file with one record batch per
+      input tile, which can be memory-mapped without copies.
+    - ".npy": a directory with one memory-mappable `.npy` file per column,
+      and an "index.json" of the rows of every input tile.
+
+    Parquet and Arrow require pyarrow, install ahn_cli[columnar]. Coordinates
+    are written as scaled float64, the other dimensions in their LAS types.
+    The points of a tile are buffered until the next tile starts or
+    `max_rows_per_group` points are buffered.
+
+    Args:
+        output_path (str): The path of the output file or directory.
+        columns (list[str] | None, optional): The dimensions to write.
+            Defaults to x, y, z, classification and intensity.
+        max_rows_per_group (int, optional): The maximum number of rows of a
+            row group or record batch. Defaults to 10_000_000.
+
+    Attributes:
+        output_path (str): The path of the output file or directory.
+        columns (list[str]): The dimensions to write.
+        max_rows_per_group (int): The maximum number of rows of a row group.
+
+    Methods:
+        write: Buffers points of an input tile.
+        close: Writes the buffered points and finishes the output.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        columns: list[str] | None = None,
+        max_rows_per_group: int = 10_000_000,
+    ) -> None:
+        if not is_columnar_output(output_path):
+            raise ValueError(
+                "Columnar output must end with one of "
+                + ", ".join(COLUMNAR_EXTENSIONS)
+                + "."
+            )
+        self.output_path = output_path
+        self.columns = columns if columns is not None else DEFAULT_COLUMNS
+        self.max_rows_per_group = max_rows_per_group
+        self._format = os.path.splitext(output_path)[1].lower()
+        self._source: str | None = None
+        self._buffer: list[dict[str, np.ndarray]] = []
+        self._buffered_rows = 0
+        # The Parquet or Arrow writer, created with the schema of the first
+        # row group.
+        self._writer: Any = None
+        # The open `.npy` file and the type of every column.
+        self._npy_files: dict[str, tuple[BinaryIO, np.dtype]] = {}
+        # The rows of every input tile, for the index of the npy output.
+        self._rows: dict[str, list[int]] = {}
+        self._n_rows = 0
+
+    def write(
+        self,
+        points: laspy.ScaleAwarePointRecord,
+        header: laspy.LasHeader,
+        source: str,
+    ) -> None:
+        """
+        Buffers points of an input tile. The buffered points are written as
+        a row group when a different tile starts.
+
+        Args:
+            points (laspy.ScaleAwarePointRecord): The points to write.
+            header (laspy.LasHeader): The header of the input tile. Unused,
+                as only the point values are written.
+            source (str): The name of the input subunit of the points.
+        """
+        if len(points) == 0:
+            return
+        if source != self._source:
+            self._flush()
+            self._source = source
+        # The scaled coordinates are named x, y and z in lower case.
+        dimensions = {"x", "y", "z", *points.point_format.dimension_names}
+        missing = [c for c in self.columns if c not in dimensions]
+        if missing:
+            raise ValueError(
+                f"Dimensions {missing} are not in point format "
+                f"{points.point_format.id}."
+            )
+        self._buffer.append({c: np.asarray(points[c]) for c in self.columns})
+        self._buffered_rows += len(points)
+        if self._buffered_rows >= self.max_rows_per_group:
+            self._flush()
+
+    def close(self) -> str:
+        """
+        Writes the buffered points and finishes the output.
+
+        Returns:
+            str: The path of the output file or directory.
+        """
+        self._flush()
+        if self._format == ".npy":
+            os.makedirs(self.output_path, exist_ok=True)
+            for f, dtype in self._npy_files.values():
+                _write_npy_header(f, dtype, self._n_rows)
+                f.close()
+            with open(
+                os.path.join(self.output_path, NPY_INDEX_FILE), "w"
+            ) as index:
+                json.dump(
+                    {"count": self._n_rows, "tiles": self._rows},
+                    index,
+                    indent=2,
+                )
+        elif self._writer is not None:
+            self._writer.close()
+        return self.output_path
+
+    def _flush(self) -> None:
+        """
+        Writes the buffered points as one row group.
+        """
+        if not self._buffer:
+            return
+        columns = {
+            c: np.concatenate([part[c] for part in self._buffer])
+            for c in self.columns
+        }
+        n_rows = self._buffered_rows
+        self._buffer = []
+        self._buffered_rows = 0
+
+        assert self._source is not None
+        start = self._n_rows
+        self._n_rows += n_rows
+        # A tile that is split over several row groups keeps its first row.
+        self._rows.setdefault(self._source, [start, 0])[1] = self._n_rows
+
+        if self._format == ".npy":
+            self._write_npy(columns)
+            return
+
+        # pyarrow is an optional dependency.
+        import pyarrow as pa
+
+        table = pa.table(columns)
+        if self._writer is None:
+            if self._format == ".parquet":
+                import pyarrow.parquet as pq
+
+                self._writer = pq.ParquetWriter(
+                    self.output_path, table.schema
+                )
+            else:
+                self._writer = pa.ipc.new_file(self.output_path, table.schema)
+        if self._format == ".parquet":
+            self._writer.write_table(table, row_group_size=n_rows)
+        else:
+            self._writer.write_table(table, max_chunksize=n_rows)
+
+    def _write_npy(self, columns: dict[str, np.ndarray]) -> None:
+        """
+        Appends the columns to their `.npy` files. The files start with the
+        header of an empty array, which is rewritten with the final length
+        on close.
+        """
+        os.makedirs(self.output_path, exist_ok=True)
+        for c, values in columns.items():
+            if c not in self._npy_files:
+                new = open(os.path.join(self.output_path, c + ".npy"), "w+b")
+                _write_npy_header(new, values.dtype, 0)
+                self._npy_files[c] = (new, values.dtype)
+            f, dtype = self._npy_files[c]
+            f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+
+
+def _write_npy_header(f: BinaryIO, dtype: np.dtype, n_rows: int) -> None:
+    """
+    Writes the header of a one-dimensional `.npy` file at its start.
+
+    NumPy pads the header so that its length does not depend on the length
+    of the array, which allows rewriting it in place.
+    """
+    position = f.tell()
+    f.seek(0)
+    npy_format.write_array_header_1_0(
+        f,
+        {
+            "descr": npy_format.dtype_to_descr(dtype),
+            "fortran_order": False,
+            "shape": (n_rows,),
+        },
+    )
+    if position > f.tell():
+        f.seek(position)
@@ -0,0 +1,339 @@
+import os
+import shutil
+import struct
+import tempfile
+from typing import Callable
+
+import laspy
+import lazrs
+import numpy as np
+from laspy.vlrs.known import LasZipVlr
+from laspy.vlrs.vlrlist import VLRList
+
+from ahn_cli.writer.header import empty_header
+
+COPC_EXTENSION = ".copc.laz"
+
+# The number of grid cells along every axis of a node from which one point
+# each is kept in the node, the rest goes to the children.
+NODE_RESOLUTION = 128
+READ_CHUNK_SIZE = 1_000_000
+# Size of the COPC info VLR payload and of a hierarchy entry.
+COPC_INFO_SIZE = 160
+_ENTRY = struct.Struct("<4iQii")
+
+VoxelKey = tuple[int, int, int, int]
+
+
+class CopcWriter:
+    """
+    Writes points into a Cloud Optimized Point Cloud (COPC) file, a LAZ 1.4
+    file whose points are organized in an octree, so that readers fetch only
+    the nodes of their area and level of detail with HTTP range requests.
+
+    The points are first spooled to an uncompressed LAS file next to the
+    output. On close, the octree is built out-of-core: every node keeps one
+    point per cell of a `NODE_RESOLUTION`^3 grid and streams the remaining
+    points to temporary files of its eight children, which are split in
+    turn until they hold at most `max_points_per_node` points. Only the
+    points of one node are held in memory at a time. Every node is
+    compressed into its own LAZ chunk.
+
+    Args:
+        output_path (str): The path of the COPC file, ending with
+            ".copc.laz".
+        max_points_per_node (int, optional): The maximum number of points of
+            a leaf node. Defaults to 100_000.
+        max_depth (int, optional): The maximum depth of the octree, whose
+            nodes keep all their points. Defaults to 16.
+
+    Attributes:
+        output_path (str): The path of the COPC file.
+        max_points_per_node (int): The maximum number of points of a leaf.
+        max_depth (int): The maximum depth of the octree.
+
+    Methods:
+        write: Spools points for the octree.
+        close: Builds the octree and writes the COPC file.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        max_points_per_node: int = 100_000,
+        max_depth: int = 16,
+    ) -> None:
+        if max_points_per_node <= 0:
+            raise ValueError("Max points per node must be greater than 0.")
+        self.output_path = output_path
+        self.max_points_per_node = max_points_per_node
+        self.max_depth = max_depth
+        self._tmp_dir = tempfile.mkdtemp(
+            prefix="ahn_cli_copc_",
+            dir=os.path.dirname(os.path.abspath(output_path)),
+        )
+        self._spool_path = os.path.join(self._tmp_dir, "spool.las")
+        self._spool: laspy.LasWriter | None = None
+        self._gps_time = (np.inf, -np.inf)
+
+    def write(
+        self,
+        points: laspy.ScaleAwarePointRecord,
+        header: laspy.LasHeader,
+        source: str,
+    ) -> None:
+        """
+        Spools points for the octree.
+
+        Args:
+            points (laspy.ScaleAwarePointRecord): The points to write.
+            header (laspy.LasHeader): The header of the input tile of the
+                points, the template of the output.
+            source (str): The name of the input subunit of the points.
+                Unused, as all points go into one file.
+        """
+        if len(points) == 0:
+            return
+        points = _to_copc_format(points)
+        if self._spool is None:
+            spool_header = empty_header(header)
+            if spool_header.point_format.id != points.point_format.id:
+                spool_header = laspy.LasHeader(
+                    version="1.4", point_format=points.point_format
+                )
+                spool_header.scales = header.scales
+                spool_header.offsets = header.offsets
+                spool_header.vlrs = header.vlrs
+                spool_header = empty_header(spool_header)
+            self._spool = laspy.open(
+                self._spool_path, mode="w", header=spool_header
+            )
+        self._spool.write_points(points)
+        gps_time = np.asarray(points.gps_time)
+        self._gps_time = (
+            min(self._gps_time[0], float(gps_time.min())),
+            max(self._gps_time[1], float(gps_time.max())),
+        )
+
+    def close(self) -> str:
+        """
+        Builds the octree and writes the COPC file.
+
+        Returns:
+            str: The path of the COPC file.
+        """
+        try:
+            if self._spool is None:
+                raise ValueError("No points to write to the COPC file.")
+            self._spool.close()
+            with laspy.open(self._spool_path) as spool:
+                spool_header = spool.header
+            self._write_copc(spool_header)
+        finally:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+        return self.output_path
+
+    def _write_copc(self, spool_header: laspy.LasHeader) -> None:
+        """
+        Writes the header, the octree nodes as LAZ chunks and the hierarchy.
+        """
+        mins, maxs = spool_header.mins, spool_header.maxs
+        center = (mins + maxs) / 2
+        # The cube is slightly larger than the bounds, so that the points on
+        # the maximum sides fall inside the last cells.
+        halfsize = float(np.max(maxs - mins)) / 2 * (1 + 1e-9) + 1e-6
+        spacing = 2 * halfsize / NODE_RESOLUTION
+
+        point_format = spool_header.point_format
+        laz_vlr = lazrs.LazVlr.new_for_compression(
+            point_format.id,
+            point_format.num_extra_bytes,
+            use_variable_size_chunks=True,
+        )
+        header = laspy.LasHeader(version="1.4", point_format=point_format)
+        header.scales = spool_header.scales
+        header.offsets = spool_header.offsets
+        header.mins = mins
+        header.maxs = maxs
+        header.point_count = spool_header.point_count
+        header.number_of_points_by_return = (
+            spool_header.number_of_points_by_return
+        )
+        header.global_encoding.wkt = True
+        header.are_points_compressed = True
+        # The COPC info VLR must be the first VLR of the file.
+        info_vlr = laspy.VLR("copc", 1, "COPC info", bytes(COPC_INFO_SIZE))
+        header.vlrs = VLRList(
+            [info_vlr, LasZipVlr(laz_vlr.record_data())]
+            + [
+                vlr
+                for vlr in spool_header.vlrs
+                if vlr.user_id not in ("copc", "laszip encoded")
+            ]
+        )
+
+        entries: list[bytes] = []
+        with open(self.output_path, "wb") as f:
+            header.write_to(f)
+            compressor = lazrs.LasZipCompressor(f, laz_vlr)
+            # The compressor starts with the offset to the chunk table.
+            chunk_start = header.offset_to_point_data + 8
+
+            def write_node(
+                key: VoxelKey,
+                points: laspy.ScaleAwarePointRecord,
+            ) -> None:
+                nonlocal chunk_start
+                compressor.compress_many(
+                    np.frombuffer(points.array, np.uint8)
+                )
+                compressor.finish_current_chunk()
+                chunk_end = f.tell()
+                entries.append(
+                    _ENTRY.pack(
+                        *key,
+                        chunk_start,
+                        chunk_end - chunk_start,
+                        len(points),
+                    )
+                )
+                chunk_start = chunk_end
+
+            self._build_node(
+                (0, 0, 0, 0),
+                self._spool_path,
+                spool_header.point_count,
+                center - halfsize,
+                2 * halfsize,
+                write_node,
+            )
+            compressor.done()
+
+            hierarchy = b"".join(entries)
+            evlr_start = f.tell()
+            VLRList(
+                [laspy.VLR("copc", 1000, "EPT hierarchy", hierarchy)]
+            ).write_to(f, as_extended=True)
+            # The EVLR header takes 60 bytes before the hierarchy page.
+            hierarchy_offset = f.tell() - len(hierarchy)
+
+            info_vlr.record_data = (
+                struct.pack("<5d", *center, halfsize, spacing)
+                + struct.pack("<2Q", hierarchy_offset, len(hierarchy))
+                + struct.pack("<2d", *self._gps_time)
+                + bytes(11 * 8)
+            )
+            header.start_of_first_evlr = evlr_start
+            header.number_of_evlrs = 1
+            f.seek(0)
+            header.write_to(f, ensure_same_size=True)
+
+    def _build_node(
+        self,
+        key: VoxelKey,
+        path: str,
+        count: int,
+        node_min: np.ndarray,
+        node_size: float,
+        write_node: Callable[[VoxelKey, laspy.ScaleAwarePointRecord], None],
+    ) -> None:
+        """
+        Writes the node `key` holding the points of the LAS file `path`, and
+        recursively its children.
+        """
+        depth, kx, ky, kz = key
+        with laspy.open(path) as las:
+            if count <= self.max_points_per_node or depth >= self.max_depth:
+                write_node(key, las.read_points(-1))
+                return
+
+            occupied = np.zeros(NODE_RESOLUTION**3, dtype=bool)
+            kept: list[np.ndarray] = []
+            children: dict[int, laspy.LasWriter] = {}
+            child_header = empty_header(las.header)
+            try:
+                for points in las.chunk_iterator(READ_CHUNK_SIZE):
+                    xyz = np.stack([points.x, points.y, points.z], axis=1)
+                    cells = np.clip(
+                        (
+                            (xyz - node_min) / node_size * NODE_RESOLUTION
+                        ).astype(np.int64),
+                        0,
+                        NODE_RESOLUTION - 1,
+                    )
+                    flat = (
+                        cells[:, 0] * NODE_RESOLUTION + cells[:, 1]
+                    ) * NODE_RESOLUTION + cells[:, 2]
+                    # The first point of every free cell stays in the node.
+                    unique, first = np.unique(flat, return_index=True)
+                    free = ~occupied[unique]
+                    occupied[unique[free]] = True
+                    keep = np.zeros(len(points), dtype=bool)
+                    keep[first[free]] = True
+                    kept.append(points.array[keep])
+
+                    half = cells >= NODE_RESOLUTION // 2
+                    octants = half[:, 0] * 4 + half[:, 1] * 2 + half[:, 2]
+                    for octant in np.unique(octants[~keep]):
+                        if octant not in children:
+                            children[octant] = laspy.open(
+                                f"{path[:-4]}_{octant}.las",
+                                mode="w",
+                                header=child_header,
+                            )
+                        children[octant].write_points(
+                            points[(~keep) & (octants == octant)]
+                        )
+            finally:
+                for child in children.values():
+                    child.close()
+            child_counts = {
+                octant: child.header.point_count
+                for octant, child in children.items()
+            }
+
+            write_node(
+                key,
+                laspy.ScaleAwarePointRecord(
+                    np.concatenate(kept),
+                    las.header.point_format,
+                    las.header.scales,
+                    las.header.offsets,
+                ),
+            )
+
+        half_size = node_size / 2
+        for octant in sorted(child_counts):
+            dx, dy, dz = (octant >> 2) & 1, (octant >> 1) & 1, octant & 1
+            child_path = f"{path[:-4]}_{octant}.las"
+            self._build_node(
+                (depth + 1, 2 * kx + dx, 2 * ky + dy, 2 * kz + dz),
+                child_path,
+                child_counts[octant],
+                node_min + half_size * np.array([dx, dy, dz]),
+                half_size,
+                write_node,
+            )
+            os.remove(child_path)
+
+
+def _to_copc_format(
+    points: laspy.ScaleAwarePointRecord,
+) -> laspy.ScaleAwarePointRecord:
+    """
+    Converts points to point format 6 or 7, as COPC only allows the point
+    formats 6, 7 and 8.
+    """
+    if points.point_format.id in (6, 7, 8):
+        return points
+    point_format = laspy.PointFormat(
+        7 if "red" in points.point_format.dimension_names else 6
+    )
+    converted = laspy.ScaleAwarePointRecord.zeros(
+        len(points),
+        point_format=point_format,
+        scales=points.scales,
+        offsets=points.offsets,
+    )
+    converted.copy_fields_from(points)
+    return converted
@@ -0,0 +1,29 @@
+import copy
+
+import laspy
+import numpy as np
+
+
+def empty_header(header: laspy.LasHeader) -> laspy.LasHeader:
+    """
+    Returns a copy of a header without points.
+
+    The point counts are zero and the bounds are empty, so that a writer
+    grows them while the points are written and the header describes exactly
+    the points in the file. The point format, scales, offsets and VLRs, e.g.
+    the CRS, are kept.
+
+    Args:
+        header (laspy.LasHeader): The header to copy.
+
+    Returns:
+        laspy.LasHeader: The empty header.
+    """
+    header = copy.deepcopy(header)
+    header.point_count = 0
+    header.number_of_points_by_return = np.zeros_like(
+        header.number_of_points_by_return
+    )
+    header.mins = np.full(3, np.inf)
+    header.maxs = np.full(3, -np.inf)
+    return header
@@ -0,0 +1,138 @@
+import laspy
+import numpy as np
+
+from ahn_cli.writer.header import empty_header
+
+_INT32 = np.iinfo(np.int32)
+
+
+class LasFileWriter:
+    """
+    Writes the points of all tiles into a single LAS or LAZ file through one
+    open writer, instead of reopening the output in append mode per tile,
+    which re-reads the LAZ chunk table every time.
+
+    The output takes the point format, scales, offsets and VLRs of the first
+    tile. Its bounds and point counts start empty and grow while the points
+    are written, and the header is written once on close. Points of tiles
+    with other scales or offsets are rescaled to those of the output with
+    vectorized integer arithmetic.
+
+    Args:
+        output_path (str): The path of the LAS or LAZ file.
+
+    Attributes:
+        output_path (str): The path of the LAS or LAZ file.
+
+    Methods:
+        write: Writes points into the file.
+        close: Closes the file.
+    """
+
+    def __init__(self, output_path: str) -> None:
+        self.output_path = output_path
+        self._writer: laspy.LasWriter | None = None
+
+    def write(
+        self,
+        points: laspy.ScaleAwarePointRecord,
+        header: laspy.LasHeader,
+        source: str,
+    ) -> None:
+        """
+        Writes points into the file. The points are rescaled in place if
+        their scales or offsets differ from those of the file.
+
+        Args:
+            points (laspy.ScaleAwarePointRecord): The points to write.
+            header (laspy.LasHeader): The header of the input tile of the
+                points, the template of the output.
+            source (str): The name of the input subunit of the points.
+                Unused, as all points go into one file.
+
+        Raises:
+            ValueError: If the points do not fit in the coordinate range of
+                the file.
+        """
+        if self._writer is None:
+            self._writer = laspy.open(
+                self.output_path, mode="w", header=empty_header(header)
+            )
+        if len(points) == 0:
+            return
+        rescale_points(
+            points, self._writer.header.scales, self._writer.header.offsets
+        )
+        self._writer.write_points(points)
+
+    def close(self) -> str:
+        """
+        Writes the header with the final bounds and point counts, and closes
+        the file.
+
+        Returns:
+            str: The path of the LAS or LAZ file.
+
+        Raises:
+            ValueError: If no tile was written.
+        """
+        if self._writer is None:
+            raise ValueError("No tiles to write to the output file.")
+        self._writer.close()
+        return self.output_path
+
+
+def rescale_points(
+    points: laspy.ScaleAwarePointRecord,
+    scales: np.ndarray,
+    offsets: np.ndarray,
+) -> None:
+    """
+    Rescales the integer coordinates of points in place to other scales and
+    offsets.
+
+    With equal scales and offsets that differ by whole multiples of the
+    scale, as between AHN tiles, the integers are shifted without a round
+    trip through floating point. Otherwise they are recomputed from the
+    scaled coordinates.
+
+    Args:
+        points (laspy.ScaleAwarePointRecord): The points to rescale.
+        scales (np.ndarray): The new scales.
+        offsets (np.ndarray): The new offsets.
+
+    Raises:
+        ValueError: If the coordinates do not fit in 32-bit integers with the
+            new scales and offsets.
+    """
+    scales = np.asarray(scales, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.float64)
+    if np.array_equal(points.scales, scales) and np.array_equal(
+        points.offsets, offsets
+    ):
+        return
+    for axis, name in enumerate("XYZ"):
+        values = points.array[name]
+        shift = (points.offsets[axis] - offsets[axis]) / scales[axis]
+        if points.scales[axis] == scales[axis] and np.isclose(
+            shift, np.round(shift), rtol=0, atol=1e-6
+        ):
+            rescaled = values.astype(np.int64) + int(np.round(shift))
+        else:
+            rescaled = np.round(
+                (
+                    values * points.scales[axis]
+                    + (points.offsets[axis] - offsets[axis])
+                )
+                / scales[axis]
+            )
+        if len(rescaled) and (
+            rescaled.min() < _INT32.min or rescaled.max() > _INT32.max
+        ):
+            raise ValueError(
+                f"The {name.lower()} coordinates do not fit in the output "
+                "with its scales and offsets."
+            )
+        points.array[name] = rescaled
+    points.scales = scales
+    points.offsets = offsets
@@ -0,0 +1,59 @@
+import laspy
+
+from ahn_cli.manipulator.transformer import PointReprojector
+from ahn_cli.writer.base import PointWriter
+
+
+class ReprojectingWriter:
+    """
+    Reprojects the points to another CRS before they are written by another
+    writer, e.g. to ETRS89 / UTM 31N or WGS84 for consumers outside the
+    Netherlands. The filters work in RD New, so the points are only
+    reprojected on their way out.
+
+    Args:
+        writer (PointWriter): The writer of the reprojected points.
+        reprojector (PointReprojector): The reprojector of the run.
+
+    Attributes:
+        writer (PointWriter): The writer of the reprojected points.
+        reprojector (PointReprojector): The reprojector of the run.
+
+    Methods:
+        write: Reprojects points and writes them.
+        close: Closes the writer.
+    """
+
+    def __init__(
+        self, writer: PointWriter, reprojector: PointReprojector
+    ) -> None:
+        self.writer = writer
+        self.reprojector = reprojector
+
+    def write(
+        self,
+        points: laspy.ScaleAwarePointRecord,
+        header: laspy.LasHeader,
+        source: str,
+    ) -> None:
+        """
+        Reprojects points in place and writes them.
+
+        Args:
+            points (laspy.ScaleAwarePointRecord): The points to write, in
+                RD New.
+            header (laspy.LasHeader): The header of the input tile of the
+                points.
+            source (str): The name of the input subunit of the points.
+        """
+        points, header = self.reprojector.reproject(points, header)
+        self.writer.write(points, header, source)
+
+    def close(self) -> str:
+        """
+        Closes the writer.
+
+        Returns:
+            str: The path of the written file or index.
+        """
+        return self.writer.close()
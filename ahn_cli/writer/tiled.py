@@ -0,0 +1,350 @@
+import json
+import os
+from collections import OrderedDict
+
+import laspy
+import numpy as np
+from laspy.lasappender import LasAppender
+
+from ahn_cli.manipulator import rasterizer
+from ahn_cli.manipulator.clipper import FeatureClipper
+from ahn_cli.writer.header import empty_header
+
+MANIFEST_FILE = "index.geojson"
+
+
+class TiledWriter:
+    """
+    Writes points into a directory of tiles instead of a single file, plus a
+    GeoJSON index of the tiles.
+
+    Points are either split into a square grid in EPSG:28992, in which case a
+    tile is named after its lower left corner, e.g. "193000_441000.laz", or
+    written into one file per input subunit, e.g. "37EN1_15.laz".
+
+    Writers are kept open while points arrive. At most `max_open_files` are
+    open at the same time; the least recently used one is closed and reopened
+    in append mode when it gets more points.
+
+    Args:
+        output_dir (str): The directory of the tiles, created if needed.
+        tile_size (float | None, optional): The size of the grid tiles in
+            metres, at least 1 so that tiles get distinct integer names.
+            Defaults to None, which writes one file per input subunit.
+        extension (str, optional): The extension of the tiles, ".laz" or
+            ".las". Defaults to ".laz".
+        max_open_files (int, optional): The maximum number of open tiles.
+            Defaults to 64.
+
+    Attributes:
+        output_dir (str): The directory of the tiles.
+        tile_size (float | None): The size of the grid tiles in metres.
+        extension (str): The extension of the tiles.
+        max_open_files (int): The maximum number of open tiles.
+
+    Methods:
+        write: Writes points into the tiles they belong to.
+        close: Closes all tiles and writes the index.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        tile_size: float | None = None,
+        extension: str = ".laz",
+        max_open_files: int = 64,
+    ) -> None:
+        if tile_size is not None and tile_size < 1:
+            raise ValueError("Tile size must be at least 1 metre.")
+        self.output_dir = output_dir
+        self.tile_size = tile_size
+        self.extension = extension
+        self.max_open_files = max_open_files
+        self._writers: OrderedDict[
+            str, laspy.LasWriter | LasAppender
+        ] = OrderedDict()
+        # The point count and bounds of every tile that has been written.
+        self._tiles: dict[str, tuple[int, np.ndarray, np.ndarray]] = {}
+        os.makedirs(output_dir, exist_ok=True)
+
+    def write(
+        self,
+        points: laspy.ScaleAwarePointRecord,
+        header: laspy.LasHeader,
+        source: str,
+    ) -> None:
+        """
+        Writes points into the tiles they belong to.
+
+        Args:
+            points (laspy.ScaleAwarePointRecord): The points to write.
+            header (laspy.LasHeader): The header of the input tile of the
+                points, the template of new output tiles.
+            source (str): The name of the input subunit of the points, e.g.
+                "37EN1_15".
+        """
+        if len(points) == 0:
+            return
+        if self.tile_size is None:
+            self._write_tile(source, points, header)
+            return
+
+        cols = np.floor(points.x / self.tile_size).astype(np.int64)
+        rows = np.floor(points.y / self.tile_size).astype(np.int64)
+        cells, inverse = np.unique(
+            np.stack([cols, rows], axis=1), axis=0, return_inverse=True
+        )
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.searchsorted(inverse[order], np.arange(len(cells) + 1))
+        for (col, row), start, end in zip(cells, bounds[:-1], bounds[1:]):
+            name = f"{int(col * self.tile_size)}_{int(row * self.tile_size)}"
+            self._write_tile(name, points[order[start:end]], header)
+
+    def close(self) -> str:
+        """
+        Closes all tiles and writes the index of the tiles.
+
+        The index is a GeoJSON feature collection in EPSG:28992 with the
+        bounding box of every tile as geometry, and the file name, point
+        count and bounds as properties. Readers can load only the tiles that
+        intersect their area of interest.
+
+        Returns:
+            str: The path of the index.
+        """
+        while self._writers:
+            _, writer = self._writers.popitem(last=False)
+            writer.close()
+
+        features = []
+        for name in sorted(self._tiles):
+            count, mins, maxs = self._tiles[name]
+            minx, miny, maxx, maxy = mins[0], mins[1], maxs[0], maxs[1]
+            features.append(
+                {
+                    "type": "Feature",
+                    "geometry": {
+                        "type": "Polygon",
+                        "coordinates": [
+                            [
+                                [minx, miny],
+                                [maxx, miny],
+                                [maxx, maxy],
+                                [minx, maxy],
+                                [minx, miny],
+                            ]
+                        ],
+                    },
+                    "properties": {
+                        "file": name + self.extension,
+                        "point_count": count,
+                        "mins": mins.tolist(),
+                        "maxs": maxs.tolist(),
+                    },
+                }
+            )
+        manifest = {
+            "type": "FeatureCollection",
+            "crs": {
+                "type": "name",
+                "properties": {"name": "urn:ogc:def:crs:EPSG::28992"},
+            },
+            "features": features,
+        }
+        path = os.path.join(self.output_dir, MANIFEST_FILE)
+        with open(path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        return path
+
+    def _write_tile(
+        self,
+        name: str,
+        points: laspy.ScaleAwarePointRecord,
+        header: laspy.LasHeader,
+    ) -> None:
+        """
+        Writes points into a single tile, opening it if needed.
+        """
+        writer = self._writers.get(name)
+        if writer is None:
+            writer = self._open(name, header)
+        self._writers.move_to_end(name)
+
+        if isinstance(writer, LasAppender):
+            # Unlike the writer, the appender does not rescale the points.
+            if np.any(points.scales != writer.header.scales) or np.any(
+                points.offsets != writer.header.offsets
+            ):
+                points = laspy.ScaleAwarePointRecord(
+                    points.array.copy(),
+                    points.point_format,
+                    points.scales,
+                    points.offsets,
+                )
+                points.change_scaling(
+                    writer.header.scales, writer.header.offsets
+                )
+            writer.append_points(points)
+        else:
+            writer.write_points(points)
+
+        xyz = np.stack([points.x, points.y, points.z], axis=1)
+        count, mins, maxs = self._tiles.get(
+            name, (0, np.full(3, np.inf), np.full(3, -np.inf))
+        )
+        self._tiles[name] = (
+            count + len(points),
+            np.minimum(mins, xyz.min(axis=0)),
+            np.maximum(maxs, xyz.max(axis=0)),
+        )
+
+    def _open(
+        self, name: str, header: laspy.LasHeader
+    ) -> laspy.LasWriter | LasAppender:
+        """
+        Opens a tile, closing the least recently used tile if too many are
+        open.
+        """
+        if len(self._writers) >= self.max_open_files:
+            _, oldest = self._writers.popitem(last=False)
+            oldest.close()
+
+        path = os.path.join(self.output_dir, name + self.extension)
+        writer: laspy.LasWriter | LasAppender
+        if name in self._tiles:
+            writer = laspy.open(path, mode="a")
+        else:
+            writer = laspy.open(path, mode="w", header=empty_header(header))
+        self._writers[name] = writer
+        return writer
+
+
+class FeatureWriter(TiledWriter):
+    """
+    Writes the points of every clip feature into a file of its own, e.g. per
+    building block or neighbourhood, in a single pass over the tiles, plus a
+    GeoJSON index of the files like `TiledWriter`.
+
+    Points are labelled with the feature they lie in by a `FeatureClipper`,
+    and points outside all features are dropped. The points are buffered per
+    feature and written in batches: a feature's buffer is flushed once it
+    holds `batch_size` points, the largest buffers when all buffers together
+    hold more than `max_buffered_points` points, and the rest on close. A
+    feature that is spread over many tiles is thereby written in a few
+    batches, and the bounded pool of open files is rarely reopened in append
+    mode.
+
+    Args:
+        output_dir (str): The directory of the files, created if needed.
+        clipper (FeatureClipper): The clipper of the features.
+        names (list[str] | None, optional): The file names of the features,
+            without extension. Defaults to None, which names the files after
+            the feature index, e.g. "feature_12.laz".
+        extension (str, optional): The extension of the files, ".laz" or
+            ".las". Defaults to ".laz".
+        max_open_files (int, optional): The maximum number of open files.
+            Defaults to 64.
+        batch_size (int, optional): The number of buffered points of a
+            feature that are written at once. Defaults to 1,000,000.
+        max_buffered_points (int, optional): The maximum number of buffered
+            points of all features. Defaults to 10,000,000.
+
+    Attributes:
+        clipper (FeatureClipper): The clipper of the features.
+        names (list[str]): The file names of the features.
+        batch_size (int): The number of points of a feature written at once.
+        max_buffered_points (int): The maximum number of buffered points.
+
+    Methods:
+        write: Buffers points for the features they lie in.
+        close: Writes the buffered points, closes all files and writes the
+            index.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        clipper: FeatureClipper,
+        names: list[str] | None = None,
+        extension: str = ".laz",
+        max_open_files: int = 64,
+        batch_size: int = 1_000_000,
+        max_buffered_points: int = 10_000_000,
+    ) -> None:
+        if names is None:
+            names = [f"feature_{i}" for i in range(len(clipper.features))]
+        if len(names) != len(clipper.features):
+            raise ValueError("Every feature needs exactly one name.")
+        if len(set(names)) != len(names):
+            raise ValueError("Feature names must be unique.")
+        super().__init__(output_dir, None, extension, max_open_files)
+        self.clipper = clipper
+        self.names = names
+        self.batch_size = batch_size
+        self.max_buffered_points = max_buffered_points
+        # The buffered points of every feature, with the header of their
+        # input tile, and their number.
+        self._buffers: dict[
+            int, list[tuple[laspy.ScaleAwarePointRecord, laspy.LasHeader]]
+        ] = {}
+        self._buffered: dict[int, int] = {}
+        self._n_buffered = 0
+
+    def write(
+        self,
+        points: laspy.ScaleAwarePointRecord,
+        header: laspy.LasHeader,
+        source: str,
+    ) -> None:
+        """
+        Buffers points for the features they lie in, and writes the buffers
+        that are full.
+
+        Args:
+            points (laspy.ScaleAwarePointRecord): The points to write.
+            header (laspy.LasHeader): The header of the input tile of the
+                points, the template of new files.
+            source (str): The name of the input subunit of the points.
+                Unused, as the points are split by feature.
+        """
+        if len(points) == 0:
+            return
+        labels = self.clipper.labels(points.x, points.y)
+        inside = np.flatnonzero(labels != rasterizer.NO_FEATURE)
+        order = inside[np.argsort(labels[inside], kind="stable")]
+        features, starts = np.unique(labels[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        for feature, start, end in zip(features.tolist(), starts, ends):
+            self._buffers.setdefault(feature, []).append(
+                (points[order[start:end]], header)
+            )
+            self._buffered[feature] = (
+                self._buffered.get(feature, 0) + end - start
+            )
+            self._n_buffered += end - start
+            if self._buffered[feature] >= self.batch_size:
+                self._flush(feature)
+
+        while self._n_buffered > self.max_buffered_points:
+            self._flush(max(self._buffered, key=self._buffered.__getitem__))
+
+    def close(self) -> str:
+        """
+        Writes the buffered points, closes all files and writes the index of
+        the files.
+
+        Returns:
+            str: The path of the index.
+        """
+        for feature in sorted(self._buffers):
+            self._flush(feature)
+        return super().close()
+
+    def _flush(self, feature: int) -> None:
+        """
+        Writes the buffered points of a feature into its file.
+        """
+        for points, header in self._buffers.pop(feature, []):
+            self._write_tile(self.names[feature], points, header)
+        self._n_buffered -= self._buffered.pop(feature, 0)
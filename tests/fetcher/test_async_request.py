@@ -0,0 +1,139 @@
+import asyncio
+import importlib.util
+import os
+import tempfile
+import time
+import unittest
+from typing import Any
+from unittest import mock
+
+from tile_server import TileServer
+
+from ahn_cli.fetcher.download import DownloadError
+
+HAS_AIOHTTP = importlib.util.find_spec("aiohttp") is not None
+if HAS_AIOHTTP:
+    import aiohttp
+
+    from ahn_cli.fetcher.async_download import (
+        BandwidthLimiter,
+        download_async,
+    )
+    from ahn_cli.fetcher.async_request import AsyncFetcher
+
+TILES = {f"37EN1_{i:02d}": f"tile{i}".encode() * 1000 for i in range(1, 6)}
+
+
+@unittest.skipUnless(HAS_AIOHTTP, "aiohttp is not installed")
+class TestAsyncFetcher(unittest.TestCase):
+    def fetcher(self, base_url: str, **kwargs: Any) -> "AsyncFetcher":
+        with mock.patch(
+            "ahn_cli.fetcher.request.ahn_subunit_indicies_of_bbox",
+            return_value=list(TILES),
+        ):
+            return AsyncFetcher(base_url, "", [0, 0, 1, 1], **kwargs)
+
+    def test_fetch(self) -> None:
+        with TileServer(TILES) as server:
+            results = self.fetcher(server.base_url).fetch()
+            self.assertEqual(len(results), len(TILES))
+            for url, path in results.items():
+                with open(path, "rb") as f:
+                    self.assertEqual(f.read(), TILES[url[-12:-4]])
+                os.remove(path)
+
+    def test_priority(self) -> None:
+        with TileServer(TILES) as server:
+            fetcher = self.fetcher(
+                server.base_url,
+                max_connections=1,
+                priority=lambda url: -fetcher.urls.index(url),
+            )
+            for path in fetcher.fetch().values():
+                os.remove(path)
+            paths = [path for path, _ in server.requests]
+        self.assertEqual(paths, [f"/AHN4_T/{t}.LAZ" for t in reversed(TILES)])
+
+    def test_iter_fetch_window(self) -> None:
+        with TileServer(TILES) as server:
+            tiles = self.fetcher(server.base_url).iter_fetch(max_in_flight=2)
+            fetched = []
+            for url, path in tiles:
+                self.assertLessEqual(len(server.requests), len(fetched) + 2)
+                fetched.append(url)
+                os.remove(path)
+            self.assertCountEqual(
+                fetched, [server.base_url + f"{t}.LAZ" for t in TILES]
+            )
+
+    def test_iter_fetch_stopped_early(self) -> None:
+        with TileServer(TILES) as server:
+            fetcher = self.fetcher(server.base_url)
+            with tempfile.TemporaryDirectory() as tmpdir, mock.patch.object(
+                tempfile, "tempdir", tmpdir
+            ):
+                tiles = fetcher.iter_fetch()
+                _, path = next(tiles)
+                tiles.close()
+                # Only the yielded tile is left.
+                self.assertEqual(os.listdir(tmpdir), [os.path.basename(path)])
+
+    def test_no_requests_session(self) -> None:
+        with TileServer(TILES) as server, mock.patch(
+            "ahn_cli.fetcher.request.requests.Session"
+        ) as session:
+            for path in self.fetcher(server.base_url).fetch().values():
+                os.remove(path)
+            session.assert_not_called()
+
+    def test_fetch_reports_errors(self) -> None:
+        tiles = dict(TILES)
+        del tiles["37EN1_03"]
+        with TileServer(tiles) as server:
+            with self.assertRaises(DownloadError):
+                self.fetcher(server.base_url).fetch()
+
+
+@unittest.skipUnless(HAS_AIOHTTP, "aiohttp is not installed")
+class TestDownloadAsync(unittest.TestCase):
+    def test_resume_after_dropped_connection(self) -> None:
+        tile = bytes(range(256)) * 4096
+        with tempfile.TemporaryDirectory() as tmpdir, TileServer(
+            {"37EN1_15": tile}
+        ) as server:
+            path = os.path.join(tmpdir, "37EN1_15.LAZ")
+            server.faults += ["drop", "error", "drop"]
+
+            async def run() -> None:
+                async with aiohttp.ClientSession() as session:
+                    await download_async(
+                        session,
+                        server.base_url + "37EN1_15.LAZ",
+                        path,
+                        backoff=0.01,
+                        chunk_size=64 * 1024,
+                    )
+
+            asyncio.run(run())
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), tile)
+            ranges = [headers.get("Range") for _, headers in server.requests]
+        # Whether a retry resumes depends on how much of the dropped body
+        # aiohttp handed out before it noticed the closed connection.
+        self.assertEqual(len(ranges), 4)
+        self.assertIsNone(ranges[0])
+
+    def test_bandwidth_limit(self) -> None:
+        async def run() -> float:
+            limiter = BandwidthLimiter(1_000_000, burst=100_000)
+            start = time.monotonic()
+            for _ in range(3):
+                await limiter.acquire(100_000)
+            return time.monotonic() - start
+
+        # The burst covers the first chunk, the other two wait 0.1s each.
+        self.assertGreaterEqual(asyncio.run(run()), 0.19)
+
+
+if __name__ == "__main__":
+    unittest.main()
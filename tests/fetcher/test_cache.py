@@ -0,0 +1,183 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from tile_server import TileServer
+
+from ahn_cli.fetcher.cache import TileCache
+from ahn_cli.fetcher.download import DownloadError
+from ahn_cli.fetcher.request import Fetcher
+
+
+def write_file(directory: str, size: int) -> str:
+    fd, path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        f.write(b"x" * size)
+    return path
+
+
+class TestTileCache(unittest.TestCase):
+    def test_put_and_get(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = TileCache(os.path.join(tmpdir, "cache"))
+            path = cache.put(
+                "37EN1_15", write_file(tmpdir, 10), '"abc"', None
+            )
+            self.assertTrue(cache.owns(path))
+            self.assertEqual(cache.total_size(), 10)
+            cache.close()
+
+            # A new instance reads the persisted index.
+            cache = TileCache(os.path.join(tmpdir, "cache"))
+            entry = cache.get("37EN1_15")
+            self.assertIsNotNone(entry)
+            self.assertEqual(cache.path("37EN1_15"), path)
+            self.assertEqual(
+                cache.conditional_headers("37EN1_15"),
+                {"If-None-Match": '"abc"'},
+            )
+            self.assertIsNone(cache.get("37EN1_16"))
+            cache.close()
+
+    def test_lru_eviction(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_dir = os.path.join(tmpdir, "cache")
+            cache = TileCache(cache_dir)
+            for tile_index in ["a", "b", "c"]:
+                cache.put(tile_index, write_file(tmpdir, 10))
+            cache.close()
+
+            cache = TileCache(cache_dir, max_bytes=25)
+            cache.get("a")  # "b" is now the least recently used tile
+            cache.put("d", write_file(tmpdir, 10))
+            self.assertIsNone(cache.get("b"))
+            self.assertIsNone(cache.get("c"))
+            self.assertIsNotNone(cache.get("a"))
+            self.assertIsNotNone(cache.get("d"))
+            self.assertFalse(os.path.exists(os.path.join(cache_dir, "b.LAZ")))
+            cache.close()
+
+    def test_shared_index(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_dir = os.path.join(tmpdir, "cache")
+            first = TileCache(cache_dir)
+            second = TileCache(cache_dir)
+            first.put("a", write_file(tmpdir, 10))
+            second.put("b", write_file(tmpdir, 10))
+            # Neither instance overwrites the entries of the other.
+            self.assertEqual(first.total_size(), 20)
+            third = TileCache(cache_dir)
+            self.assertIsNotNone(third.get("a"))
+            for cache in [first, second, third]:
+                cache.close()
+
+    def test_skips_tiles_locked_elsewhere(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_dir = os.path.join(tmpdir, "cache")
+            other = TileCache(cache_dir)
+            other.put("a", write_file(tmpdir, 10))
+            other.put("b", write_file(tmpdir, 10))
+            other.release("b")
+
+            cache = TileCache(cache_dir, max_bytes=15)
+            cache.put("c", write_file(tmpdir, 10))
+            # "a" is still held by the other instance, "b" was released.
+            self.assertTrue(os.path.exists(os.path.join(cache_dir, "a.LAZ")))
+            self.assertFalse(os.path.exists(os.path.join(cache_dir, "b.LAZ")))
+            other.close()
+            cache.close()
+
+
+class TestFetcherCache(unittest.TestCase):
+    def fetcher(
+        self, base_url: str, cache: TileCache, revalidate: bool = False
+    ) -> Fetcher:
+        with mock.patch(
+            "ahn_cli.fetcher.request.ahn_subunit_indicies_of_bbox",
+            return_value=["37EN1_15", "37EN1_20"],
+        ):
+            return Fetcher(base_url, "", [0, 0, 1, 1], cache, revalidate)
+
+    def cache(self, directory: str) -> TileCache:
+        cache = TileCache(directory)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_repeat_fetch_without_network(self) -> None:
+        tiles = {"37EN1_15": b"tile15", "37EN1_20": b"tile20"}
+        with tempfile.TemporaryDirectory() as tmpdir, TileServer(
+            tiles
+        ) as server:
+            cache = self.cache(tmpdir)
+            results = self.fetcher(server.base_url, cache).fetch()
+            self.assertEqual(len(server.requests), 2)
+            for url, path in results.items():
+                self.assertTrue(cache.owns(path))
+                with open(path, "rb") as f:
+                    self.assertEqual(f.read(), tiles[url[-12:-4]])
+
+            results = self.fetcher(
+                server.base_url, self.cache(tmpdir)
+            ).fetch()
+            self.assertEqual(len(server.requests), 2)
+            self.assertEqual(len(results), 2)
+
+    def test_revalidate(self) -> None:
+        tiles = {"37EN1_15": b"tile15", "37EN1_20": b"tile20"}
+        with tempfile.TemporaryDirectory() as tmpdir, TileServer(
+            tiles
+        ) as server:
+            self.fetcher(server.base_url, self.cache(tmpdir)).fetch()
+            tiles["37EN1_20"] = b"tile20-updated"
+            results = self.fetcher(
+                server.base_url, self.cache(tmpdir), revalidate=True
+            ).fetch()
+            self.assertEqual(len(server.requests), 4)
+            for _, headers in server.requests[2:]:
+                self.assertIn("If-None-Match", headers)
+            with open(results[server.base_url + "37EN1_20.LAZ"], "rb") as f:
+                self.assertEqual(f.read(), b"tile20-updated")
+
+    def test_failed_revalidation_releases_tiles(self) -> None:
+        tiles = {"37EN1_15": b"tile15", "37EN1_20": b"tile20"}
+        with tempfile.TemporaryDirectory() as tmpdir, TileServer(
+            tiles
+        ) as server:
+            first = self.cache(tmpdir)
+            self.fetcher(server.base_url, first).fetch()
+            first.close()
+            del tiles["37EN1_20"]
+            with self.assertRaises(DownloadError):
+                self.fetcher(
+                    server.base_url, self.cache(tmpdir), revalidate=True
+                ).fetch()
+            # Another cache evicts every tile that is not handed out.
+            evicting = self.cache(tmpdir)
+            evicting.max_bytes = 0
+            evicting.put("37EN1_01", write_file(tmpdir, 10))
+            self.assertFalse(
+                os.path.exists(os.path.join(tmpdir, "37EN1_20.LAZ"))
+            )
+
+    def test_stopped_early_releases_tiles(self) -> None:
+        tiles = {"37EN1_15": b"tile15", "37EN1_20": b"tile20"}
+        with tempfile.TemporaryDirectory() as tmpdir, TileServer(
+            tiles
+        ) as server:
+            fetched = self.fetcher(server.base_url, self.cache(tmpdir))
+            results = fetched.iter_fetch()
+            _, path = next(results)
+            results.close()
+            evicting = self.cache(tmpdir)
+            evicting.max_bytes = 0
+            evicting.put("37EN1_01", write_file(tmpdir, 10))
+            # Only the yielded tile is still held.
+            self.assertEqual(
+                sorted(f for f in os.listdir(tmpdir) if f.endswith(".LAZ")),
+                sorted(["37EN1_01.LAZ", os.path.basename(path)]),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from ahn_cli.fetcher import catalog
+
+
+class TestCatalog(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        patcher = mock.patch.dict(
+            os.environ, {"XDG_CACHE_HOME": self.tmpdir.name}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmpdir.cleanup)
+        catalog._read_geodataframe.cache_clear()
+        self.addCleanup(catalog._read_geodataframe.cache_clear)
+
+    def test_read_once_per_process(self) -> None:
+        with mock.patch.object(
+            catalog.gpd, "read_file", wraps=catalog.gpd.read_file
+        ) as read_file:
+            first = catalog.municipalities()
+            second = catalog.read_geodataframe(
+                "./ahn_cli/fetcher/data/municipality_simple.geojson"
+            )
+            self.assertIs(first, second)
+            self.assertEqual(read_file.call_count, 1)
+
+    def test_cached_catalog(self) -> None:
+        expected = catalog.municipalities()
+        cached = os.listdir(
+            os.path.join(self.tmpdir.name, "ahn_cli", "catalog")
+        )
+        self.assertEqual(len(cached), 1)
+        self.assertTrue(cached[0].endswith(".parquet"))
+
+        catalog._read_geodataframe.cache_clear()
+        with mock.patch.object(catalog.gpd, "read_file") as read_file:
+            loaded = catalog.municipalities()
+            read_file.assert_not_called()
+        self.assertTrue(loaded.geometry.equals(expected.geometry))
+        self.assertListEqual(
+            loaded["name"].tolist(), expected["name"].tolist()
+        )
+        self.assertEqual(loaded.crs, expected.crs)
+
+    def test_without_pyarrow(self) -> None:
+        with mock.patch.object(
+            catalog.importlib.util, "find_spec", return_value=None
+        ):
+            catalog.municipalities()
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from unittest import mock
+
+from ahn_cli.fetcher.concurrency import AdaptiveConcurrency
+
+
+class TestAdaptiveConcurrency(unittest.TestCase):
+    def setUp(self) -> None:
+        patcher = mock.patch("ahn_cli.fetcher.concurrency.time.monotonic")
+        self.clock = patcher.start()
+        self.clock.return_value = 0.0
+        self.addCleanup(patcher.stop)
+
+    def measure(self, controller: AdaptiveConcurrency, rate: float) -> None:
+        """Records one interval of the given throughput in bytes/s."""
+        self.clock.return_value += controller.interval
+        controller.record(int(rate * controller.interval))
+
+    def test_initial_limit(self) -> None:
+        self.assertEqual(AdaptiveConcurrency(8).limit(), 2)
+        self.assertEqual(AdaptiveConcurrency(1).limit(), 1)
+        with self.assertRaises(ValueError):
+            AdaptiveConcurrency(0)
+
+    def test_no_change_within_interval(self) -> None:
+        controller = AdaptiveConcurrency(8)
+        self.clock.return_value = 1.0
+        controller.record(10**9)
+        self.assertEqual(controller.limit(), 2)
+
+    def test_increases_while_throughput_improves(self) -> None:
+        controller = AdaptiveConcurrency(8)
+        for i, rate in enumerate([100, 200, 300, 400]):
+            self.measure(controller, rate)
+            self.assertEqual(controller.limit(), 3 + i)
+
+    def test_reverses_when_throughput_stalls(self) -> None:
+        controller = AdaptiveConcurrency(8)
+        self.measure(controller, 100)
+        self.measure(controller, 200)
+        self.assertEqual(controller.limit(), 4)
+        self.measure(controller, 200)
+        self.assertEqual(controller.limit(), 3)
+        self.measure(controller, 150)
+        self.assertEqual(controller.limit(), 4)
+
+    def test_bounds(self) -> None:
+        controller = AdaptiveConcurrency(3)
+        for rate in [100, 200, 400, 800]:
+            self.measure(controller, rate)
+        self.assertEqual(controller.limit(), 3)
+        for _ in range(5):
+            controller.record_retry()
+        self.assertEqual(controller.limit(), 1)
+
+    def test_retry_halves_limit(self) -> None:
+        controller = AdaptiveConcurrency(16, initial=8)
+        controller.record_retry()
+        self.assertEqual(controller.limit(), 4)
+        # The next interval is not compared with the one before the retry.
+        self.measure(controller, 1)
+        self.assertEqual(controller.limit(), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
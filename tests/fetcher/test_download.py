@@ -0,0 +1,140 @@
+import os
+import tempfile
+import unittest
+
+from tile_server import TileServer
+
+from ahn_cli.fetcher.download import (
+    Download,
+    DownloadError,
+    RetryableError,
+    Transfer,
+    download,
+    read_response,
+)
+
+TILE = bytes(range(256)) * 4096
+
+
+class TestDownload(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, "37EN1_15.LAZ")
+
+    def read(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def test_download(self) -> None:
+        with TileServer({"37EN1_15": TILE}) as server:
+            result = download(server.base_url + "37EN1_15.LAZ", self.path)
+        self.assertEqual(result.size, len(TILE))
+        self.assertIsNotNone(result.etag)
+        self.assertEqual(self.read(), TILE)
+
+    def test_progress(self) -> None:
+        chunks: list[int] = []
+        with TileServer({"37EN1_15": TILE}) as server:
+            download(
+                server.base_url + "37EN1_15.LAZ",
+                self.path,
+                chunk_size=64 * 1024,
+                on_progress=chunks.append,
+            )
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(sum(chunks), len(TILE))
+
+    def test_resume_after_dropped_connection(self) -> None:
+        with TileServer({"37EN1_15": TILE}) as server:
+            server.faults += ["drop", "error", "drop"]
+            download(
+                server.base_url + "37EN1_15.LAZ",
+                self.path,
+                backoff=0.01,
+                chunk_size=64 * 1024,
+            )
+            ranges = [headers.get("Range") for _, headers in server.requests]
+        self.assertEqual(self.read(), TILE)
+        self.assertEqual(len(ranges), 4)
+        self.assertIsNone(ranges[0])
+        self.assertEqual(ranges[1], f"bytes={len(TILE) // 2}-")
+        # Only the missing bytes are requested again.
+        self.assertEqual(ranges[3], f"bytes={len(TILE) * 3 // 4}-")
+
+    def test_resume_complete_file(self) -> None:
+        with open(self.path, "wb") as f:
+            f.write(TILE)
+        with TileServer({"37EN1_15": TILE}) as server:
+            result = download(server.base_url + "37EN1_15.LAZ", self.path)
+        self.assertEqual(result.size, len(TILE))
+        self.assertEqual(self.read(), TILE)
+
+    def test_not_found(self) -> None:
+        with TileServer({}) as server:
+            with self.assertRaises(DownloadError):
+                download(server.base_url + "37EN1_15.LAZ", self.path)
+            self.assertEqual(len(server.requests), 1)
+
+    def test_give_up(self) -> None:
+        with TileServer({"37EN1_15": TILE}) as server:
+            server.faults += ["error"] * 3
+            with self.assertRaises(DownloadError):
+                download(
+                    server.base_url + "37EN1_15.LAZ",
+                    self.path,
+                    retries=2,
+                    backoff=0.01,
+                )
+            self.assertEqual(len(server.requests), 3)
+
+
+class TestReadResponse(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, "37EN1_15.LAZ")
+        with open(self.path, "wb") as f:
+            f.write(b"x" * 10)
+
+    def read_response(
+        self, status: int, headers: dict[str, str], offset: int = 10
+    ) -> Download | Transfer:
+        return read_response("url", self.path, status, headers, offset, "a")
+
+    def test_body(self) -> None:
+        self.assertEqual(
+            self.read_response(200, {"Content-Length": "20"}, offset=0),
+            Transfer("wb", 20, "a"),
+        )
+        self.assertEqual(
+            self.read_response(
+                206, {"Content-Range": "bytes 10-19/20", "ETag": "b"}
+            ),
+            Transfer("ab", 20, "b"),
+        )
+
+    def test_without_body(self) -> None:
+        result = self.read_response(304, {"ETag": "b"})
+        self.assertIsInstance(result, Download)
+        assert isinstance(result, Download)
+        self.assertTrue(result.not_modified)
+        result = self.read_response(416, {"Content-Range": "bytes */10"})
+        self.assertEqual(
+            result, Download("url", self.path, size=10, etag="a")
+        )
+
+    def test_errors(self) -> None:
+        with self.assertRaises(RetryableError):
+            self.read_response(503, {})
+        with self.assertRaises(DownloadError) as raised:
+            self.read_response(404, {})
+        self.assertNotIsInstance(raised.exception, RetryableError)
+        # A range that does not continue the file restarts the download.
+        with self.assertRaises(RetryableError):
+            self.read_response(206, {"Content-Range": "bytes 5-19/20"})
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,17 @@
+import os
+import tempfile
 import unittest
+from unittest import mock
+
+import geopandas as gpd
+from shapely.geometry import box
+
+from ahn_cli.fetcher import catalog
 from ahn_cli.fetcher.geotiles import (
     ahn_subunit_indicies_of_city,
     ahn_subunit_indicies_of_bbox,
 )
+from ahn_cli.fetcher.municipality import city_polygon
 
 
 class TestGeoTile(unittest.TestCase):
@@ -69,5 +78,69 @@ class TestGeoTile(unittest.TestCase):
         self.assertListEqual(tiles, expected)
 
 
+class TestTileSelection(unittest.TestCase):
+    """Tile selection against a synthetic 1 km tile grid around Delft."""
+
+    def setUp(self) -> None:
+        city = city_polygon("Delft").to_crs("EPSG:28992").total_bounds
+        minx, miny = city[0] // 1000 * 1000 - 1000, city[1] // 1000 * 1000
+        tiles, names = [], []
+        for i in range(int((city[2] - minx) // 1000) + 2):
+            for j in range(int((city[3] - miny) // 1000) + 1):
+                x, y = minx + i * 1000, miny + j * 1000
+                tiles.append(box(x, y, x + 1000, y + 1000))
+                names.append(f"T{i:02d}_{j:02d}")
+        # A duplicated tile index, as produced by split subunits.
+        tiles.append(tiles[len(tiles) // 2])
+        names.append(names[len(names) // 2])
+        self.names = names
+        gdf = gpd.GeoDataFrame(
+            {"AHN_subuni": names}, geometry=tiles, crs="EPSG:28992"
+        ).to_crs("EPSG:4326")
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, "tiles.geojson")
+        gdf.to_file(path)
+        for patcher in [
+            mock.patch.object(catalog, "AHN_TILE_FILE", path),
+            mock.patch.dict(os.environ, {"XDG_CACHE_HOME": self.tmpdir.name}),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        catalog.ahn_tile_tree.cache_clear()
+        self.addCleanup(catalog.ahn_tile_tree.cache_clear)
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_city(self) -> None:
+        tiles = ahn_subunit_indicies_of_city("Delft")
+        self.assertEqual(len(tiles), len(set(tiles)))
+        # The first column of the grid lies west of the city.
+        self.assertFalse(any(t.startswith("T00_") for t in tiles))
+        self.assertLess(len(tiles), len(set(self.names)))
+
+        city = city_polygon("Delft").to_crs("EPSG:28992").geometry.iloc[0]
+        expected = [
+            name
+            for name, tile in zip(
+                self.names, catalog.ahn_tiles().to_crs("EPSG:28992").geometry
+            )
+            if tile.intersection(city).area > 1
+        ]
+        self.assertListEqual(tiles, list(dict.fromkeys(expected)))
+
+    def test_min_overlap_area(self) -> None:
+        tiles = ahn_subunit_indicies_of_city("Delft")
+        large = ahn_subunit_indicies_of_city("Delft", 500_000)
+        self.assertLess(len(large), len(tiles))
+        self.assertTrue(set(large) < set(tiles))
+
+    def test_bbox(self) -> None:
+        tiles = ahn_subunit_indicies_of_city("Delft")
+        bounds = city_polygon("Delft").to_crs("EPSG:28992").total_bounds
+        self.assertTrue(
+            set(tiles) <= set(ahn_subunit_indicies_of_bbox(list(bounds)))
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
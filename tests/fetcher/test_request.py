@@ -0,0 +1,94 @@
+import os
+import unittest
+from typing import Any
+from unittest import mock
+
+from tile_server import TileServer
+
+from ahn_cli.fetcher.download import DownloadError
+from ahn_cli.fetcher.request import Fetcher
+
+TILES = {f"37EN1_{i:02d}": f"tile{i}".encode() for i in range(1, 6)}
+
+
+class TestFetcher(unittest.TestCase):
+    def fetcher(self, base_url: str, **kwargs: Any) -> Fetcher:
+        with mock.patch(
+            "ahn_cli.fetcher.request.ahn_subunit_indicies_of_bbox",
+            return_value=list(TILES),
+        ):
+            return Fetcher(base_url, "", [0, 0, 1, 1], **kwargs)
+
+    def test_fetch(self) -> None:
+        with TileServer(TILES) as server:
+            results = self.fetcher(server.base_url).fetch()
+            self.assertEqual(len(results), len(TILES))
+            for url, path in results.items():
+                with open(path, "rb") as f:
+                    self.assertEqual(f.read(), TILES[url[-12:-4]])
+                os.remove(path)
+
+    def test_iter_fetch_window(self) -> None:
+        with TileServer(TILES) as server:
+            tiles = self.fetcher(server.base_url).iter_fetch(max_in_flight=2)
+            fetched = []
+            for url, path in tiles:
+                # Downloads only advance when the consumer takes a tile.
+                self.assertLessEqual(len(server.requests), len(fetched) + 2)
+                fetched.append(url)
+                os.remove(path)
+            self.assertCountEqual(
+                fetched, [server.base_url + f"{t}.LAZ" for t in TILES]
+            )
+
+    def test_iter_fetch_stopped_early(self) -> None:
+        created = []
+        temp_file = Fetcher._temp_file
+
+        def record(fetcher: Fetcher) -> str:
+            created.append(temp_file(fetcher))
+            return created[-1]
+
+        with TileServer(TILES) as server, mock.patch.object(
+            Fetcher, "_temp_file", autospec=True, side_effect=record
+        ):
+            tiles = self.fetcher(server.base_url).iter_fetch()
+            _, path = next(tiles)
+            tiles.close()
+            # Only the yielded tile is left, the others were never handed out.
+            self.assertEqual(
+                [p for p in created if os.path.exists(p)], [path]
+            )
+            os.remove(path)
+
+    def test_fetch_reuses_connections(self) -> None:
+        with TileServer(TILES) as server:
+            results = self.fetcher(server.base_url, max_workers=1).fetch()
+            for path in results.values():
+                os.remove(path)
+            self.assertEqual(len(server.requests), len(TILES))
+            self.assertEqual(len(server.connections), 1)
+
+    def test_adaptive_fetch(self) -> None:
+        with TileServer(TILES) as server:
+            fetcher = self.fetcher(
+                server.base_url, max_workers=4, adaptive=True
+            )
+            results = fetcher.fetch()
+            for path in results.values():
+                os.remove(path)
+            self.assertEqual(len(results), len(TILES))
+            self.assertIsNotNone(fetcher.concurrency)
+            # The controller starts with two downloads.
+            self.assertLessEqual(len(server.connections), 2)
+
+    def test_fetch_reports_errors(self) -> None:
+        tiles = dict(TILES)
+        del tiles["37EN1_03"]
+        with TileServer(tiles) as server:
+            with self.assertRaises(DownloadError):
+                self.fetcher(server.base_url).fetch()
+
+
+if __name__ == "__main__":
+    unittest.main()
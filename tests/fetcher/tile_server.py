@@ -0,0 +1,97 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class TileServer:
+    """
+    A local stand-in for the GeoTiles server used by the fetcher tests.
+
+    Tiles are served from memory under "/AHN4_T/<tile_index>.LAZ" with an
+    ETag and support for Range requests, and every request is recorded in
+    `requests`, and the client port of every connection in `connections`.
+    Faults are injected by appending to `faults`, which are
+    consumed one per request: "drop" sends half of the body and closes the
+    connection, "error" answers with 503.
+    """
+
+    def __init__(self, tiles: dict[str, bytes]):
+        self.tiles = tiles
+        self.requests: list[tuple[str, dict[str, str]]] = []
+        self.faults: list[str] = []
+        self.connections: set[int] = set()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                server.requests.append((self.path, dict(self.headers)))
+                server.connections.add(self.client_address[1])
+                fault = server.faults.pop(0) if server.faults else None
+                tile_index = self.path.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+                body = server.tiles.get(tile_index)
+                if body is None:
+                    self.send_error(404)
+                    return
+                if fault == "error":
+                    self.send_error(503)
+                    return
+                etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+
+                start = 0
+                range_header = self.headers.get("Range")
+                if_range = self.headers.get("If-Range")
+                if range_header and (if_range is None or if_range == etag):
+                    start = int(range_header[len("bytes=") :].split("-")[0])
+                if start >= len(body) and start > 0:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{len(body)}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if start > 0:
+                    self.send_response(206)
+                    self.send_header(
+                        "Content-Range",
+                        f"bytes {start}-{len(body) - 1}/{len(body)}",
+                    )
+                else:
+                    self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body) - start))
+                self.end_headers()
+                if fault == "drop":
+                    self.wfile.write(
+                        body[start : start + (len(body) - start) // 2]
+                    )
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(body[start:])
+
+            def log_message(self, *args: object) -> None:
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, daemon=True
+        )
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/AHN4_T/"
+
+    def __enter__(self) -> "TileServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,202 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from shapely.geometry import MultiPolygon, Polygon
+
+from ahn_cli.manipulator import rasterizer
+from ahn_cli.manipulator.clipper import (
+    FeatureClipper,
+    PolygonClipper,
+    adaptive_resolution,
+    file_clip_feature_names,
+    file_clip_features,
+    file_clip_polygon,
+)
+
+
+class TestPolygonClipper(unittest.TestCase):
+    def setUp(self) -> None:
+        # An L-shaped polygon with a hole, plus an island.
+        shell = [(0, 0), (1000, 0), (1000, 400), (400, 400), (400, 1000),
+                 (0, 1000), (0, 0)]  # fmt: skip
+        hole = [(100, 100), (300, 100), (300, 300), (100, 300), (100, 100)]
+        island = Polygon([(1200, 1200), (1500, 1200), (1350, 1500)])
+        self.polygon = MultiPolygon([Polygon(shell, [hole]), island])
+        rng = np.random.default_rng(42)
+        self.x = rng.uniform(-100, 1600, 200_000)
+        self.y = rng.uniform(-100, 1600, 200_000)
+
+    def test_contains_is_exact(self) -> None:
+        expected = shapely.intersects_xy(self.polygon, self.x, self.y)
+        for resolution in [None, 7.3, 50.0, 5000.0]:
+            clipper = PolygonClipper(self.polygon, resolution)
+            mask = clipper.contains(self.x, self.y)
+            np.testing.assert_array_equal(mask, expected)
+
+    def test_points_on_boundary(self) -> None:
+        clipper = PolygonClipper(self.polygon, 10.0)
+        x = np.array([0.0, 1000.0, 1000.0, 200.0, 1500.0])
+        y = np.array([0.0, 400.0, 401.0, 200.0, 1200.0])
+        np.testing.assert_array_equal(
+            clipper.contains(x, y), [True, True, False, False, True]
+        )
+
+    def test_cell_classes(self) -> None:
+        clipper = PolygonClipper(self.polygon, 10.0)
+        classes = np.unique(clipper.raster)
+        self.assertListEqual(
+            classes.tolist(),
+            [rasterizer.OUTSIDE, rasterizer.INSIDE, rasterizer.BOUNDARY],
+        )
+        # Only a small fraction of the cells needs the exact test.
+        boundary = np.mean(clipper.raster == rasterizer.BOUNDARY)
+        self.assertLess(boundary, 0.2)
+
+    def test_classify_box(self) -> None:
+        clipper = PolygonClipper(self.polygon, 10.0)
+        self.assertEqual(
+            clipper.classify_box(500, 10, 900, 300), rasterizer.INSIDE
+        )
+        # Inside the hole.
+        self.assertEqual(
+            clipper.classify_box(150, 150, 250, 250), rasterizer.OUTSIDE
+        )
+        self.assertEqual(
+            clipper.classify_box(500, 500, 900, 900), rasterizer.OUTSIDE
+        )
+        self.assertEqual(
+            clipper.classify_box(900, 300, 1100, 500), rasterizer.BOUNDARY
+        )
+        self.assertEqual(
+            clipper.classify_box(50, 50, 350, 350), rasterizer.BOUNDARY
+        )
+
+    def test_cached(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            built = PolygonClipper.cached(self.polygon, 10.0, tmpdir)
+            self.assertEqual(len(os.listdir(tmpdir)), 1)
+            loaded = PolygonClipper.cached(self.polygon, 10.0, tmpdir)
+            np.testing.assert_array_equal(loaded.raster, built.raster)
+            self.assertEqual(loaded.transform, built.transform)
+            np.testing.assert_array_equal(
+                loaded.contains(self.x, self.y),
+                built.contains(self.x, self.y),
+            )
+            PolygonClipper.cached(self.polygon, 20.0, tmpdir)
+            self.assertEqual(len(os.listdir(tmpdir)), 2)
+
+    def test_adaptive_resolution(self) -> None:
+        self.assertEqual(adaptive_resolution(self.polygon), 1.0)
+        resolution = adaptive_resolution(self.polygon, max_cells=10_000)
+        self.assertAlmostEqual(resolution, 15.0)
+
+
+class TestFeatureClipper(unittest.TestCase):
+    def setUp(self) -> None:
+        # A grid of 30 x 30 parcels with gaps, an overlapping parcel and a
+        # MultiPolygon with a hole and an island.
+        self.features: list[Polygon | MultiPolygon] = [
+            shapely.box(i * 50, j * 50, i * 50 + 40, j * 50 + 40)
+            for i in range(30)
+            for j in range(30)
+        ]
+        self.features.append(shapely.box(20, 20, 130, 130))
+        shell = [(1600, 0), (1900, 0), (1900, 300), (1600, 300), (1600, 0)]
+        hole = [(1700, 100), (1800, 100), (1800, 200), (1700, 200),
+                (1700, 100)]  # fmt: skip
+        island = Polygon([(1600, 400), (1900, 400), (1750, 600)])
+        self.features.append(MultiPolygon([Polygon(shell, [hole]), island]))
+        rng = np.random.default_rng(7)
+        self.x = rng.uniform(-50, 2000, 300_000)
+        self.y = rng.uniform(-50, 1600, 300_000)
+
+    def expected_labels(self) -> np.ndarray:
+        expected = np.full(len(self.x), rasterizer.NO_FEATURE)
+        # In reverse, so that the lowest index of overlapping features wins.
+        for i in reversed(range(len(self.features))):
+            inside = shapely.intersects_xy(self.features[i], self.x, self.y)
+            expected[inside] = i
+        return expected
+
+    def test_labels_are_exact(self) -> None:
+        expected = self.expected_labels()
+        for resolution in [None, 7.3, 100.0]:
+            clipper = FeatureClipper(self.features, resolution)
+            labels = clipper.labels(self.x, self.y)
+            np.testing.assert_array_equal(labels, expected)
+            np.testing.assert_array_equal(
+                clipper.contains(self.x, self.y),
+                expected != rasterizer.NO_FEATURE,
+            )
+
+    def test_points_on_boundary(self) -> None:
+        clipper = FeatureClipper(self.features, 10.0)
+        x = np.array([0.0, 40.0, 45.0, 130.0, 1750.0, 1750.0])
+        y = np.array([0.0, 40.0, 45.0, 45.0, 150.0, 600.0])
+        np.testing.assert_array_equal(
+            clipper.labels(x, y), [0, 0, 900, 900, -1, 901]
+        )
+
+    def test_classify_box(self) -> None:
+        clipper = FeatureClipper(self.features, 10.0)
+        self.assertEqual(
+            clipper.classify_box(55, 5, 85, 35), rasterizer.INSIDE
+        )
+        self.assertEqual(
+            clipper.classify_box(1705, 105, 1795, 195), rasterizer.OUTSIDE
+        )
+        self.assertEqual(
+            clipper.classify_box(1605, 5, 1895, 95), rasterizer.INSIDE
+        )
+        self.assertEqual(
+            clipper.classify_box(1490, 10, 1700, 50), rasterizer.BOUNDARY
+        )
+
+    def test_cached_and_pickled(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            built = FeatureClipper.cached(self.features, 10.0, tmpdir)
+            self.assertEqual(len(os.listdir(tmpdir)), 1)
+            loaded = FeatureClipper.cached(self.features, 10.0, tmpdir)
+            np.testing.assert_array_equal(loaded.raster, built.raster)
+            unpickled = pickle.loads(pickle.dumps(loaded))
+            np.testing.assert_array_equal(
+                unpickled.labels(self.x, self.y),
+                built.labels(self.x, self.y),
+            )
+
+    def test_file_clip_features(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "parcels.geojson")
+            gpd.GeoDataFrame(
+                {"name": ["a", "b", "line"]},
+                geometry=[
+                    self.features[0],
+                    self.features[-1],
+                    shapely.LineString([(0, 0), (10, 10)]),
+                ],
+                crs="EPSG:28992",
+            ).to_file(path)
+            features = file_clip_features(path)
+            self.assertEqual(len(features), 2)
+            self.assertEqual(features[1].geom_type, "MultiPolygon")
+            self.assertAlmostEqual(
+                file_clip_polygon(path).area,
+                self.features[0].area + self.features[-1].area,
+            )
+            self.assertEqual(
+                file_clip_feature_names(path), ["feature_0", "feature_1"]
+            )
+            self.assertEqual(
+                file_clip_feature_names(path, "name"), ["a", "b"]
+            )
+            with self.assertRaises(ValueError):
+                file_clip_feature_names(path, "missing")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+
+import numpy as np
+
+from ahn_cli.manipulator.decimation import (
+    poisson_disk_indices,
+    voxel_grid_indices,
+)
+
+
+class TestDecimation(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = np.random.default_rng(7)
+        self.xyz = np.stack(
+            [
+                rng.uniform(193000, 193100, 5_000),
+                rng.uniform(441000, 441100, 5_000),
+                rng.uniform(0, 10, 5_000),
+            ],
+            axis=1,
+        )
+
+    def test_voxel_grid_keeps_one_point_per_voxel(self) -> None:
+        indices = voxel_grid_indices(self.xyz, 5.0)
+        cells = np.floor(self.xyz / 5.0)
+        self.assertEqual(len(indices), len(np.unique(cells, axis=0)))
+        np.testing.assert_array_equal(indices, np.sort(indices))
+        # The kept point of every voxel is the one closest to its centre.
+        distances = np.sum((self.xyz / 5.0 - cells - 0.5) ** 2, axis=1)
+        for i in indices[:50]:
+            same_cell = (cells == cells[i]).all(axis=1)
+            self.assertEqual(distances[i], distances[same_cell].min())
+
+    def test_voxel_grid_is_aligned_across_tiles(self) -> None:
+        left = self.xyz[:, 0] < 193050
+        whole = voxel_grid_indices(self.xyz, 5.0)
+        parts = np.concatenate(
+            [
+                np.flatnonzero(left)[voxel_grid_indices(self.xyz[left], 5.0)],
+                np.flatnonzero(~left)[
+                    voxel_grid_indices(self.xyz[~left], 5.0)
+                ],
+            ]
+        )
+        np.testing.assert_array_equal(np.sort(parts), whole)
+
+    def test_poisson_disk_keeps_minimum_distance(self) -> None:
+        radius = 3.0
+        indices = poisson_disk_indices(self.xyz, radius)
+        sample = self.xyz[indices]
+        distances = np.sqrt(
+            np.sum((sample[:, np.newaxis] - sample[np.newaxis]) ** 2, axis=2)
+        )
+        np.fill_diagonal(distances, np.inf)
+        self.assertGreaterEqual(distances.min(), radius)
+        # Every point has a sample nearby, so the sample covers the points.
+        nearest = np.sqrt(
+            np.sum(
+                (self.xyz[:, np.newaxis] - sample[np.newaxis]) ** 2, axis=2
+            )
+        ).min(axis=1)
+        self.assertLess(nearest.max(), 2 * radius)
+
+    def test_empty(self) -> None:
+        empty = np.zeros((0, 3))
+        self.assertEqual(len(voxel_grid_indices(empty, 1.0)), 0)
+        self.assertEqual(len(poisson_disk_indices(empty, 1.0)), 0)
+
+    def test_too_small_cells(self) -> None:
+        with self.assertRaises(ValueError):
+            voxel_grid_indices(self.xyz * 1e6, 1e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
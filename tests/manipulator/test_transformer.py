@@ -1,6 +1,12 @@
 import unittest
-from shapely.geometry import Polygon
-from ahn_cli.manipulator.transformer import tranform_polygon
+
+import laspy
+import numpy as np
+import pyproj
+from shapely.geometry import MultiPolygon, Polygon
+
+from ahn_cli.benchmark import synthetic_points
+from ahn_cli.manipulator.transformer import PointReprojector, tranform_polygon
 
 
 class TestTransformer(unittest.TestCase):
@@ -43,6 +49,64 @@ class TestTransformer(unittest.TestCase):
                 delta=1,
             )
 
+    def test_tranform_multipolygon(self) -> None:
+        source = MultiPolygon(
+            [
+                Polygon([(4.35, 52.0), (4.36, 52.0), (4.36, 52.01)]),
+                Polygon([(4.38, 52.0), (4.39, 52.0), (4.39, 52.01)]),
+            ]
+        )
+        result = tranform_polygon(source, "4326", "28992")
+
+        self.assertIsNotNone(result)
+        assert result is not None
+        self.assertEqual(result.geom_type, "MultiPolygon")
+        for part, source_part in zip(result.geoms, source.geoms):
+            expected = tranform_polygon(source_part, "4326", "28992")
+            assert expected is not None
+            self.assertTrue(part.equals_exact(expected, 1e-6))
+
+
+class TestPointReprojector(unittest.TestCase):
+    def tile(self, origin: tuple[float, float], seed: int) -> laspy.LasData:
+        las = synthetic_points(origin, 1_000, seed=seed)
+        las.header.add_crs(pyproj.CRS("EPSG:28992"))
+        las.update_header()
+        return las
+
+    def test_reproject(self) -> None:
+        for crs, tolerance in [("EPSG:25831", 1e-3), ("EPSG:4326", 1e-7)]:
+            reprojector = PointReprojector(crs)
+            expected = pyproj.Transformer.from_crs(
+                "EPSG:28992", crs, always_xy=True
+            )
+            for origin, seed in [((85000, 446000), 0), ((86000, 446000), 1)]:
+                las = self.tile(origin, seed)
+                x, y = expected.transform(las.x, las.y)
+                z = np.array(las.z)
+                points, header = reprojector.reproject(las.points, las.header)
+                np.testing.assert_allclose(
+                    points.x, x, rtol=0, atol=tolerance
+                )
+                np.testing.assert_allclose(
+                    points.y, y, rtol=0, atol=tolerance
+                )
+                np.testing.assert_allclose(points.z, z, rtol=0, atol=1e-3)
+                np.testing.assert_array_equal(points.scales, header.scales)
+                np.testing.assert_array_equal(points.offsets, header.offsets)
+                self.assertEqual(header.parse_crs(), pyproj.CRS(crs))
+                self.assertTrue(
+                    (
+                        header.mins[:2] <= [points.x.min(), points.y.min()]
+                    ).all()
+                )
+        self.assertAlmostEqual(PointReprojector("EPSG:4326").scales[0], 1e-7)
+
+    def test_three_dimensional_crs(self) -> None:
+        reprojector = PointReprojector("EPSG:25831+5709")
+        self.assertTrue(reprojector.transform_z)
+        self.assertFalse(PointReprojector("EPSG:25831").transform_z)
+
 
 if __name__ == "__main__":
     unittest.main()
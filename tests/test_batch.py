@@ -0,0 +1,80 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from ahn_cli.batch import Job, read_jobs
+
+
+class TestReadJobs(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "jobs.json")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmpdir)
+
+    def write_jobs(self, content: object) -> None:
+        with open(self.path, "w") as f:
+            json.dump(content, f)
+
+    def test_read_jobs(self) -> None:
+        self.write_jobs(
+            {
+                "jobs": [
+                    {
+                        "city": "delft",
+                        "output": "delft.laz",
+                        "include_classes": [6],
+                        "clip_file": "clip.geojson",
+                    },
+                    {
+                        "bbox": [84000, 446000, 85000, 447000],
+                        "output": "/data/area",
+                        "tile_size": 500,
+                    },
+                ]
+            }
+        )
+        jobs = read_jobs(self.path)
+        self.assertEqual(
+            jobs[0],
+            Job(
+                os.path.join(self.tmpdir, "delft.laz"),
+                city="delft",
+                include_classes=[6],
+                clip_file=os.path.join(self.tmpdir, "clip.geojson"),
+            ),
+        )
+        self.assertEqual(jobs[1].output, "/data/area")
+        self.assertEqual(jobs[1].bbox, [84000, 446000, 85000, 447000])
+        self.assertEqual(jobs[1].tile_size, 500)
+
+    def test_read_job_list(self) -> None:
+        self.write_jobs([{"city": "delft", "output": "delft.laz"}])
+        self.assertEqual(len(read_jobs(self.path)), 1)
+
+    def test_invalid_jobs(self) -> None:
+        for content in [
+            {"jobs": []},
+            {"city": "delft"},
+            [{"city": "delft"}],
+            [{"city": "delft", "output": "delft.laz", "colour": "red"}],
+            ["delft"],
+        ]:
+            self.write_jobs(content)
+            with self.assertRaises(ValueError):
+                read_jobs(self.path)
+
+    def test_malformed_file(self) -> None:
+        with open(self.path, "w") as f:
+            f.write("{")
+        with self.assertRaises(ValueError):
+            read_jobs(self.path)
+        with self.assertRaises(ValueError):
+            read_jobs(os.path.join(self.tmpdir, "missing.json"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import json
+import unittest
+
+from ahn_cli.benchmark import STAGES, parse_class_mix, run_benchmark
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_parse_class_mix(self) -> None:
+        self.assertEqual(parse_class_mix("2:3,6:1"), {2: 0.75, 6: 0.25})
+        with self.assertRaises(ValueError):
+            parse_class_mix("2:-1")
+
+    def test_run_benchmark(self) -> None:
+        results = run_benchmark(
+            n_tiles=2,
+            points_per_tile=5_000,
+            class_mix={2: 0.5, 6: 0.5},
+            repeat=1,
+        )
+        self.assertEqual(list(results["stages"]), STAGES)
+        for stage in results["stages"].values():
+            self.assertGreater(stage["seconds"], 0)
+            self.assertGreater(stage["points_per_s"], 0)
+            self.assertGreater(stage["peak_rss_mb"], 0)
+        self.assertEqual(results["stages"]["process"]["points"], 10_000)
+        # The clip raster is measured by the points it classifies.
+        self.assertEqual(results["stages"]["rasterize"]["points"], 10_000)
+        self.assertGreater(results["stages"]["fetch"]["bytes"], 0)
+        # The results are tracked over releases as JSON.
+        json.dumps(results)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import json
+import os
+import shutil
+import tempfile
+import sys
+import unittest
+from unittest import mock
+
+from ahn_cli.metrics import Metrics, StageMetrics, peak_rss_mb
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.mkdtemp()
+        self.metrics = Metrics()
+        for _ in range(2):
+            with self.metrics.measure("filter.include", 100) as counters:
+                counters.points_out = 40
+        self.metrics.add("fetch", StageMetrics(1.5, 1, bytes=2048))
+        self.metrics.tile("37EN1_15", 2.0, 200, 80, 2048, 300.0)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmpdir)
+
+    def test_measure(self) -> None:
+        include = self.metrics.stages["filter.include"]
+        self.assertEqual(include.calls, 2)
+        self.assertEqual(include.points_in, 200)
+        self.assertEqual(include.points_out, 80)
+        self.assertGreaterEqual(include.seconds, 0)
+
+    def test_merge(self) -> None:
+        worker = Metrics()
+        worker.add("fetch", StageMetrics(0.5, 1, bytes=1024))
+        worker.tile("37EN1_16", 1.0, 100, 10, 1024, 200.0)
+        self.metrics.merge(worker)
+        self.assertEqual(self.metrics.stages["fetch"].seconds, 2.0)
+        self.assertEqual(self.metrics.stages["fetch"].bytes, 3072)
+        self.assertEqual(len(self.metrics.tiles), 2)
+
+    def test_write_json(self) -> None:
+        path = os.path.join(self.tmpdir, "metrics.json")
+        self.metrics.write(path)
+        with open(path) as f:
+            metrics = json.load(f)
+        self.assertEqual(metrics["stages"]["fetch"]["bytes"], 2048)
+        self.assertEqual(metrics["tiles"][0]["name"], "37EN1_15")
+
+    def test_write_prometheus(self) -> None:
+        path = os.path.join(self.tmpdir, "metrics.prom")
+        self.metrics.write(path)
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertIn(
+            'ahn_cli_stage_calls_total{stage="filter.include"} 2', lines
+        )
+        self.assertIn("# TYPE ahn_cli_stage_seconds_total counter", lines)
+        self.assertIn("ahn_cli_tiles_total 1", lines)
+
+    def test_write_unknown_format(self) -> None:
+        with self.assertRaises(ValueError):
+            self.metrics.write(os.path.join(self.tmpdir, "metrics.txt"))
+
+    def test_summary(self) -> None:
+        summary = self.metrics.summary()
+        self.assertIn("filter.include", summary)
+        self.assertIn("37EN1_15", summary)
+
+    def test_peak_rss_without_resource_module(self) -> None:
+        self.assertGreater(peak_rss_mb(), 0)
+        with mock.patch.dict(sys.modules, {"resource": None}):
+            self.assertEqual(peak_rss_mb(), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
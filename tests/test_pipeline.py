@@ -3,6 +3,7 @@ import unittest
 import laspy
 import numpy as np
 
+from ahn_cli.benchmark import synthetic_points
 from ahn_cli.manipulator.ptc_handler import PntCHandler
 
 TEST_DATA0 = "./tests/testdata/westervoort0_thinned.las"
@@ -95,6 +96,26 @@ class TestPntCHandler(unittest.TestCase):
             points_after = len(p_handler.las.points)
             self.assertTrue(points_after < points_before)
 
+    def test_lazy_matches_eager(self) -> None:
+        def handler(lazy: bool) -> PntCHandler:
+            las = synthetic_points((193000.0, 441000.0), 10_000)
+            return PntCHandler(las, CITY_FILE_PATH, "Westervoort", lazy=lazy)
+
+        expected = handler(lazy=False)
+        lazy = handler(lazy=True)
+        n_points = len(lazy.las.points)
+        for p_handler in (expected, lazy):
+            p_handler.clip_by_bbox([193100.0, 441100.0, 193900.0, 441900.0])
+            p_handler.include([2, 6, 9])
+            p_handler.exclude([9])
+            p_handler.decimate(3, 1)
+        # The points are only copied by points() in lazy mode.
+        self.assertEqual(len(lazy.las.points), n_points)
+        self.assertEqual(lazy.count(), len(expected.las.points))
+        np.testing.assert_array_equal(
+            lazy.points().points.array, expected.points().points.array
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,410 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import geopandas as gpd
+import laspy
+import numpy as np
+import pyproj
+import shapely
+
+from ahn_cli.batch import Job
+from ahn_cli.benchmark import synthetic_points
+from ahn_cli.process import process, process_batch
+
+CITY_FILE_PATH = "./ahn_cli/fetcher/data/municipality_simple.geojson"
+WESTERVOORT28992_FILE_PATH = "./tests/testdata/westervoort28992.geojson"
+BASE_URL = "https://geotiles.citg.tudelft.nl/AHN4_T/"
+
+
+class TestProcess(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.mkdtemp()
+        self.tiles = []
+        for i, origin in enumerate(
+            [(193000.0, 441000.0), (194000.0, 441000.0)]
+        ):
+            path = os.path.join(self.tmpdir, f"tile{i}.LAZ")
+            synthetic_points(origin, 20_000, seed=i).write(path)
+            self.tiles.append(path)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmpdir)
+
+    def run_process(self, output: str, **kwargs: object) -> laspy.LasData:
+        self.run_fetched(output, **kwargs)
+        return laspy.read(os.path.join(self.tmpdir, output))
+
+    def run_fetched(self, output: str, **kwargs: object) -> None:
+        options: dict[str, object] = {
+            "include_classes": [2, 6],
+            "no_clip_city": True,
+            "decimate": 3,
+            "bbox": [193500.0, 441100.0, 194500.0, 441900.0],
+        }
+        options.update(kwargs)
+        # process() removes the fetched files, so hand out copies.
+        fetched = {}
+        for i, tile in enumerate(self.tiles):
+            copy = os.path.join(self.tmpdir, f"fetched{i}.LAZ")
+            shutil.copy(tile, copy)
+            fetched[BASE_URL + f"tile{i}.LAZ"] = copy
+        with mock.patch("ahn_cli.process.Fetcher") as fetcher:
+            fetcher.return_value.urls = list(fetched)
+            fetcher.return_value.iter_fetch.return_value = iter(
+                fetched.items()
+            )
+            process(
+                BASE_URL,
+                CITY_FILE_PATH,
+                os.path.join(self.tmpdir, output),
+                None,
+                **options,
+            )
+
+    def test_process(self) -> None:
+        las = self.run_process("out.laz")
+        self.assertGreater(len(las.points), 0)
+        self.assertTrue(np.isin(las.classification, [2, 6]).all())
+        self.assertTrue(
+            (las.x >= 193500.0).all() and (las.x <= 194500.0).all()
+        )
+        self.assertTrue((las.y >= 441100.0).all())
+        self.assertTrue((las.y <= 441900.0).all())
+
+    def test_no_surviving_points(self) -> None:
+        for output, options in [
+            ("empty.laz", {}),
+            ("empty_chunked.laz", {"chunk_size": 5_000}),
+            ("empty_parallel.laz", {"workers": 2}),
+            ("empty_reprojected.laz", {"output_crs": "EPSG:25831"}),
+        ]:
+            las = self.run_process(output, include_classes=[17], **options)
+            self.assertEqual(len(las.points), 0)
+            self.assertEqual(las.header.point_format.id, 6)
+
+    def test_chunked_matches_whole_tiles(self) -> None:
+        expected = self.run_process("whole.laz")
+        streamed = self.run_process("chunked.laz", chunk_size=5_000)
+        self.assertEqual(len(streamed.points), len(expected.points))
+        np.testing.assert_array_equal(streamed.x, expected.x)
+        np.testing.assert_array_equal(streamed.y, expected.y)
+        np.testing.assert_array_equal(
+            streamed.classification, expected.classification
+        )
+
+    def test_selective_decompression(self) -> None:
+        expected = self.run_process("whole.laz", chunk_size=5_000)
+        for workers in (None, 2):
+            selective = self.run_process(
+                "selective.laz",
+                chunk_size=5_000,
+                selective_decompression=True,
+                workers=workers,
+            )
+            self.assertEqual(len(selective.points), len(expected.points))
+            np.testing.assert_array_equal(
+                selective.points.array, expected.points.array
+            )
+
+    def test_chunked_voxels_match_whole_tiles(self) -> None:
+        expected = self.run_process(
+            "whole.laz", decimate=None, voxel_size=5.0
+        )
+        for options in (
+            {},
+            {"selective_decompression": True},
+            {"workers": 2},
+        ):
+            chunked = self.run_process(
+                "chunked.laz",
+                decimate=None,
+                voxel_size=5.0,
+                chunk_size=2_000,
+                **options,
+            )
+            np.testing.assert_array_equal(
+                chunked.points.array, expected.points.array
+            )
+        job = Job(
+            os.path.join(self.tmpdir, "batch.laz"),
+            bbox=[193500.0, 441100.0, 194500.0, 441900.0],
+            include_classes=[2, 6],
+            no_clip_city=True,
+            voxel_size=5.0,
+        )
+        urls = [BASE_URL + f"tile{i}.LAZ" for i in range(len(self.tiles))]
+        fetched = {}
+        for i, (url, tile) in enumerate(zip(urls, self.tiles)):
+            fetched[url] = os.path.join(self.tmpdir, f"fetched{i}.LAZ")
+            shutil.copy(tile, fetched[url])
+        with mock.patch(
+            "ahn_cli.process.tile_urls", return_value=urls
+        ), mock.patch("ahn_cli.process.Fetcher") as fetcher:
+            fetcher.return_value.iter_fetch.return_value = iter(
+                fetched.items()
+            )
+            process_batch(BASE_URL, CITY_FILE_PATH, [job], chunk_size=2_000)
+        np.testing.assert_array_equal(
+            laspy.read(job.output).points.array, expected.points.array
+        )
+
+    def test_spatial_decimation(self) -> None:
+        las = self.run_process("voxel.laz", decimate=None, voxel_size=20.0)
+        cells = np.floor(np.stack([las.x, las.y, las.z], axis=1) / 20.0)
+        self.assertEqual(len(np.unique(cells, axis=0)), len(las.points))
+        las = self.run_process(
+            "poisson.laz",
+            decimate=None,
+            poisson_radius=20.0,
+            selective_decompression=True,
+        )
+        self.assertGreater(len(las.points), 0)
+        for tile in (las.x < 194000, las.x >= 194000):
+            xyz = np.stack([las.x[tile], las.y[tile], las.z[tile]], axis=1)
+            distances = np.sqrt(
+                np.sum((xyz[:, np.newaxis] - xyz[np.newaxis]) ** 2, axis=2)
+            )
+            np.fill_diagonal(distances, np.inf)
+            self.assertGreaterEqual(distances.min(), 20.0 - 1e-3)
+
+    def test_profile_output(self) -> None:
+        for workers in (None, 2):
+            profile = os.path.join(self.tmpdir, "profile.json")
+            las = self.run_process(
+                "profiled.laz", workers=workers, profile_output=profile
+            )
+            with open(profile) as f:
+                metrics = json.load(f)
+            stages = metrics["stages"]
+            for stage in ["fetch", "decode", "filter.bbox", "write"]:
+                self.assertIn(stage, stages)
+            self.assertEqual(stages["decode"]["points_in"], 40_000)
+            self.assertEqual(
+                stages["filter.decimate"]["points_out"], len(las.points)
+            )
+            self.assertEqual(
+                sum(tile["points_out"] for tile in metrics["tiles"]),
+                len(las.points),
+            )
+
+    def test_workers_match_serial(self) -> None:
+        expected = self.run_process("serial.laz")
+        merged = self.run_process("parallel.laz", workers=2)
+        self.assertEqual(merged.header.point_count, len(expected.points))
+        np.testing.assert_array_equal(merged.x, expected.x)
+        np.testing.assert_array_equal(merged.y, expected.y)
+        np.testing.assert_array_equal(merged.z, expected.z)
+        np.testing.assert_allclose(
+            merged.header.mins,
+            [merged.x.min(), merged.y.min(), merged.z.min()],
+        )
+        np.testing.assert_allclose(
+            merged.header.maxs,
+            [merged.x.max(), merged.y.max(), merged.z.max()],
+        )
+
+    def test_clip_file(self) -> None:
+        options = {
+            "bbox": None,
+            "clip_file": WESTERVOORT28992_FILE_PATH,
+            "epsg": 28992,
+        }
+        clipped = self.run_process("clipped.laz", **options)
+        polygon = gpd.read_file(WESTERVOORT28992_FILE_PATH).geometry[0]
+        self.assertGreater(len(clipped.points), 0)
+        self.assertTrue(
+            shapely.intersects_xy(polygon, clipped.x, clipped.y).all()
+        )
+
+        merged = self.run_process("merged.laz", workers=2, **options)
+        np.testing.assert_array_equal(merged.x, clipped.x)
+
+    def test_split_features(self) -> None:
+        clip_file = os.path.join(self.tmpdir, "blocks.geojson")
+        blocks = [
+            shapely.box(193600, 441200, 193900, 441500),
+            shapely.MultiPolygon(
+                [
+                    shapely.box(193800, 441600, 194200, 441800),
+                    shapely.box(194300, 441200, 194400, 441300),
+                ]
+            ),
+        ]
+        gpd.GeoDataFrame(
+            {"name": ["west", "east/north"]},
+            geometry=blocks,
+            crs="EPSG:28992",
+        ).to_file(clip_file)
+        options = {"clip_file": clip_file, "epsg": 28992}
+        expected = self.run_process("clipped.laz", **options)
+        self.run_fetched(
+            "blocks", split_features=True, feature_name="name", **options
+        )
+        xs = []
+        for name, block in zip(["west", "east_north"], blocks):
+            part = laspy.read(
+                os.path.join(self.tmpdir, "blocks", name + ".laz")
+            )
+            self.assertGreater(len(part.points), 0)
+            self.assertTrue(
+                shapely.intersects_xy(block, part.x, part.y).all()
+            )
+            xs.append(part.x)
+        np.testing.assert_allclose(
+            np.sort(np.concatenate(xs)), np.sort(expected.x)
+        )
+
+    def test_output_crs(self) -> None:
+        expected = self.run_process("rd.laz")
+        for workers in (None, 2):
+            reprojected = self.run_process(
+                "utm.laz", output_crs="EPSG:25831", workers=workers
+            )
+            self.assertEqual(
+                reprojected.header.parse_crs(), pyproj.CRS("EPSG:25831")
+            )
+            x, y = pyproj.Transformer.from_crs(
+                "EPSG:28992", "EPSG:25831", always_xy=True
+            ).transform(expected.x, expected.y)
+            np.testing.assert_allclose(reprojected.x, x, rtol=0, atol=1e-3)
+            np.testing.assert_allclose(reprojected.y, y, rtol=0, atol=1e-3)
+            np.testing.assert_allclose(reprojected.z, expected.z)
+            np.testing.assert_allclose(
+                reprojected.header.mins,
+                [reprojected.x.min(), reprojected.y.min(), expected.z.min()],
+            )
+
+    def test_tiled_output(self) -> None:
+        expected = self.run_process("single.laz")
+        tiled_dir = os.path.join(self.tmpdir, "tiled")
+        self.run_fetched("tiled", tile_size=500)
+        with open(os.path.join(tiled_dir, "index.geojson")) as f:
+            manifest = json.load(f)
+        xs = []
+        for feature in manifest["features"]:
+            tile = laspy.read(
+                os.path.join(tiled_dir, feature["properties"]["file"])
+            )
+            self.assertEqual(
+                len(tile.points), feature["properties"]["point_count"]
+            )
+            xs.append(tile.x)
+        np.testing.assert_allclose(
+            np.sort(np.concatenate(xs)), np.sort(expected.x)
+        )
+
+    def test_copc_output(self) -> None:
+        expected = self.run_process("single.laz")
+        copc = self.run_process("out.copc.laz", workers=2)
+        np.testing.assert_allclose(np.sort(copc.x), np.sort(expected.x))
+        with laspy.CopcReader.open(
+            os.path.join(self.tmpdir, "out.copc.laz")
+        ) as reader:
+            self.assertEqual(len(reader.query()), len(expected.points))
+
+    def test_columnar_output(self) -> None:
+        expected = self.run_process("single.laz")
+        self.run_fetched("out.npy", columns=["x", "classification"])
+        output = os.path.join(self.tmpdir, "out.npy")
+        np.testing.assert_array_equal(
+            np.load(os.path.join(output, "x.npy")), expected.x
+        )
+        np.testing.assert_array_equal(
+            np.load(os.path.join(output, "classification.npy")),
+            expected.classification,
+        )
+
+    def test_batch_matches_single_runs(self) -> None:
+        first_tile = [192000.0, 440000.0, 193999.0, 442000.0]
+        whole = [192000.0, 440000.0, 196000.0, 442000.0]
+        jobs = [
+            # Keeps every point, so its writer rescales the shared chunk.
+            Job(os.path.join(self.tmpdir, "all.laz"), bbox=whole),
+            Job(
+                os.path.join(self.tmpdir, "filtered.laz"),
+                bbox=[193500.0, 441100.0, 194500.0, 441900.0],
+                include_classes=[2, 6],
+                no_clip_city=True,
+                decimate=3,
+            ),
+            Job(
+                os.path.join(self.tmpdir, "first.laz"),
+                bbox=first_tile,
+                include_classes=[6],
+                voxel_size=20.0,
+            ),
+            # Keeps no points, which must not end the other jobs.
+            Job(
+                os.path.join(self.tmpdir, "empty.laz"),
+                bbox=whole,
+                include_classes=[17],
+            ),
+        ]
+        urls = [BASE_URL + f"tile{i}.LAZ" for i in range(len(self.tiles))]
+        fetched = {}
+        for i, (url, tile) in enumerate(zip(urls, self.tiles)):
+            fetched[url] = os.path.join(self.tmpdir, f"fetched{i}.LAZ")
+            shutil.copy(tile, fetched[url])
+
+        def job_urls(*args: object) -> list[str]:
+            return urls[:1] if args[2] == first_tile else urls
+
+        with mock.patch(
+            "ahn_cli.process.tile_urls", side_effect=job_urls
+        ), mock.patch("ahn_cli.process.Fetcher") as fetcher:
+            fetcher.return_value.iter_fetch.return_value = iter(
+                fetched.items()
+            )
+            process_batch(BASE_URL, CITY_FILE_PATH, jobs)
+        self.assertEqual(fetcher.call_count, 1)
+        self.assertEqual(fetcher.call_args.kwargs["urls"], urls)
+
+        expected = self.run_process("single.laz")
+        filtered = laspy.read(jobs[1].output)
+        np.testing.assert_array_equal(
+            filtered.points.array, expected.points.array
+        )
+        first = self.run_process(
+            "single_first.laz",
+            bbox=first_tile,
+            include_classes=[6],
+            decimate=None,
+            voxel_size=20.0,
+            no_clip_city=False,
+        )
+        np.testing.assert_array_equal(
+            laspy.read(jobs[2].output).points.array, first.points.array
+        )
+        self.assertEqual(len(laspy.read(jobs[3].output).points), 0)
+        tiles = [laspy.read(tile) for tile in self.tiles]
+        everything = laspy.read(jobs[0].output)
+        np.testing.assert_allclose(
+            everything.x, np.concatenate([tile.x for tile in tiles])
+        )
+
+    def test_prunes_tiles_by_header_bounds(self) -> None:
+        # The bbox covers the first tile and misses the second one.
+        bbox = [192000.0, 440000.0, 193999.0, 442000.0]
+        with mock.patch.object(
+            laspy.LasReader,
+            "read",
+            autospec=True,
+            side_effect=laspy.LasReader.read,
+        ) as read:
+            self.run_fetched("pruned.laz", bbox=bbox)
+        self.assertEqual(read.call_count, 1)
+        pruned = laspy.read(os.path.join(self.tmpdir, "pruned.laz"))
+
+        first = laspy.read(self.tiles[0])
+        expected = (
+            np.isin(first.classification, [2, 6]) & (first.x <= bbox[2])
+        ).sum()
+        self.assertEqual(len(pruned.points), -(-expected // 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from ahn_cli.benchmark import synthetic_points
+from ahn_cli.writer.columnar import ColumnarWriter
+
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+if HAS_PYARROW:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+
+class TestColumnarWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.mkdtemp()
+        self.tiles = {
+            "37EN1_15": synthetic_points((193000.0, 441000.0), 3_000, seed=0),
+            "37EN1_16": synthetic_points((194000.0, 441000.0), 2_000, seed=1),
+        }
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name: str, **kwargs: object) -> str:
+        writer = ColumnarWriter(os.path.join(self.tmpdir, name), **kwargs)
+        for source, las in self.tiles.items():
+            # Tiles arrive in chunks, which share a row group.
+            for part in np.array_split(np.arange(len(las.points)), 3):
+                writer.write(las.points[part], las.header, source)
+        return writer.close()
+
+    def expected(self, column: str) -> np.ndarray:
+        return np.concatenate(
+            [np.asarray(las[column]) for las in self.tiles.values()]
+        )
+
+    def test_npy(self) -> None:
+        output = self.write("out.npy", columns=["x", "classification"])
+        self.assertEqual(
+            sorted(os.listdir(output)),
+            ["classification.npy", "index.json", "x.npy"],
+        )
+        x = np.load(os.path.join(output, "x.npy"), mmap_mode="r")
+        np.testing.assert_array_equal(x, self.expected("x"))
+        classification = np.load(os.path.join(output, "classification.npy"))
+        self.assertEqual(classification.dtype, np.uint8)
+        np.testing.assert_array_equal(
+            classification, self.expected("classification")
+        )
+        with open(os.path.join(output, "index.json")) as f:
+            index = json.load(f)
+        self.assertEqual(index["count"], 5_000)
+        self.assertEqual(
+            index["tiles"],
+            {"37EN1_15": [0, 3_000], "37EN1_16": [3_000, 5_000]},
+        )
+
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_parquet(self) -> None:
+        output = self.write("out.parquet")
+        parquet = pq.ParquetFile(output)
+        self.assertEqual(parquet.num_row_groups, 2)
+        self.assertEqual(parquet.metadata.row_group(0).num_rows, 3_000)
+        table = parquet.read(columns=["x", "intensity"])
+        np.testing.assert_array_equal(table["x"], self.expected("x"))
+        np.testing.assert_array_equal(
+            table["intensity"], self.expected("intensity")
+        )
+
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_arrow(self) -> None:
+        output = self.write("out.arrow", max_rows_per_group=1_000)
+        with pa.memory_map(output) as source:
+            reader = pa.ipc.open_file(source)
+            self.assertEqual(reader.num_record_batches, 5)
+            table = reader.read_all()
+        self.assertEqual(
+            table.column_names,
+            ["x", "y", "z", "classification", "intensity"],
+        )
+        np.testing.assert_array_equal(table["z"], self.expected("z"))
+
+    def test_missing_dimension(self) -> None:
+        writer = ColumnarWriter(
+            os.path.join(self.tmpdir, "out.npy"), columns=["red"]
+        )
+        las = self.tiles["37EN1_15"]
+        with self.assertRaises(ValueError):
+            writer.write(las.points, las.header, "37EN1_15")
+
+
+if __name__ == "__main__":
+    unittest.main()
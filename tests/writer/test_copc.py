@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import laspy
+import numpy as np
+from laspy.copc import Bounds
+
+from ahn_cli.benchmark import synthetic_points
+from ahn_cli.writer.copc import CopcWriter
+
+
+class TestCopcWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.mkdtemp()
+        self.output = os.path.join(self.tmpdir, "out.copc.laz")
+        self.tiles = [
+            synthetic_points((193000.0, 441000.0), 30_000, seed=0),
+            synthetic_points((194000.0, 441000.0), 30_000, seed=1),
+        ]
+        writer = CopcWriter(self.output, max_points_per_node=2_000)
+        for tile in self.tiles:
+            writer.write(tile.points, tile.header, "37EN1_15")
+        writer.close()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmpdir)
+
+    def test_all_points(self) -> None:
+        las = laspy.read(self.output)
+        self.assertEqual(las.header.point_count, 60_000)
+        np.testing.assert_allclose(
+            np.sort(las.x), np.sort(np.concatenate([t.x for t in self.tiles]))
+        )
+        # Only the output remains in the directory.
+        self.assertEqual(os.listdir(self.tmpdir), ["out.copc.laz"])
+
+    def test_spatial_query(self) -> None:
+        with laspy.CopcReader.open(self.output) as reader:
+            self.assertEqual(len(reader.query()), 60_000)
+            points = reader.query(
+                Bounds(
+                    np.array([193000.0, 441000.0]),
+                    np.array([193500.0, 441500.0]),
+                )
+            )
+        x = np.concatenate([t.x for t in self.tiles])
+        y = np.concatenate([t.y for t in self.tiles])
+        expected = (x <= 193500.0) & (y <= 441500.0)
+        self.assertEqual(len(points), expected.sum())
+
+    def test_levels(self) -> None:
+        with laspy.CopcReader.open(self.output) as reader:
+            root = reader.query(level=0)
+            deeper = reader.query(level=range(1, 20))
+            gps_min = reader.copc_info.gps_min
+        self.assertGreater(len(root), 0)
+        self.assertEqual(len(root) + len(deeper), 60_000)
+        self.assertAlmostEqual(
+            gps_min, min(t.gps_time.min() for t in self.tiles)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
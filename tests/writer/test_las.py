@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import laspy
+import numpy as np
+
+from ahn_cli.benchmark import synthetic_points
+from ahn_cli.writer.las import LasFileWriter, rescale_points
+
+
+class TestLasFileWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmpdir)
+
+    def test_merges_tiles_with_other_offsets(self) -> None:
+        tiles = [
+            synthetic_points((193000.0, 441000.0), 5_000, seed=0),
+            synthetic_points((194000.0, 441000.0), 5_000, seed=1),
+        ]
+        tiles[1].change_scaling(scales=[0.01, 0.01, 0.01])
+        expected = [
+            np.stack([tile.x, tile.y, tile.z], axis=1) for tile in tiles
+        ]
+        writer = LasFileWriter(os.path.join(self.tmpdir, "out.laz"))
+        for name, tile in zip(["37EN1_15", "37EN1_16"], tiles):
+            for part in np.array_split(np.arange(len(tile.points)), 3):
+                writer.write(tile.points[part], tile.header, name)
+        las = laspy.read(writer.close())
+
+        self.assertEqual(las.header.point_count, 10_000)
+        np.testing.assert_array_equal(las.header.offsets, [193000, 441000, 0])
+        xyz = np.stack([las.x, las.y, las.z], axis=1)
+        np.testing.assert_allclose(xyz, np.concatenate(expected), atol=5e-4)
+        np.testing.assert_allclose(las.header.mins, xyz.min(axis=0))
+        np.testing.assert_allclose(las.header.maxs, xyz.max(axis=0))
+
+    def test_rescale_shifts_integers(self) -> None:
+        las = synthetic_points((194000.0, 441000.0), 1_000)
+        points = las.points
+        x, integers = np.array(points.x), points.array["X"].copy()
+        rescale_points(points, las.header.scales, [193000.0, 441000.0, 0.0])
+        np.testing.assert_array_equal(points.x, x)
+        np.testing.assert_array_equal(points.array["X"], integers + 1_000_000)
+
+    def test_rescale_out_of_range(self) -> None:
+        las = synthetic_points((194000.0, 441000.0), 1_000)
+        with self.assertRaises(ValueError):
+            rescale_points(las.points, [1e-6, 1e-6, 1e-3], [0.0, 0.0, 0.0])
+
+    def test_close_without_tiles(self) -> None:
+        writer = LasFileWriter(os.path.join(self.tmpdir, "out.laz"))
+        with self.assertRaises(ValueError):
+            writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import laspy
+import numpy as np
+import shapely
+
+from ahn_cli.benchmark import synthetic_points
+from ahn_cli.manipulator.clipper import FeatureClipper
+from ahn_cli.writer.tiled import MANIFEST_FILE, FeatureWriter, TiledWriter
+
+
+class TestTiledWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmpdir)
+
+    def read_manifest(self, path: str) -> dict:
+        with open(path) as f:
+            return json.load(f)
+
+    def test_grid(self) -> None:
+        las = synthetic_points((193000.0, 441000.0), 10_000)
+        writer = TiledWriter(self.tmpdir, tile_size=500, max_open_files=2)
+        # Write in parts, so that tiles are closed and appended to.
+        for part in np.array_split(np.arange(len(las.points)), 4):
+            writer.write(las.points[part], las.header, "37EN1_15")
+        manifest = self.read_manifest(writer.close())
+
+        names = [f["properties"]["file"] for f in manifest["features"]]
+        self.assertEqual(
+            names,
+            [
+                "193000_441000.laz",
+                "193000_441500.laz",
+                "193500_441000.laz",
+                "193500_441500.laz",
+            ],
+        )
+        total = 0
+        for feature in manifest["features"]:
+            props = feature["properties"]
+            tile = laspy.read(os.path.join(self.tmpdir, props["file"]))
+            minx, miny = map(float, props["file"][:-4].split("_"))
+            self.assertEqual(len(tile.points), props["point_count"])
+            self.assertEqual(tile.header.point_count, props["point_count"])
+            self.assertTrue(((tile.x >= minx) & (tile.x < minx + 500)).all())
+            self.assertTrue(((tile.y >= miny) & (tile.y < miny + 500)).all())
+            np.testing.assert_allclose(
+                props["mins"], [tile.x.min(), tile.y.min(), tile.z.min()]
+            )
+            total += props["point_count"]
+        self.assertEqual(total, len(las.points))
+
+    def test_per_subunit(self) -> None:
+        first = synthetic_points((193000.0, 441000.0), 1_000, seed=0)
+        second = synthetic_points((194000.0, 441000.0), 2_000, seed=1)
+        writer = TiledWriter(self.tmpdir)
+        writer.write(first.points, first.header, "37EN1_15")
+        writer.write(second.points, second.header, "37EN1_16")
+        manifest = self.read_manifest(writer.close())
+
+        self.assertTrue(
+            os.path.exists(os.path.join(self.tmpdir, MANIFEST_FILE))
+        )
+        counts = {
+            f["properties"]["file"]: f["properties"]["point_count"]
+            for f in manifest["features"]
+        }
+        self.assertEqual(
+            counts, {"37EN1_15.laz": 1_000, "37EN1_16.laz": 2_000}
+        )
+        tile = laspy.read(os.path.join(self.tmpdir, "37EN1_16.laz"))
+        np.testing.assert_allclose(np.sort(tile.x), np.sort(second.x))
+
+    def test_invalid_tile_size(self) -> None:
+        with self.assertRaises(ValueError):
+            TiledWriter(self.tmpdir, tile_size=0)
+        with self.assertRaises(ValueError):
+            TiledWriter(self.tmpdir, tile_size=0.5)
+
+
+class TestFeatureWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.mkdtemp()
+        # 3 x 3 blocks of 200 m with 50 m streets in between.
+        self.features = [
+            shapely.box(
+                193000 + i * 250, 441000 + j * 250,
+                193200 + i * 250, 441200 + j * 250,
+            )
+            for i in range(3)
+            for j in range(3)
+        ]  # fmt: skip
+        self.clipper = FeatureClipper(self.features, 5.0)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmpdir)
+
+    def test_split_by_feature(self) -> None:
+        first = synthetic_points((193000.0, 441000.0), 20_000, seed=0)
+        second = synthetic_points(
+            (193300.0, 441300.0), 10_000, size=500, seed=1
+        )
+        names = [f"block_{i}" for i in range(len(self.features))]
+        writer = FeatureWriter(
+            self.tmpdir,
+            self.clipper,
+            names,
+            max_open_files=2,
+            batch_size=500,
+            max_buffered_points=3_000,
+        )
+        # Write in parts, so that buffers are flushed and files reopened.
+        for las in (first, second):
+            for part in np.array_split(np.arange(len(las.points)), 4):
+                writer.write(las.points[part], las.header, "37EN1_15")
+        with open(writer.close()) as f:
+            manifest = json.load(f)
+
+        xs = np.concatenate([first.x, second.x])
+        ys = np.concatenate([first.y, second.y])
+        labels = self.clipper.labels(xs, ys)
+        files = {
+            f["properties"]["file"]: f["properties"]["point_count"]
+            for f in manifest["features"]
+        }
+        self.assertEqual(len(files), len(self.features))
+        for i, name in enumerate(names):
+            part = laspy.read(os.path.join(self.tmpdir, name + ".laz"))
+            self.assertEqual(files[name + ".laz"], len(part.points))
+            self.assertTrue(
+                shapely.intersects_xy(self.features[i], part.x, part.y).all()
+            )
+            np.testing.assert_allclose(
+                np.sort(part.x), np.sort(xs[labels == i])
+            )
+
+    def test_invalid_names(self) -> None:
+        with self.assertRaises(ValueError):
+            FeatureWriter(self.tmpdir, self.clipper, ["a", "b"])
+        with self.assertRaises(ValueError):
+            FeatureWriter(self.tmpdir, self.clipper, ["a"] * 9)
+
+
+if __name__ == "__main__":
+    unittest.main()